@@ -0,0 +1,282 @@
+"""Two-tier cache backend: a small in-process LRU (L1) in front of a shared cache (L2), e.g. Redis.
+
+Django creates a cache instance per thread, so each thread has its own L1.
+
+Only the keys starting with one of ``L1_KEY_PREFIXES`` are kept in L1, all the other keys (rate limits, locks,
+counters) live in L2 only. Writes of L1 keys are broadcast through an invalidation log in L2: every write bumps a
+sequence number and stores the written key under it. Each process reads the log at most every ``SYNC_INTERVAL``
+seconds and drops the written keys from its L1. If it cannot tell which keys were written, because it fell
+behind the log or an entry expired, it drops its whole L1. Entries live in L1 at most ``L1_TIMEOUT`` seconds,
+which bounds the staleness caused by races between a write and a concurrent read.
+
+Example::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'pola.cache_backends.TwoTierCache',
+            'OPTIONS': {'L2_ALIAS': 'redis', 'L1_KEY_PREFIXES': ['app_configuration_singleton']},
+        },
+        'redis': {...},
+    }
+"""
+
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    SEQUENCE_KEY = 'two_tier:sequence'
+    LOG_KEY_PREFIX = 'two_tier:log'
+    LOCK_KEY_PREFIX = 'two_tier:lock'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options['L2_ALIAS']
+        self.l1_key_prefixes = tuple(options.get('L1_KEY_PREFIXES', ()))
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        # The log is kept long enough for the processes which are idle for a while.
+        self.log_timeout = options.get('LOG_TIMEOUT', 5 * 60)
+        self.max_log_gap = options.get('MAX_LOG_GAP', 1000)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self.lock_wait = options.get('LOCK_WAIT', 5)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._sequence = None
+        self._synced_at = 0
+        self._stats = defaultdict(Counter)
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    # L1
+
+    def _uses_l1(self, key):
+        return key.startswith(self.l1_key_prefixes)
+
+    def _l1_get(self, l1_key):
+        self._sync()
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is None:
+                return _MISSING
+            pickled, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._l1[l1_key]
+                return _MISSING
+            self._l1.move_to_end(l1_key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, l1_key, value, timeout=DEFAULT_TIMEOUT):
+        self._sync()
+        expires_at = time.monotonic() + self.l1_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            expires_at = min(expires_at, time.monotonic() + backend_timeout - time.time())
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[l1_key] = (pickled, expires_at)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, l1_key):
+        with self._lock:
+            self._l1.pop(l1_key, None)
+
+    def _l1_clear(self):
+        with self._lock:
+            self._l1.clear()
+
+    # Invalidation log
+
+    def _broadcast(self, l1_keys):
+        if not l1_keys:
+            return
+        l2 = self.l2
+        l2.add(self.SEQUENCE_KEY, 0, timeout=None)
+        # The written keys get a range of sequence numbers ending with the incremented one.
+        first_sequence = l2.incr(self.SEQUENCE_KEY, len(l1_keys)) - len(l1_keys) + 1
+        l2.set_many(
+            {f'{self.LOG_KEY_PREFIX}:{first_sequence + i}': l1_key for i, l1_key in enumerate(l1_keys)},
+            self.log_timeout,
+        )
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        sequence = self.l2.get(self.SEQUENCE_KEY, 0)
+        last_sequence, self._sequence = self._sequence, sequence
+        if sequence == last_sequence:
+            return
+        if last_sequence is None or not 0 < sequence - last_sequence <= self.max_log_gap:
+            self._l1_clear()
+            return
+        log_keys = [f'{self.LOG_KEY_PREFIX}:{i}' for i in range(last_sequence + 1, sequence + 1)]
+        written = self.l2.get_many(log_keys)
+        if len(written) < len(log_keys):
+            self._l1_clear()
+            return
+        with self._lock:
+            for l1_key in written.values():
+                self._l1.pop(l1_key, None)
+
+    # Stats
+
+    def _record(self, key, event):
+        self._stats[key.split(':', 1)[0]][event] += 1
+
+    def get_stats(self):
+        """Returns the hits and misses of this process by the key prefix (the part of the key before ``:``)."""
+        return {
+            prefix: {'l1_hits': c['l1_hits'], 'l2_hits': c['l2_hits'], 'misses': c['misses']}
+            for prefix, c in self._stats.items()
+        }
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        if not self._uses_l1(key):
+            value = self.l2.get(key, _MISSING, version=version)
+            self._record(key, 'misses' if value is _MISSING else 'l2_hits')
+            return default if value is _MISSING else value
+
+        l1_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(l1_key)
+        if value is not _MISSING:
+            self._record(key, 'l1_hits')
+            return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._record(key, 'misses')
+            return default
+        self._record(key, 'l2_hits')
+        self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = {}
+        l1_keys = {}
+        for key in keys:
+            if not self._uses_l1(key):
+                continue
+            l1_key = self.make_and_validate_key(key, version=version)
+            value = self._l1_get(l1_key)
+            if value is _MISSING:
+                l1_keys[key] = l1_key
+            else:
+                self._record(key, 'l1_hits')
+                values[key] = value
+
+        # The keys missing in L1 are read from L2 in one round trip.
+        l2_values = self.l2.get_many([key for key in keys if key not in values], version=version)
+        for key in keys:
+            if key in values:
+                continue
+            if key not in l2_values:
+                self._record(key, 'misses')
+                continue
+            self._record(key, 'l2_hits')
+            values[key] = l2_values[key]
+            if key in l1_keys:
+                self._l1_set(l1_keys[key], values[key])
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        if self._uses_l1(key):
+            l1_key = self.make_and_validate_key(key, version=version)
+            self._broadcast([l1_key])
+            self._l1_set(l1_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        l1_keys = [self.make_and_validate_key(key, version=version) for key in data if self._uses_l1(key)]
+        self._broadcast(l1_keys)
+        for l1_key in l1_keys:
+            self._l1_delete(l1_key)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added and self._uses_l1(key):
+            self._invalidate([key], version)
+        return added
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """Like ``BaseCache.get_or_set``, but only one process at a time computes a callable default.
+
+        The other processes wait at most ``LOCK_WAIT`` seconds for the value and then compute it themselves.
+        """
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        if not callable(default):
+            return super().get_or_set(key, default, timeout=timeout, version=version)
+
+        lock_key = f'{self.LOCK_KEY_PREFIX}:{self.make_and_validate_key(key, version=version)}'
+        if self.l2.add(lock_key, True, self.lock_timeout):
+            try:
+                value = default()
+                self.set(key, value, timeout=timeout, version=version)
+            finally:
+                self.l2.delete(lock_key)
+            return value
+
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline and self.l2.get(lock_key) is not None:
+            time.sleep(POLL_INTERVAL)
+        value = self.l2.get(key, _MISSING, version=version)
+        return default() if value is _MISSING else value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        if self._uses_l1(key):
+            self._invalidate([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        if self._uses_l1(key):
+            self._invalidate([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        self._invalidate([key for key in keys if self._uses_l1(key)], version)
+
+    def clear(self):
+        self.l2.clear()
+        # The sequence starts again, which makes all the processes drop their L1.
+        self._l1_clear()
+        self._sequence = None
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def _invalidate(self, keys, version):
+        l1_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        self._broadcast(l1_keys)
+        for l1_key in l1_keys:
+            self._l1_delete(l1_key)
@@ -0,0 +1,123 @@
+"""Validators of the v4 product cards for conditional requests.
+
+The ``ETag`` and ``Last-Modified`` of a card are computed from the rows the card shows with a single query,
+without building the card, so a revalidation answered with ``304 Not Modified`` is cheap. ``Last-Modified`` is the
+newest modification of the rows, which does not move when a row is deleted, so only the ``ETag`` is used to answer
+the conditional requests.
+"""
+
+import hashlib
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils.http import quote_etag
+
+from pola.company.models import Brand, Company
+from pola.logic_produkty_w_sieci import is_code_supported
+from pola.logic_score import get_pl_score
+from pola.product.models import Product
+
+# Bump when the format of the card changes, so the clients do not keep the old cards.
+CARD_VERSION = 1
+
+PL_SCORE_FIELDS = ('plCapital', 'plWorkers', 'plRnD', 'plRegistered', 'plNotGlobEnt')
+
+
+class CardValidator(NamedTuple):
+    etag: str
+    last_modified: object
+    # Unsaved product with the id and company_id set, enough to record the scan.
+    product: Product
+    stats: dict
+
+
+def _aggregate(queryset, aggregate):
+    # Grouping by a constant aggregates over all the rows of the subquery.
+    return Subquery(
+        queryset.order_by().annotate(group=Value(1)).values('group').annotate(value=aggregate).values('value')
+    )
+
+
+def _validator_queryset(code):
+    replacements = Product.objects.filter(replaced_by=OuterRef('pk'))
+    brands = Brand.objects.filter(Q(company=OuterRef('company_id')) | Q(company=OuterRef('brand__company_id')))
+    return Product.objects.filter(code=code).values(
+        'id',
+        'company_id',
+        'modified',
+        'company__modified',
+        'brand__modified',
+        'brand__company_id',
+        'brand__company__modified',
+        *[f'{prefix}__{field}' for prefix in ('company', 'brand__company') for field in PL_SCORE_FIELDS],
+        replacements_modified=_aggregate(
+            replacements, Max(Greatest('modified', 'company__modified', 'brand__modified'))
+        ),
+        replacements_count=_aggregate(replacements, Count('pk')),
+        brands_modified=_aggregate(brands, Max('modified')),
+        brands_count=_aggregate(brands, Count('pk')),
+    )
+
+
+def _company(row, prefix):
+    return Company(**{field: row[f'{prefix}__{field}'] for field in PL_SCORE_FIELDS})
+
+
+def _get_stats(code, row):
+    # Mirrors the stats of pola.logic.handle_multiple_companies, which builds the v4 cards.
+    companies = []
+    if row['company_id']:
+        companies.append(_company(row, 'company'))
+        if row['brand__company_id'] and row['brand__company_id'] != row['company_id']:
+            companies.append(_company(row, 'brand__company'))
+    return {
+        'was_verified': False,
+        'was_590': code.startswith('590'),
+        'was_plScore': bool(companies) and all(get_pl_score(c) for c in companies),
+    }
+
+
+def get_card_validator(code, app_configuration) -> Optional[CardValidator]:
+    """Returns the validator of the v4 card of the code or ``None`` if the card cannot be validated."""
+    validator = get_product_validator(code)
+    return None if validator is None else with_app_configuration(validator, app_configuration)
+
+
+def get_product_validator(code) -> Optional[CardValidator]:
+    """Returns the validator of the rows the card shows, without the donate button of the app configuration.
+
+    Cards of unknown products and of products which are still being enriched from Produkty w Sieci change
+    without their rows changing, so they are not validated.
+    """
+    row = _validator_queryset(code).first()
+    if row is None:
+        return None
+    if not row['company_id'] and is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE:
+        return None
+    timestamps = [
+        row[name]
+        for name in (
+            'modified',
+            'company__modified',
+            'brand__modified',
+            'brand__company__modified',
+            'replacements_modified',
+            'brands_modified',
+        )
+        if row[name] is not None
+    ]
+    fingerprint = (CARD_VERSION, code, sorted(row.items()))
+    return CardValidator(
+        etag=hashlib.sha1(repr(fingerprint).encode()).hexdigest(),
+        last_modified=max(timestamps),
+        product=Product(id=row['id'], code=code, company_id=row['company_id']),
+        stats=_get_stats(code, row),
+    )
+
+
+def with_app_configuration(validator, app_configuration) -> CardValidator:
+    """Completes the validator of :func:`get_product_validator` with the donate button shown on the card."""
+    fingerprint = (validator.etag, app_configuration.donate_text, app_configuration.donate_url)
+    return validator._replace(etag=quote_etag(hashlib.sha1(repr(fingerprint).encode()).hexdigest()))
@@ -2,15 +2,15 @@ from distutils.util import strtobool
 
 import django_filters
 from dal import autocomplete
-from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
-from pola.filters import CrispyFilterMixin
+from pola import text_search
+from pola.filters import CrispyFilterMixin, SimilarityOrderingMixin
 
 from .models import Brand, Company
 
 
-class CompanyFilter(CrispyFilterMixin, django_filters.FilterSet):
+class CompanyFilter(SimilarityOrderingMixin, CrispyFilterMixin, django_filters.FilterSet):
     verified = django_filters.TypedChoiceFilter(
         choices=((None, _("----")), (True, _("Tak")), (False, _("Nie"))),
         coerce=strtobool,
@@ -69,10 +69,7 @@ class CompanyMergeFilter(CrispyFilterMixin, django_filters.FilterSet):
     def filter_q(self, queryset, name, value):
         if not value:
             return queryset
-        # Search across name, official_name, and common_name and ensure unique results
-        return queryset.filter(
-            Q(name__icontains=value) | Q(official_name__icontains=value) | Q(common_name__icontains=value)
-        ).distinct()
+        return text_search.search(queryset, ['name', 'official_name', 'common_name'], value)
 
     class Meta:
         model = Company
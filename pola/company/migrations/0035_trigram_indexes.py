@@ -0,0 +1,40 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    TrigramExtension,
+)
+from django.db import migrations
+
+
+def upper_trigram_index(field, name):
+    return django.contrib.postgres.indexes.GinIndex(
+        django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(field), name='gin_trgm_ops'),
+        name=name,
+    )
+
+
+class Migration(migrations.Migration):
+    # The indexes are created without locking the tables for writes.
+    atomic = False
+
+    dependencies = [
+        ('company', '0034_alter_company_logotype'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(model_name='company', index=upper_trigram_index('nip', 'company_nip_upper_trgm')),
+        AddIndexConcurrently(model_name='company', index=upper_trigram_index('name', 'company_name_upper_trgm')),
+        AddIndexConcurrently(
+            model_name='company', index=upper_trigram_index('official_name', 'company_official_upper_trgm')
+        ),
+        AddIndexConcurrently(
+            model_name='company', index=upper_trigram_index('common_name', 'company_common_upper_trgm')
+        ),
+        AddIndexConcurrently(
+            model_name='company', index=upper_trigram_index('Editor_notes', 'company_notes_upper_trgm')
+        ),
+        AddIndexConcurrently(model_name='brand', index=upper_trigram_index('name', 'brand_name_upper_trgm')),
+        AddIndexConcurrently(model_name='brand', index=upper_trigram_index('common_name', 'brand_common_upper_trgm')),
+    ]
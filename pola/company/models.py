@@ -14,6 +14,7 @@ from storages.backends.s3boto3 import S3Boto3Storage
 
 from pola.concurency import concurency
 from pola.logic_score import get_pl_score
+from pola.text_search import upper_trigram_index
 
 
 class IntegerRangeField(models.IntegerField):
@@ -153,10 +154,6 @@ class Company(TimeStampedModel):
     def pl_score(self):
         return get_pl_score(self)
 
-    def increment_query_count(self):
-        with connection.cursor() as cursor:
-            cursor.execute('update company_company set query_count = query_count +1 ' 'where id=%s', [self.id])
-
     def recalculate_query_count_for_company(self):
         """Recalculate the query_count for the specific company."""
         with connection.cursor() as cursor:
@@ -288,7 +285,14 @@ class Company(TimeStampedModel):
             # ("change_company", "Can edit the company"),
             # ("delete_company", "Can delete the company"),
         )
-        indexes = [BrinIndex(fields=['created'], pages_per_range=16)]
+        indexes = [
+            BrinIndex(fields=['created'], pages_per_range=16),
+            upper_trigram_index('nip', 'company_nip_upper_trgm'),
+            upper_trigram_index('name', 'company_name_upper_trgm'),
+            upper_trigram_index('official_name', 'company_official_upper_trgm'),
+            upper_trigram_index('common_name', 'company_common_upper_trgm'),
+            upper_trigram_index('Editor_notes', 'company_notes_upper_trgm'),
+        ]
 
 
 class BrandQuerySet(models.query.QuerySet):
@@ -347,3 +351,7 @@ class Brand(TimeStampedModel):
         permissions = (
             # ("view_brand", "Can see all brands"),
         )
+        indexes = [
+            upper_trigram_index('name', 'brand_name_upper_trgm'),
+            upper_trigram_index('common_name', 'brand_common_upper_trgm'),
+        ]
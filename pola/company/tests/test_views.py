@@ -400,6 +400,16 @@ class TestCompanyListView(PermissionMixin, TemplateUsedMixin, WebTestMixin, Test
 class CompanyAutocomplete(PermissionMixin, TestCase):
     url = reverse_lazy('company:company-autocomplete')
 
+    def test_should_return_most_similar_first(self):
+        self.login()
+        c1 = CompanyFactory(name="Mlekomix")
+        c2 = CompanyFactory(name="Mleko")
+        CompanyFactory(name="Ser")
+
+        resp = self.client.get(f"{self.url}?q=mleko")
+
+        self.assertEqual([str(c2.pk), str(c1.pk)], [r['id'] for r in resp.json()['results']])
+
 
 class TestBrandDeleteView(BrandInstanceMixin, PermissionMixin, TemplateUsedMixin, TestCase):
     template_name = 'company/brand_confirm_delete.html'
@@ -470,6 +480,15 @@ class TestCompanyMergeView(PermissionMixin, TemplateUsedMixin, TestCase):
         # Non-matching company excluded
         self.assertNotContains(resp, str(c_other))
 
+    def test_should_order_by_similarity(self):
+        self.login()
+        c1 = CompanyFactory(name='Megamix', official_name='', common_name='')
+        c2 = CompanyFactory(name='x1', official_name='Mega', common_name='')
+
+        resp = self.client.get(self.url, {'q': 'Mega'})
+
+        self.assertEqual([c2, c1], list(resp.context['object_list']))
+
     def test_merge_success(self):
         self.login()
         target = CompanyFactory(common_name='Target')
@@ -18,9 +18,11 @@ from django.views.generic.edit import (
 )
 from django_filters.views import FilterView
 
+from pola import scan_cache
 from pola.company.models import Brand, Company
 from pola.concurency import ConcurencyProtectUpdateView
 from pola.mixins import LoginPermissionRequiredMixin
+from pola.product import search
 from pola.product.models import Product
 from pola.report.models import Report
 from pola.views import ExprAutocompleteMixin
@@ -125,6 +127,9 @@ class CompanyMergeView(LoginPermissionRequiredMixin, FilterView):
             Company.objects.filter(id__in=others).delete()
             # recalculate query_count for the target company after merge
             Company.objects.get(id=target_id).recalculate_query_count_for_company()
+            # products and brands were moved without signals
+            scan_cache.invalidate_company(target_id)
+            search.refresh_search_text(company_id=target_id)
 
         messages.success(request, 'Połączono producentów. Produkty zostały przeniesione do firmy docelowej.')
         return HttpResponseRedirect(reverse('company:detail', args=[target_id]))
@@ -30,6 +30,8 @@ DJANGO_APPS = (
     'django.contrib.sites',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Operator classes of the trigram indexes
+    'django.contrib.postgres',
     # Useful template tags:
     'django.contrib.humanize',
     # Must be before django.contrib.admin
@@ -337,9 +339,29 @@ CORS_URLS_REGEX = r"^/a/.*$"
 # ---------------
 # https://openapi-core.readthedocs.io/en/latest/integrations/django/#django
 
-from openapi_core import OpenAPI  # noqa: E402
+from openapi_core import Config, OpenAPI  # noqa: E402
 
-OPENAPI = OpenAPI.from_path(Path(str(ROOT_DIR)) / "pola" / "rpc_api" / "openapi-v1.yaml")
+from pola.rpc_api.openapi_unmarshalling import (  # noqa: E402
+    PolaV30RequestUnmarshaller,
+    PolaV30ResponseUnmarshaller,
+)
+
+OPENAPI = OpenAPI.from_path(
+    Path(str(ROOT_DIR)) / "pola" / "rpc_api" / "openapi-v1.yaml",
+    config=Config(
+        request_unmarshaller_cls=PolaV30RequestUnmarshaller,
+        response_unmarshaller_cls=PolaV30ResponseUnmarshaller,
+    ),
+)
+
+# HTTP CLIENT
+# ------------------------------------------------------------------------------
+# Connection pool shared by the API clients of a process. See: pola.integrations.http
+HTTP_CLIENT = {
+    'POOL_SIZE': env.int("POLA_APP_HTTP_CLIENT_POOL_SIZE", default=10),
+    'CONNECT_TIMEOUT': env.float("POLA_APP_HTTP_CLIENT_CONNECT_TIMEOUT", default=3.05),
+    'READ_TIMEOUT': env.float("POLA_APP_HTTP_CLIENT_READ_TIMEOUT", default=10),
+}
 
 # GET RESPONSE
 # ------------------------------------------------------------------------------
@@ -354,6 +376,128 @@ PRODUKTY_W_SIECI_ENABLE = env.bool("POLA_APP_PRODUKTY_W_SIECI_ENABLE", default=T
 PRODUKTY_W_SIECI = {
     'API_TOKEN': env('POLA_APP_PRODUKTY_W_SIECI_API_TOKEN'),
 }
+# When enabled, unknown products are fetched inline only if the API answers within INLINE_TIMEOUT seconds,
+# otherwise an RQ job fetches them and the scan returns a "pending" card. See: pola.logic_produkty_w_sieci
+PRODUKTY_W_SIECI_ASYNC_ENABLE = env.bool("POLA_APP_PRODUKTY_W_SIECI_ASYNC_ENABLE", default=False)
+PRODUKTY_W_SIECI_ASYNC = {
+    'INLINE_TIMEOUT': env.float("POLA_APP_PRODUKTY_W_SIECI_INLINE_TIMEOUT", default=1.5),
+    'PENDING_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_PENDING_TIMEOUT", default=120),
+    'QUEUE': 'high',
+}
+# Only one request per code calls the API at a time, the others wait at most WAIT_TIMEOUT seconds for its result.
+PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE = env.bool("POLA_APP_PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE", default=True)
+PRODUKTY_W_SIECI_SINGLE_FLIGHT = {
+    'LOCK_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_LOCK_TIMEOUT", default=30),
+    'WAIT_TIMEOUT': env.float("POLA_APP_PRODUKTY_W_SIECI_WAIT_TIMEOUT", default=5),
+}
+# Codes are not looked up again for the given number of seconds after the API did not return usable data.
+PRODUKTY_W_SIECI_NEGATIVE_CACHE = {
+    'NOT_FOUND_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_NOT_FOUND_TIMEOUT", default=7 * 24 * 60 * 60),
+    'ERROR_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_ERROR_TIMEOUT", default=5 * 60),
+    'NO_COMPANY_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_NO_COMPANY_TIMEOUT", default=24 * 60 * 60),
+}
+# The calls stop for RESET_TIMEOUT seconds after FAILURE_THRESHOLD failures within FAILURE_WINDOW seconds and
+# the retries are capped at RETRY_RATIO of the requests. Scans wait for the API at most SCAN_DEADLINE seconds.
+PRODUKTY_W_SIECI_CIRCUIT_BREAKER_ENABLE = env.bool("POLA_APP_PRODUKTY_W_SIECI_CIRCUIT_BREAKER_ENABLE", default=True)
+PRODUKTY_W_SIECI_CIRCUIT_BREAKER = {
+    'FAILURE_THRESHOLD': env.int("POLA_APP_PRODUKTY_W_SIECI_FAILURE_THRESHOLD", default=5),
+    'FAILURE_WINDOW': env.int("POLA_APP_PRODUKTY_W_SIECI_FAILURE_WINDOW", default=60),
+    'RESET_TIMEOUT': env.int("POLA_APP_PRODUKTY_W_SIECI_RESET_TIMEOUT", default=30),
+    'RETRY_RATIO': env.float("POLA_APP_PRODUKTY_W_SIECI_RETRY_RATIO", default=0.1),
+    'MIN_RETRIES': env.int("POLA_APP_PRODUKTY_W_SIECI_MIN_RETRIES", default=10),
+    'RETRY_WINDOW': env.int("POLA_APP_PRODUKTY_W_SIECI_RETRY_WINDOW", default=60),
+    'SCAN_DEADLINE': env.float("POLA_APP_PRODUKTY_W_SIECI_SCAN_DEADLINE", default=5),
+}
+# Requery jobs fetch with WORKERS threads and at most RATE_LIMIT requests per second, storing BATCH_SIZE products
+# in a transaction.
+REQUERY = {
+    'WORKERS': env.int("POLA_APP_REQUERY_WORKERS", default=8),
+    'RATE_LIMIT': env.float("POLA_APP_REQUERY_RATE_LIMIT", default=10),
+    'BATCH_SIZE': env.int("POLA_APP_REQUERY_BATCH_SIZE", default=100),
+}
+# The cache shared by the workers keeping the pending jobs and the locks.
+PRODUKTY_W_SIECI_CACHE_ALIAS = env.str("POLA_APP_PRODUKTY_W_SIECI_CACHE_ALIAS", default='default')
+
+# QUERY PARTITIONS
+# ------------------------------------------------------------------------------
+# Monthly partitions of pola_query, managed by the manage_query_partitions command. Partitions older than
+# RETENTION_MONTHS are detached, or dropped when DROP_EXPIRED. When DROP_EXPIRED, the rows of the expired months
+# are also deleted from pola_query_legacy, DELETE_BATCH_SIZE ids at a time. See: pola.query_partitions
+QUERY_PARTITIONS = {
+    'MONTHS_AHEAD': env.int("POLA_APP_QUERY_PARTITIONS_MONTHS_AHEAD", default=3),
+    'RETENTION_MONTHS': env.int("POLA_APP_QUERY_PARTITIONS_RETENTION_MONTHS", default=None),
+    'DROP_EXPIRED': env.bool("POLA_APP_QUERY_PARTITIONS_DROP_EXPIRED", default=False),
+    'DELETE_BATCH_SIZE': env.int("POLA_APP_QUERY_PARTITIONS_DELETE_BATCH_SIZE", default=10_000),
+}
+
+# EVENT ARCHIVE
+# ------------------------------------------------------------------------------
+# Months of scan and search events older than ARCHIVE_AFTER_MONTHS are moved to Parquet files in the bucket by
+# the archive_events command. See: pola.event_archive
+EVENT_ARCHIVE = {
+    'BUCKET_NAME': env.str('POLA_APP_AWS_S3_EVENT_ARCHIVE_BUCKET_NAME', default='pola-app-event-archive'),
+    'PREFIX': env.str('POLA_APP_EVENT_ARCHIVE_PREFIX', default='events'),
+    'ARCHIVE_AFTER_MONTHS': env.int('POLA_APP_EVENT_ARCHIVE_AFTER_MONTHS', default=12),
+    'BATCH_SIZE': env.int('POLA_APP_EVENT_ARCHIVE_BATCH_SIZE', default=100_000),
+}
+
+# SCAN RESULT CACHE
+# ------------------------------------------------------------------------------
+# Finished results of /get_by_code keyed by product code. See: pola.scan_cache
+SCAN_RESULT_CACHE_ENABLE = env.bool("POLA_APP_SCAN_RESULT_CACHE_ENABLE", default=True)
+SCAN_RESULT_CACHE = {
+    'CACHE_ALIAS': env.str("POLA_APP_SCAN_RESULT_CACHE_ALIAS", default='default'),
+    'TIMEOUT': env.int("POLA_APP_SCAN_RESULT_CACHE_TIMEOUT", default=24 * 60 * 60),
+}
+
+# EVENT BUFFER
+# ------------------------------------------------------------------------------
+# Scan and search events are inserted in batches by a background thread. See: pola.event_buffer
+EVENT_BUFFER_ENABLE = env.bool("POLA_APP_EVENT_BUFFER_ENABLE", default=True)
+EVENT_BUFFER = {
+    'MAX_SIZE': env.int("POLA_APP_EVENT_BUFFER_MAX_SIZE", default=50000),
+    'BATCH_SIZE': env.int("POLA_APP_EVENT_BUFFER_BATCH_SIZE", default=500),
+    'FLUSH_INTERVAL': env.int("POLA_APP_EVENT_BUFFER_FLUSH_INTERVAL", default=5),
+}
+
+# PRODUCT SEARCH
+# ------------------------------------------------------------------------------
+# Search results are ranked by word similarity + POPULARITY_WEIGHT * ln(1 + query_count).
+# See: pola.product.search
+PRODUCT_SEARCH = {
+    'POPULARITY_WEIGHT': env.float("POLA_APP_PRODUCT_SEARCH_POPULARITY_WEIGHT", default=0.02),
+}
+# In-memory prefix index of /a/v4/suggest, refreshed by each process. See: pola.product.suggest
+PRODUCT_SUGGEST = {
+    'REFRESH_INTERVAL': env.int("POLA_APP_PRODUCT_SUGGEST_REFRESH_INTERVAL", default=60),
+    'FULL_REFRESH_INTERVAL': env.int("POLA_APP_PRODUCT_SUGGEST_FULL_REFRESH_INTERVAL", default=60 * 60),
+    'MAX_PRODUCTS': env.int("POLA_APP_PRODUCT_SUGGEST_MAX_PRODUCTS", default=200_000),
+}
+# Responses of /a/v4/search for the queries asked at least MIN_HITS times within HITS_WINDOW seconds.
+# See: pola.product.search_cache
+SEARCH_RESULT_CACHE_ENABLE = env.bool("POLA_APP_SEARCH_RESULT_CACHE_ENABLE", default=True)
+SEARCH_RESULT_CACHE = {
+    'CACHE_ALIAS': env.str("POLA_APP_SEARCH_RESULT_CACHE_ALIAS", default='default'),
+    'TIMEOUT': env.int("POLA_APP_SEARCH_RESULT_CACHE_TIMEOUT", default=5 * 60),
+    'MIN_HITS': env.int("POLA_APP_SEARCH_RESULT_CACHE_MIN_HITS", default=3),
+    'HITS_WINDOW': env.int("POLA_APP_SEARCH_RESULT_CACHE_HITS_WINDOW", default=10 * 60),
+    'MAX_TERMS': env.int("POLA_APP_SEARCH_RESULT_CACHE_MAX_TERMS", default=1000),
+}
+
+# API RESPONSES
+# ------------------------------------------------------------------------------
+# Encoder of the API responses, 'orjson' or 'json' (the standard library). 'orjson' falls back to 'json' when
+# orjson is not installed. Compare them with the benchmark_api_json command. See: pola.rpc_api.http
+API_JSON_ENCODER = env.str("POLA_APP_API_JSON_ENCODER", default='orjson')
+
+# API RESPONSE VALIDATION
+# ------------------------------------------------------------------------------
+# Fraction of the API responses validated against their schemas. Invalid responses are reported to Sentry, or
+# replaced with an error when STRICT. See: pola.rpc_api.response_validation
+API_RESPONSE_VALIDATION = {
+    'SAMPLE_RATE': env.float("POLA_APP_API_RESPONSE_VALIDATION_SAMPLE_RATE", default=0.01),
+    'STRICT': env.bool("POLA_APP_API_RESPONSE_VALIDATION_STRICT", default=False),
+}
 
 # CMS / Stats configuration
 # ------------------------------------------------------------------------------
@@ -363,3 +507,22 @@ CMS_STATS_EXTERNAL_URL = env.str(
     'POLA_APP_CMS_STATS_EXTERNAL_URL',
     default='https://lookerstudio.google.com/reporting/c8d93b03-e89c-4cbe-be4b-7350ac7d6a67/',
 )
+# Counts and lists of the CMS front page, refreshed by the refresh_work_queue job every INTERVAL seconds.
+# See: pola.work_queue
+WORK_QUEUE = {
+    'INTERVAL': env.int('POLA_APP_WORK_QUEUE_INTERVAL', default=300),
+    'QUEUE': 'low',
+}
+
+# STATS ROLLUP
+# ------------------------------------------------------------------------------
+# Daily rollups of the stats page, updated by the update_stats job every INTERVAL seconds. The scans of the last
+# OVERLAP seconds are counted by the next update. A day is calculated from scratch for the last time
+# FINALIZE_DELAY seconds after its end. See: pola.stats_rollup
+STATS_ROLLUP = {
+    'DAYS': env.int('POLA_APP_STATS_ROLLUP_DAYS', default=30),
+    'FINALIZE_DELAY': env.int('POLA_APP_STATS_ROLLUP_FINALIZE_DELAY', default=600),
+    'INTERVAL': env.int('POLA_APP_STATS_ROLLUP_INTERVAL', default=300),
+    'OVERLAP': env.int('POLA_APP_STATS_ROLLUP_OVERLAP', default=60),
+    'QUEUE': 'low',
+}
@@ -11,8 +11,6 @@ Production Configurations
 # pylint: disable=unused-wildcard-import
 
 import os
-import tempfile
-from pathlib import Path
 from urllib import parse as urlparse
 
 import sentry_sdk
@@ -101,10 +99,17 @@ DATABASES['default'] = env.db("DATABASE_URL")  # noqa: F405
 # ------------------------------------------------------------------------------
 redis_url = urlparse.urlparse(os.environ.get('REDISTOGO_URL', 'redis://localhost:6959'))
 
+# The hot keys are kept in memory of each process, everything else is shared by the dynos in Redis.
+# See: pola.cache_backends
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': Path(tempfile.gettempdir()) / 'pola-app-cache',
+        'BACKEND': 'pola.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'L2_ALIAS': 'redis',
+            'L1_KEY_PREFIXES': ['app_configuration_singleton', 'scan_result:', 'search_result:'],
+            'L1_MAX_ENTRIES': env.int('POLA_APP_CACHE_L1_MAX_ENTRIES', default=1000),  # noqa: F405
+            'L1_TIMEOUT': env.int('POLA_APP_CACHE_L1_TIMEOUT', default=60),  # noqa: F405
+        },
     },
     'redis': {
         'BACKEND': 'redis_cache.RedisCache',
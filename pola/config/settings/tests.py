@@ -26,6 +26,17 @@ EMAIL_BACKEND = env('DJANGO_EMAIL_BACKEND', default='django.core.mail.backends.c
 # CACHING
 # ------------------------------------------------------------------------------
 CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': ''}}
+# The cache outlives the test transactions, tests of the result caches enable them explicitly.
+SCAN_RESULT_CACHE_ENABLE = False
+SEARCH_RESULT_CACHE_ENABLE = False
+# Insert the scan and search events immediately, so tests can assert on them.
+EVENT_BUFFER_ENABLE = False
+# The state is shared through the cache, tests of the circuit breaker enable it explicitly.
+PRODUKTY_W_SIECI_CIRCUIT_BREAKER_ENABLE = False
+# The locks are released when the transactions commit, which the tests do not do.
+PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE = False
+# Every response has to match its schema.
+API_RESPONSE_VALIDATION = {'SAMPLE_RATE': 1, 'STRICT': True}
 
 # TESTING
 # ------------------------------------------------------------------------------
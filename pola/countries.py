@@ -1,11 +1,38 @@
-from typing import Optional
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+KIND_COUNTRY = 'country'
+KIND_GS1_US = 'gs1_us'
+KIND_INTERNAL = 'internal'
+KIND_COUPON = 'coupon'
+KIND_BOOK = 'book'
+KIND_REFUND = 'refund'
+KIND_UNASSIGNED = 'unassigned'
+KIND_INVALID = 'invalid'
+
+
+class Classification(NamedTuple):
+    kind: str
+    country: Optional[str] = None
 
 
 def get_registration_country(code: str) -> Optional[str]:
-    for prefix, name in CODE_PREFIX_TO_COUNTRY.items():
-        if code.startswith(prefix):
-            return name
-    return None
+    if len(code) < 3 or not code[:3].isdigit():
+        return None
+    return _COUNTRY_BY_PREFIX[int(code[:3])]
+
+
+def classify(code: str) -> Classification:
+    """Classifies the code by its 3-digit GS1 prefix."""
+    if len(code) < 3 or not code[:3].isdigit():
+        return _INVALID
+    return _CLASSIFICATION_BY_PREFIX[int(code[:3])]
+
+
+def classify_many(codes: Iterable[str]) -> list[Classification]:
+    """Classifies many codes, e.g. all the product codes for an export, in a single pass."""
+    table = _CLASSIFICATION_BY_PREFIX
+    return [table[int(code[:3])] if len(code) >= 3 and code[:3].isdigit() else _INVALID for code in codes]
 
 
 CODE_PREFIX_TO_COUNTRY = {
@@ -126,3 +153,45 @@ CODE_PREFIX_TO_COUNTRY = {
     "955": "Malezja",
     "958": "Makao",
 }
+
+# Polska is left out of CODE_PREFIX_TO_COUNTRY on purpose, as get_registration_country is used to describe
+# foreign products. It is classified as a country though.
+EXTRA_PREFIX_TO_COUNTRY = {
+    "590": "Polska",
+}
+
+# Prefix ranges without a country, as (first, last, kind). See: https://www.gs1.org/standards/id-keys/company-prefix
+PREFIX_RANGES = (
+    (0, 19, KIND_GS1_US),
+    (20, 29, KIND_INTERNAL),
+    (30, 39, KIND_GS1_US),
+    (40, 49, KIND_INTERNAL),
+    (50, 59, KIND_COUPON),
+    (60, 139, KIND_GS1_US),
+    (200, 299, KIND_INTERNAL),
+    (977, 979, KIND_BOOK),
+    (980, 980, KIND_REFUND),
+    (981, 984, KIND_COUPON),
+    (990, 999, KIND_COUPON),
+)
+
+
+def _build_tables():
+    countries = [None] * 1000
+    classifications = [Classification(KIND_UNASSIGNED)] * 1000
+    for first, last, kind in PREFIX_RANGES:
+        for i in range(first, last + 1):
+            classifications[i] = Classification(kind)
+    # Shorter prefixes first, so the 3-digit ones override them.
+    prefixes = {**CODE_PREFIX_TO_COUNTRY, **EXTRA_PREFIX_TO_COUNTRY}
+    for prefix, name in sorted(prefixes.items(), key=lambda item: len(item[0])):
+        start = int(prefix) * 10 ** (3 - len(prefix))
+        for i in range(start, start + 10 ** (3 - len(prefix))):
+            classifications[i] = Classification(KIND_COUNTRY, name)
+            if prefix in CODE_PREFIX_TO_COUNTRY:
+                countries[i] = name
+    return countries, classifications
+
+
+_COUNTRY_BY_PREFIX, _CLASSIFICATION_BY_PREFIX = _build_tables()
+_INVALID = Classification(KIND_INVALID)
@@ -0,0 +1,190 @@
+"""Archive of old scan and search events in Parquet files in S3.
+
+Each closed month of ``pola_query`` and ``pola_searchquery`` is exported to a zstd-compressed Parquet file
+``<PREFIX>/<table>/year=YYYY/month=MM/<table>-YYYY-MM.parquet`` in ``BUCKET_NAME``. The uploaded file is read back
+and its row count compared with the rows of the month in the database. Only then the rows are deleted and the range
+is recorded in :class:`pola.models.ArchivedEventRange`. Months of ``pola_query`` with their own partition (see
+``pola.query_partitions``) are dropped with the partition, in the same transaction which records the range. Months
+in ``pola_query_legacy`` are deleted in batches, each committed on its own, and the range is recorded after them.
+
+``<PREFIX>/manifest.json`` lists the archived ranges and their files. The files use hive-style partitioning, so
+analysts can read them locally, e.g. with DuckDB::
+
+    SELECT count(*) FROM read_parquet('s3://<bucket>/events/pola_query/*/*/*.parquet', hive_partitioning = true);
+
+``query_count`` of the products and companies keeps counting the archived scans, but the ``recalculate_*``
+methods count only the rows left in the database.
+"""
+
+import json
+import logging
+import tempfile
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+
+from pola import query_partitions
+from pola.models import ArchivedEventRange, Query, SearchQuery
+from pola.s3 import create_s3_client
+
+LOGGER = logging.getLogger(__file__)
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+ARCHIVES = {
+    Query._meta.db_table: (
+        Query,
+        pa.schema(
+            [
+                ('id', pa.int64()),
+                ('client', pa.string()),
+                ('product_id', pa.int64()),
+                ('was_verified', pa.bool_()),
+                ('was_plScore', pa.bool_()),
+                ('was_590', pa.bool_()),
+                ('timestamp', TIMESTAMP),
+            ]
+        ),
+    ),
+    SearchQuery._meta.db_table: (
+        SearchQuery,
+        pa.schema([('id', pa.int64()), ('client', pa.string()), ('text', pa.string()), ('timestamp', TIMESTAMP)]),
+    ),
+}
+
+
+class ArchiveVerificationError(Exception):
+    pass
+
+
+def get_key(table, start):
+    prefix = settings.EVENT_ARCHIVE['PREFIX']
+    return f'{prefix}/{table}/year={start:%Y}/month={start:%m}/{table}-{start:%Y-%m}.parquet'
+
+
+def get_closed_months(older_than_months, now=None):
+    """Returns the starts of the months which ended ``older_than_months`` months ago, oldest first.
+
+    The oldest month is the month of the oldest event in any of the archived tables.
+    """
+    current_month = query_partitions.month_start(now or datetime.now(timezone.utc))
+    end = query_partitions.add_months(current_month, -older_than_months)
+    oldest = [
+        model.objects.filter(timestamp__lt=end).order_by('timestamp').values_list('timestamp', flat=True).first()
+        for model, _ in ARCHIVES.values()
+    ]
+    oldest = [timestamp for timestamp in oldest if timestamp is not None]
+    if not oldest:
+        return []
+    month = query_partitions.month_start(min(oldest))
+    months = []
+    while month < end:
+        months.append(month)
+        month = query_partitions.add_months(month, 1)
+    return months
+
+
+def _export(queryset, schema, path):
+    """Writes the rows of the queryset to a Parquet file. Returns the number of the rows."""
+    batch_size = settings.EVENT_ARCHIVE['BATCH_SIZE']
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        batch = []
+        for row in queryset.values_list(*schema.names).iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_batch(pa.RecordBatch.from_arrays(list(map(list, zip(*batch))), schema=schema))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_arrays(list(map(list, zip(*batch))), schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def _is_legacy(table, end):
+    if table != query_partitions.TABLE:
+        return False
+    legacy_end = query_partitions.get_legacy_end()
+    return legacy_end is not None and end <= legacy_end
+
+
+def _delete(table, model, start, end):
+    if table == query_partitions.TABLE and start in query_partitions.get_partitions():
+        return query_partitions.drop_partition(start)
+    deleted, _ = model.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+    return deleted
+
+
+def archive_month(table, start):
+    """Moves the events of the month starting at ``start`` to the archive. Returns the archived range, or ``None``.
+
+    Raises :class:`ArchiveVerificationError` and keeps the rows when the file does not match the database.
+    """
+    model, schema = ARCHIVES[table]
+    end = query_partitions.add_months(start, 1)
+    queryset = model.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if ArchivedEventRange.objects.filter(table=table, start=start).exists() or not queryset.exists():
+        return None
+
+    bucket = settings.EVENT_ARCHIVE['BUCKET_NAME']
+    key = get_key(table, start)
+    s3_client = create_s3_client()
+    with tempfile.NamedTemporaryFile(suffix='.parquet') as exported, tempfile.NamedTemporaryFile() as uploaded:
+        row_count = _export(queryset, schema, exported.name)
+        s3_client.upload_file(exported.name, bucket, key)
+        s3_client.download_file(bucket, key, uploaded.name)
+        archived_rows = pq.ParquetFile(uploaded.name).metadata.num_rows
+    if archived_rows != row_count:
+        raise ArchiveVerificationError(f'{key} has {archived_rows} rows, {row_count} were exported')
+    stored_rows = queryset.count()
+    if stored_rows != row_count:
+        raise ArchiveVerificationError(f'{table} has {stored_rows} rows of the month, {row_count} were archived')
+
+    location = f's3://{bucket}/{key}'
+    if _is_legacy(table, end):
+        # A month of pola_query_legacy is deleted in batches, each committed on its own, so that it does not hold
+        # the locks for long. The rows are verified to be in the file above, the range is recorded after them.
+        deleted = query_partitions.delete_legacy_rows(start, end)
+        if deleted != row_count:
+            LOGGER.warning('%d rows of %s were deleted, %d were archived to %s', deleted, table, row_count, location)
+        archived_range = ArchivedEventRange.objects.create(
+            table=table, start=start, end=end, location=location, row_count=row_count
+        )
+    else:
+        with transaction.atomic():
+            deleted = _delete(table, model, start, end)
+            if deleted != row_count:
+                # Rolls back the deletion, the file is overwritten by the next attempt.
+                raise ArchiveVerificationError(f'{deleted} rows of {table} were deleted, {row_count} were archived')
+            archived_range = ArchivedEventRange.objects.create(
+                table=table, start=start, end=end, location=location, row_count=row_count
+            )
+    LOGGER.info('Archived %d rows of %s from %s to %s', row_count, table, start, archived_range.location)
+    return archived_range
+
+
+def write_manifest():
+    manifest = {
+        'ranges': [
+            {
+                'table': archived_range.table,
+                'start': archived_range.start.isoformat(),
+                'end': archived_range.end.isoformat(),
+                'location': archived_range.location,
+                'rows': archived_range.row_count,
+                'archived_at': archived_range.archived_at.isoformat(),
+            }
+            for archived_range in ArchivedEventRange.objects.all()
+        ]
+    }
+    create_s3_client().put_object(
+        Bucket=settings.EVENT_ARCHIVE['BUCKET_NAME'],
+        Key=f'{settings.EVENT_ARCHIVE["PREFIX"]}/manifest.json',
+        Body=json.dumps(manifest, indent=2).encode(),
+        ContentType='application/json',
+    )
+    return manifest
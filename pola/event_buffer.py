@@ -0,0 +1,197 @@
+"""Write-behind buffers for scan and search events.
+
+Each worker process keeps the events in memory and a background thread inserts them in batches, so the requests
+do not wait for the inserts. The buffers are flushed when they reach ``BATCH_SIZE``, every ``FLUSH_INTERVAL``
+seconds and when the process exits.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.utils import timezone
+
+from pola.models import Query, SearchQuery
+from pola.scan_counters import company_query_counts, product_query_counts
+
+LOGGER = logging.getLogger(__file__)
+
+
+class EventBuffer:
+    """Bounded in-memory buffer of unsaved model instances of a single model.
+
+    When the buffer is full, new events are dropped and counted in ``dropped``. The ``counters`` (see
+    ``pola.scan_counters``) count the buffered events and are folded in the same transaction as the events.
+    """
+
+    def __init__(self, model, max_size=None, batch_size=None, flush_interval=None, counters=()):
+        self.model = model
+        self.counters = counters
+        self.max_size = max_size or settings.EVENT_BUFFER['MAX_SIZE']
+        self.batch_size = batch_size or settings.EVENT_BUFFER['BATCH_SIZE']
+        self.flush_interval = flush_interval or settings.EVENT_BUFFER['FLUSH_INTERVAL']
+        self.dropped = 0
+        self.flushed = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, instance):
+        """Schedules the instance to be inserted. Returns ``False`` if the event was dropped."""
+        return self.add_many([instance]) == 1
+
+    def add_many(self, instances):
+        """Schedules the instances to be inserted. Returns the number of the instances that were not dropped."""
+        if not instances:
+            return 0
+        if not settings.EVENT_BUFFER_ENABLE:
+            with transaction.atomic():
+                self._insert(instances)
+                for counter in self.counters:
+                    for instance in instances:
+                        counter.add(instance)
+                    counter.fold(counter.drain(), connection)
+            self.flushed += len(instances)
+            return len(instances)
+
+        self._ensure_thread()
+        with self._lock:
+            accepted = instances[: max(self.max_size - len(self._events), 0)]
+            self.dropped += len(instances) - len(accepted)
+            self._events.extend(accepted)
+            for counter in self.counters:
+                for instance in accepted:
+                    counter.add(instance)
+            if len(self._events) >= self.batch_size:
+                self._wakeup.set()
+        return len(accepted)
+
+    def add_on_commit(self, instance):
+        """Adds the instance when the current transaction commits, so events of failed requests are not stored."""
+        self.add_many_on_commit([instance])
+
+    def add_many_on_commit(self, instances):
+        if not settings.EVENT_BUFFER_ENABLE:
+            self.add_many(instances)
+            return
+        transaction.on_commit(lambda: self.add_many(instances))
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                deltas = [counter.drain() for counter in self.counters]
+            if not events:
+                return
+            for attempt in range(2):
+                try:
+                    with transaction.atomic():
+                        for i in range(0, len(events), self.batch_size):
+                            self._insert(events[i : i + self.batch_size])
+                        for counter, counter_deltas in zip(self.counters, deltas):
+                            counter.fold(counter_deltas, connection)
+                except DatabaseError:
+                    if attempt == 0:
+                        # Retried once, e.g. after a deadlock or a lost connection.
+                        LOGGER.warning(f"Retrying the insert into {self.model._meta.db_table}", exc_info=True)
+                        if not connection.in_atomic_block:
+                            connection.close_if_unusable_or_obsolete()
+                        continue
+                    LOGGER.exception(f"Failed to insert {len(events)} events into {self.model._meta.db_table}")
+                    self.dropped += len(events)
+                else:
+                    self.flushed += len(events)
+                break
+
+    def _insert(self, instances):
+        # Raw multi-row INSERT instead of bulk_create, which would overwrite the auto_now_add timestamps with the
+        # time of the flush.
+        fields = [f for f in self.model._meta.concrete_fields if not f.primary_key]
+        columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+        row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        sql = f'INSERT INTO {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) VALUES '
+        sql += ', '.join([row] * len(instances))
+        params = [f.get_db_prep_save(getattr(obj, f.attname), connection) for obj in instances for f in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _ensure_thread(self):
+        # The thread is started lazily, because the workers are forked after the import.
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name=f'event-buffer-{self.model._meta.db_table}', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+query_events = EventBuffer(Query, counters=(product_query_counts, company_query_counts))
+search_query_events = EventBuffer(SearchQuery)
+BUFFERS = (query_events, search_query_events)
+
+
+def record_query(client, product, was_verified, was_590, was_plScore):
+    query_events.add_on_commit(
+        Query(
+            client=client,
+            product=product,
+            was_verified=was_verified,
+            was_590=was_590,
+            was_plScore=was_plScore,
+            timestamp=timezone.now(),
+        )
+    )
+
+
+def record_queries(client, scans):
+    """Records the scans of a batch lookup. ``scans`` are ``(product, stats)`` pairs."""
+    timestamp = timezone.now()
+    query_events.add_many_on_commit(
+        [
+            Query(
+                client=client,
+                product=product,
+                was_verified=stats['was_verified'],
+                was_590=stats['was_590'],
+                was_plScore=stats['was_plScore'],
+                timestamp=timestamp,
+            )
+            for product, stats in scans
+        ]
+    )
+
+
+def record_search_query(client, text):
+    search_query_events.add_on_commit(SearchQuery(client=client, text=text, timestamp=timezone.now()))
+
+
+def get_stats():
+    return {b.model._meta.db_table: {'buffered': len(b), 'flushed': b.flushed, 'dropped': b.dropped} for b in BUFFERS}
+
+
+@atexit.register
+def flush_all():
+    for buffer in BUFFERS:
+        if len(buffer):
+            buffer.flush()
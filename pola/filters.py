@@ -1,5 +1,7 @@
 from django.utils.translation import gettext_lazy as _
 
+from pola import text_search
+
 
 class CrispyFilterMixin:
     form_class = 'form'
@@ -16,3 +18,26 @@ class CrispyFilterMixin:
         self._form.helper.form_method = 'get'
         self._form.helper.layout.append(Submit('filter', _('Filtruj')))
         return self._form
+
+
+class SimilarityOrderingMixin:
+    """Orders the results of the ``icontains`` filters by the similarity to the searched values.
+
+    An ordering chosen in the ``o`` filter takes precedence.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        data = self.form.cleaned_data
+        if data.get('o'):
+            return queryset
+        terms = [
+            (f.field_name, data[name])
+            for name, f in self.filters.items()
+            if f.lookup_expr == 'icontains' and data.get(name)
+        ]
+        if not terms:
+            return queryset
+        return queryset.annotate(**{text_search.RANK: text_search.similarity(terms)}).order_by(
+            f'-{text_search.RANK}', 'pk'
+        )
@@ -4,6 +4,8 @@ from time import sleep
 import requests
 from django.conf import settings
 
+from pola.integrations.http import http_session
+
 
 class GetResponseClient:
     def __init__(self, api_token: str, base_url: str = "https://api.getresponse.com/v3"):
@@ -24,28 +26,27 @@ class GetResponseClient:
         kwargs.setdefault('headers', {})
         kwargs['headers']['X-Auth-Token'] = f"api-key {self._api_token}"
 
-        with requests.Session() as session:
-            for retry_num in range(num_retries + 1):
-                if retry_num > 0:
-                    # Sleep before retrying.
-                    sleep_time = random() * 2**retry_num / 4
-                    sleep(sleep_time)
-                try:
-                    exception = None
-                    response = session.request(method, url, **kwargs)
-                    response.raise_for_status()
-                except requests.HTTPError as http_error:
-                    exception = http_error
-
-                if exception:
-                    if retry_num == num_retries or 400 <= response.status_code < 500:
-                        raise exception
-                    else:
-                        continue
+        for retry_num in range(num_retries + 1):
+            if retry_num > 0:
+                # Sleep before retrying.
+                sleep_time = random() * 2**retry_num / 4
+                sleep(sleep_time)
+            try:
+                exception = None
+                response = http_session.request(method, url, **kwargs)
+                response.raise_for_status()
+            except requests.HTTPError as http_error:
+                exception = http_error
+
+            if exception:
+                if retry_num == num_retries or 400 <= response.status_code < 500:
+                    raise exception
                 else:
-                    break
+                    continue
+            else:
+                break
 
-            return response
+        return response
 
 
 if 'BASE_URL' in settings.GET_RESPONSE:
@@ -0,0 +1,63 @@
+"""Connection-pooled HTTP transport shared by the API clients of a process."""
+
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """Long-lived ``requests.Session`` keeping the connections alive between the calls.
+
+    The session is recreated after a fork, so the workers do not share sockets. Requests without a timeout get the
+    ``HTTP_CLIENT`` timeouts.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.pool_size = pool_size or settings.HTTP_CLIENT['POOL_SIZE']
+        self.timeout = (
+            connect_timeout or settings.HTTP_CLIENT['CONNECT_TIMEOUT'],
+            read_timeout or settings.HTTP_CLIENT['READ_TIMEOUT'],
+        )
+        self.requests_count = 0
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+                    self.requests_count = 0
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        session = self._get_session()
+        self.requests_count += 1
+        return session.request(method, url, **kwargs)
+
+    def get_stats(self):
+        """Returns the number of requests and of the connections opened to make them."""
+        connections_count = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    connections_count += adapter.poolmanager.pools[key].num_connections
+        return {
+            'requests': self.requests_count,
+            'connections': connections_count,
+            'reused': max(self.requests_count - connections_count, 0),
+        }
+
+
+http_session = PooledSession()
@@ -1,11 +1,14 @@
 from random import random
-from time import sleep
+from time import monotonic, sleep
 from typing import Optional
 
 import requests
 from django.conf import settings
 from pydantic import BaseModel
 
+from pola.integrations.http import http_session
+from pola.integrations.resilience import CircuitBreaker, RetryBudget
+
 NOT_FOUND_ERRORMSG = "not_found"
 UNKNOWN_ERRORMSG = "unknown_error"
 
@@ -14,6 +17,10 @@ class ApiException(Exception):
     pass
 
 
+class CircuitOpenException(ApiException):
+    pass
+
+
 class CompanyBase(BaseModel):
     name: str
     nip: Optional[str]
@@ -54,43 +61,90 @@ class ProduktyWSieciClient:
     def __init__(self, api_token: str, base_url: str = "https://www.eprodukty.gs1.pl/external_api/v2/"):
         self._api_token = api_token
         self._base_url = base_url
+        breaker_settings = settings.PRODUKTY_W_SIECI_CIRCUIT_BREAKER
+        self.circuit_breaker = CircuitBreaker(
+            'produkty_w_sieci',
+            cache_alias=settings.PRODUKTY_W_SIECI_CACHE_ALIAS,
+            failure_threshold=breaker_settings['FAILURE_THRESHOLD'],
+            failure_window=breaker_settings['FAILURE_WINDOW'],
+            reset_timeout=breaker_settings['RESET_TIMEOUT'],
+        )
+        self.retry_budget = RetryBudget(
+            'produkty_w_sieci',
+            cache_alias=settings.PRODUKTY_W_SIECI_CACHE_ALIAS,
+            ratio=breaker_settings['RETRY_RATIO'],
+            min_retries=breaker_settings['MIN_RETRIES'],
+            window=breaker_settings['RETRY_WINDOW'],
+        )
 
     def get_products(
         self,
         *,
         gtin_number: str,
         num_retries: Optional[int] = 5,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
     ) -> Optional[ProductBase]:
+        """Returns the product or ``None`` if it is not found.
+
+        ``deadline`` is a :func:`time.monotonic` value, after which no more attempts are made.
+        """
         uri = self._base_url.rstrip("/") + "/products/" + gtin_number + "?include_local_data=true"
         params = {}
 
-        response = self._send_request('get', uri, params=params, num_retries=num_retries)
+        response = self._send_request(
+            'get', uri, params=params, num_retries=num_retries, timeout=timeout, deadline=deadline
+        )
         return None if response is None else ProductBase.parse_obj(response)
 
-    def _send_request(self, method, url, *, num_retries, **kwargs):
+    def _send_request(self, method, url, *, num_retries, deadline=None, **kwargs):
         kwargs.setdefault('headers', {})
         kwargs['headers']['X-API-KEY'] = self._api_token
+        resilience_enabled = settings.PRODUKTY_W_SIECI_CIRCUIT_BREAKER_ENABLE
 
-        with requests.Session() as session:
+        if resilience_enabled:
+            if not self.circuit_breaker.allow_request():
+                raise CircuitOpenException('Produkty w Sieci is unavailable')
+            self.retry_budget.record_request()
+
+        # Whether the API answered. The circuit breaker counts the request as a failure otherwise, so a probe
+        # let through a half-open circuit always closes or opens it again.
+        answered = False
+        try:
             for retry_num in range(num_retries + 1):
-                if retry_num > 0:
-                    # Sleep before retrying.
-                    sleep_time = random() * 2**retry_num / 4
-                    sleep(sleep_time)
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise ApiException('Deadline exceeded')
+                    kwargs['timeout'] = min(kwargs['timeout'], remaining) if kwargs.get('timeout') else remaining
                 try:
                     exception = None
-                    response = session.request(method, url, **kwargs)
+                    response = http_session.request(method, url, **kwargs)
                     response.raise_for_status()
                 except requests.exceptions.HTTPError as http_error:
+                    if 400 <= response.status_code < 500:
+                        answered = True
+                        raise ApiException(str(http_error))
                     exception = http_error
+                except requests.exceptions.RequestException as transport_error:
+                    # Timeouts and connection errors are retried like the server errors.
+                    exception = transport_error
 
                 if exception:
-                    if retry_num == num_retries or 400 <= response.status_code < 500:
-                        raise ApiException(str(exception))
-                    else:
-                        continue
+                    # Sleep before retrying, unless it would not fit in the deadline or the retry budget.
+                    sleep_time = random() * 2 ** (retry_num + 1) / 4
+                    give_up = (
+                        retry_num == num_retries
+                        or (deadline is not None and monotonic() + sleep_time >= deadline)
+                        or (resilience_enabled and not self.retry_budget.try_acquire())
+                    )
+                    if give_up:
+                        raise ApiException(str(exception)) from exception
+                    sleep(sleep_time)
+                    continue
 
                 response_json = response.json()
+                answered = True
                 if 'errors' in response_json:
                     errorTable = response_json['errors']
                     if NOT_FOUND_ERRORMSG in str(errorTable):  # when product not found in the GS1 API
@@ -104,6 +158,12 @@ class ProduktyWSieciClient:
                         raise ApiException('Unknown error response: ' + str(errorTable))
                 break
             return response_json
+        finally:
+            if resilience_enabled:
+                if answered:
+                    self.circuit_breaker.record_success()
+                else:
+                    self.circuit_breaker.record_failure()
 
 
 if 'BASE_URL' in settings.PRODUKTY_W_SIECI:
@@ -0,0 +1,103 @@
+"""Circuit breaker and retry budget for the external APIs.
+
+The state is kept in a cache shared by the workers, so all of them stop calling an API that is down.
+"""
+
+import time
+
+from django.core.cache import caches
+
+
+class CircuitBreaker:
+    """Stops the calls to a failing API.
+
+    The breaker is *closed* until ``failure_threshold`` failures happen within ``failure_window`` seconds. Then it
+    is *open* and no calls are allowed for ``reset_timeout`` seconds. After that it is *half-open* and lets a single
+    probe call through: its success closes the breaker, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, cache_alias, failure_threshold, failure_window, reset_timeout):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, suffix):
+        return f'circuit_breaker:{self.name}:{suffix}'
+
+    def state(self):
+        values = self._cache().get_many([self._key(self.OPEN), self._key(self.HALF_OPEN)])
+        if self._key(self.OPEN) in values:
+            return self.OPEN
+        if self._key(self.HALF_OPEN) in values:
+            return self.HALF_OPEN
+        return self.CLOSED
+
+    def allow_request(self):
+        state = self.state()
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        return self._cache().add(self._key('probe'), True, self.reset_timeout)
+
+    def record_success(self):
+        if self.state() != self.CLOSED:
+            self._cache().delete_many([self._key(self.HALF_OPEN), self._key('probe'), self._key('failures')])
+
+    def record_failure(self):
+        if self.state() == self.HALF_OPEN:
+            self.open()
+            return
+        if _incr(self._cache(), self._key('failures'), self.failure_window) >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        cache = self._cache()
+        cache.set(self._key(self.OPEN), True, self.reset_timeout)
+        cache.set(self._key(self.HALF_OPEN), True, None)
+        cache.delete_many([self._key('probe'), self._key('failures')])
+
+
+class RetryBudget:
+    """Caps the retries at ``ratio`` of the requests made within ``window`` seconds, plus ``min_retries``."""
+
+    def __init__(self, name, cache_alias, ratio, min_retries, window):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+
+    def _key(self, suffix):
+        return f'retry_budget:{self.name}:{int(time.time() // self.window)}:{suffix}'
+
+    def record_request(self):
+        _incr(caches[self.cache_alias], self._key('requests'), self.window)
+
+    def try_acquire(self):
+        cache = caches[self.cache_alias]
+        values = cache.get_many([self._key('requests'), self._key('retries')])
+        allowed = self.min_retries + self.ratio * values.get(self._key('requests'), 0)
+        if values.get(self._key('retries'), 0) >= allowed:
+            return False
+        _incr(cache, self._key('retries'), self.window)
+        return True
+
+
+def _incr(cache, key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key expired in the meantime.
+        cache.set(key, 1, timeout)
+        return 1
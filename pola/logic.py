@@ -1,15 +1,27 @@
+import time
+
 import sentry_sdk
 from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
 
-from pola.company.models import Brand
-from pola.countries import get_registration_country
+from pola.countries import KIND_BOOK, classify, get_registration_country
 from pola.integrations.produkty_w_sieci import (
     ApiException,
-    produkty_w_sieci_client,
+    CircuitOpenException,
+)
+from pola.logic_produkty_w_sieci import (
+    NEGATIVE_ERROR,
+    create_within_budget,
+    fetch_from_api,
+    get_negative_entry,
+    is_code_supported,
+    is_enrichment_pending,
+    remember_negative_result,
+    schedule_enrichment,
 )
-from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
 from pola.logic_score import get_pl_score
 from pola.product.models import Product
+from pola.single_flight import SingleFlightTimeout
 from pola.text_utils import _shorten_txt, strip_urls_newlines
 
 WAR_COUNTRIES = ('Federacja Rosyjska', "Białoruś")
@@ -52,18 +64,48 @@ DEFAULT_RESULT = {
 DEFAULT_STATS = {'was_verified': False, 'was_590': False, 'was_plScore': False}
 
 
+def is_ean(code):
+    return code.isdigit() and (len(code) == 8 or len(code) == 13)
+
+
 def get_result_from_code(code, multiple_company_supported=False, report_as_object=False):
+    product = get_by_code(code) if is_ean(code) else None
+    return build_result(code, product, multiple_company_supported, report_as_object)
+
+
+def get_results_from_codes(codes, multiple_company_supported=False, report_as_object=False):
+    """Resolves many codes at once, returning ``(result, stats, product)`` for each code in order.
+
+    Unlike :func:`get_result_from_code`, Produkty w Sieci is not called inline. The unknown products are created
+    in a single query and their enrichment is scheduled in the background.
+    """
+    valid_codes = [code for code in dict.fromkeys(codes) if is_ean(code)]
+    products = get_products_for_scan(valid_codes)
+    missing_codes = [code for code in valid_codes if code not in products]
+    if missing_codes:
+        # Another request may create some of the products in the meantime.
+        Product.objects.bulk_create([Product(code=code) for code in missing_codes], ignore_conflicts=True)
+        products.update(get_products_for_scan(missing_codes))
+    for code, product in products.items():
+        if not product.company_id and _can_enrich(code):
+            schedule_enrichment(code)
+    return [build_result(code, products.get(code), multiple_company_supported, report_as_object) for code in codes]
+
+
+def _can_enrich(code):
+    return is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE and get_negative_entry(code) is None
+
+
+def build_result(code, product, multiple_company_supported=False, report_as_object=False):
     result = DEFAULT_RESULT.copy()
     stats = DEFAULT_STATS.copy()
     report = DEFAULT_REPORT_DATA.copy()
-    product = None
 
     result['code'] = code
     if not multiple_company_supported:
         result.update(DEFAULT_COMPANY_DATA)
-    if code.isdigit() and (len(code) == 8 or len(code) == 13):
+    if is_ean(code):
         # code is EAN8 or EAN13
-        product = get_by_code(code)
         if product:
             product_company = product.company
             brand_company = product.brand.company if product.brand else None
@@ -115,7 +157,7 @@ def serialize_brand(brand):
 def _find_replacements(replacements_rel):
     """Find replacements for a product and serialize them."""
     items = []
-    for r in replacements_rel.order_by("id"):
+    for r in sorted(replacements_rel.all(), key=lambda r: r.id):
         company = r.company
         company_name = None
         if company:
@@ -195,13 +237,13 @@ def append_brands_if_enabled(company, company_data):
     if company_data['description']:
         company_data['description'] += "\n"
 
-    brand_list = ", ".join(sorted(str(brand) for brand in Brand.objects.filter(company=company)))
+    brand_list = ", ".join(sorted(str(brand) for brand in company.brand_set.all()))
     company_data['description'] += f'Ten producent psoiada marki: {brand_list}.'
 
 
 def add_brands(company_data, product_company):
     if product_company:
-        company_data['brands'] = [serialize_brand(brand) for brand in Brand.objects.filter(company=product_company)]
+        company_data['brands'] = [serialize_brand(brand) for brand in product_company.brand_set.all()]
 
 
 def handle_multiple_companies(code, companies, result, stats, product_company):
@@ -219,7 +261,17 @@ def handle_multiple_companies(code, companies, result, stats, product_company):
 
 def handle_unknown_company(code, report, result, multiple_company_supported):
     # we don't know the manufacturer
-    if code.startswith('590'):
+    if code.startswith('590') and is_enrichment_pending(code):
+        # the data is being fetched in the background, the client should scan again in a moment
+        result['name'] = "Pobieramy dane o tym produkcie"
+        result['altText'] = (
+            "Tego produktu nie mamy jeszcze w bazie, ale właśnie pobieramy o nim dane. "
+            "Zeskanuj go ponownie za chwilę."
+        )
+        result['card_type'] = TYPE_GREY
+        report['text'] = "Bardzo prosimy o zgłoszenie nam tego produktu"
+        report['button_type'] = TYPE_RED
+    elif code.startswith('590'):
         # the code is registered in Poland, we want more data!
         result['name'] = "Tego produktu nie mamy jeszcze w bazie"
         result['altText'] = (
@@ -232,7 +284,7 @@ def handle_unknown_company(code, report, result, multiple_company_supported):
         result['card_type'] = TYPE_GREY
         report['text'] = "Bardzo prosimy o zgłoszenie nam tego produktu"
         report['button_type'] = TYPE_RED
-    elif code.startswith('977') or code.startswith('978') or code.startswith('979'):
+    elif classify(code).kind == KIND_BOOK:
         # this is an ISBN/ISSN/ISMN number
         # (book, music album or magazine)
         result['name'] = 'Kod ISBN/ISSN/ISMN'
@@ -323,24 +375,77 @@ def serialize_company(company):
 def _process_with_produkty_w_sieci(code, product=None) -> Product | None:
     try:
         if is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE:
-            products_response = produkty_w_sieci_client.get_products(gtin_number=code)
-            return create_from_api(code, products_response, product=product)
+            if settings.PRODUKTY_W_SIECI_ASYNC_ENABLE:
+                return create_within_budget(code, product=product)
+            deadline = time.monotonic() + settings.PRODUKTY_W_SIECI_CIRCUIT_BREAKER['SCAN_DEADLINE']
+            return fetch_from_api(code, product=product, deadline=deadline)
+    except CircuitOpenException:
+        # The API is down, show what we know without waiting for it.
+        return None
     except ApiException as ex:
         sentry_sdk.capture_exception(ex)
+        remember_negative_result(code, NEGATIVE_ERROR)
     return None
 
 
+def _scan_queryset():
+    return Product.objects.select_related('company', 'brand__company')
+
+
+def _prefetch_for_scan(products):
+    for product in products:
+        if product.brand and product.brand.company_id and product.brand.company_id == product.company_id:
+            # Share the instance, so the brands of the company are fetched once.
+            product.brand.company = product.company
+    prefetch_related_objects(
+        products,
+        Prefetch('replacements', queryset=Product.objects.select_related('company', 'brand')),
+        'company__brand_set',
+        'brand__company__brand_set',
+    )
+
+
+def get_product_for_scan(code):
+    """Loads the product with everything :func:`get_result_from_code` needs for the card.
+
+    Typically three queries: the product with its company and brand, the replacements and the brands of the
+    companies.
+    """
+    product = _scan_queryset().get(code=code)
+    _prefetch_for_scan([product])
+    return product
+
+
+def get_products_for_scan(codes):
+    """Like :func:`get_product_for_scan`, but loads all the products in the same number of queries.
+
+    Returns a dict keyed by code without the codes that are not in the database.
+    """
+    if not codes:
+        return {}
+    products = list(_scan_queryset().filter(code__in=codes))
+    _prefetch_for_scan(products)
+    return {product.code: product for product in products}
+
+
 def get_by_code(code):
+    """Returns the product of the code, creating it from Produkty w Sieci or empty if it is not in the database.
+
+    Returns ``None`` while another request is still creating the product, so the scan does not race it.
+    """
     try:
-        product = Product.objects.get(code=code)
-        # If product exists but has no assigned company, still try to create from API
-        if not product.company:
-            res = _process_with_produkty_w_sieci(code, product=product)
-            if res:
-                return res
-        return product
+        product = get_product_for_scan(code)
     except Product.DoesNotExist:
-        res = _process_with_produkty_w_sieci(code, product=None)
+        product = None
+    # If product exists but has no assigned company, still try to create from API
+    if product is None or not product.company:
+        try:
+            res = _process_with_produkty_w_sieci(code, product=product)
+        except SingleFlightTimeout:
+            return product
         if res:
             return res
-    return Product.objects.create(code=code)
+    if product is None:
+        # Another request may have created the product in the meantime.
+        product, _ = Product.objects.get_or_create(code=code)
+    return product
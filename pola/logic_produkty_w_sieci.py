@@ -1,21 +1,209 @@
 import logging
+import threading
+import time
+from contextlib import nullcontext
+from functools import partial
 from typing import Optional
 
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from rq import Queue
+
 from pola.company.models import Brand, Company
 from pola.gpc.models import GPCBrick
-from pola.integrations.produkty_w_sieci import ProductBase
+from pola.integrations.produkty_w_sieci import (
+    ApiException,
+    CircuitOpenException,
+    ProductBase,
+    produkty_w_sieci_client,
+)
 from pola.logic_bot_report import create_bot_report
 from pola.product.models import Product
+from pola.rq_worker import conn
+from pola.single_flight import SingleFlightTimeout, single_flight
 from pola.text_utils import strip_dbl_spaces
 
 LOGGER = logging.getLogger(__file__)
 
+PENDING_KEY_PREFIX = 'produkty_w_sieci_pending'
+NEGATIVE_KEY_PREFIX = 'produkty_w_sieci_negative'
+NEGATIVE_GENERATION_KEY = 'produkty_w_sieci_negative_generation'
+
+NEGATIVE_NOT_FOUND = 'not_found'
+NEGATIVE_ERROR = 'error'
+NEGATIVE_NO_COMPANY = 'no_company'
+NEGATIVE_TIMEOUT_SETTINGS = {
+    NEGATIVE_NOT_FOUND: 'NOT_FOUND_TIMEOUT',
+    NEGATIVE_ERROR: 'ERROR_TIMEOUT',
+    NEGATIVE_NO_COMPANY: 'NO_COMPANY_TIMEOUT',
+}
+
+
+# Codes of the enrichments scheduled by the thread and not enqueued yet, see: schedule_enrichment
+_local = threading.local()
+
 
 def is_code_supported(code: str):
     # Check if 590 only is supported by GS1
     return code[0:3] == '590' and len(code) == 13
 
 
+def _get_cache():
+    return caches[settings.PRODUKTY_W_SIECI_CACHE_ALIAS]
+
+
+def _pending_key(code: str) -> str:
+    return f'{PENDING_KEY_PREFIX}:{code}'
+
+
+def is_enrichment_pending(code: str) -> bool:
+    return _get_cache().get(_pending_key(code)) is not None
+
+
+def schedule_enrichment(code: str) -> None:
+    """Enqueues :func:`enrich_product` unless a job for the code is already pending.
+
+    The job is enqueued when the current transaction commits, so it does not race the request on creating the
+    product. If the transaction is rolled back, the pending flag is cleared when the request finishes.
+    """
+    if not _get_cache().add(_pending_key(code), True, settings.PRODUKTY_W_SIECI_ASYNC['PENDING_TIMEOUT']):
+        return
+    LOGGER.info("Scheduling the enrichment of product %s", code)
+    _get_uncommitted_codes().add(code)
+    transaction.on_commit(partial(_enqueue_enrichment, code))
+
+
+def _get_uncommitted_codes() -> set:
+    if not hasattr(_local, 'uncommitted_codes'):
+        _local.uncommitted_codes = set()
+    return _local.uncommitted_codes
+
+
+def _enqueue_enrichment(code: str) -> None:
+    _get_uncommitted_codes().discard(code)
+    Queue(settings.PRODUKTY_W_SIECI_ASYNC['QUEUE'], connection=conn).enqueue(enrich_product, code)
+
+
+@receiver(request_finished)
+def clear_rolled_back_enrichments(**kwargs):
+    """Clears the pending flags of the enrichments scheduled in a transaction which was rolled back."""
+    codes = _get_uncommitted_codes()
+    if codes:
+        _get_cache().delete_many([_pending_key(code) for code in codes])
+        codes.clear()
+
+
+def _negative_key(code: str) -> str:
+    # The generation lets purge_negative_entries drop all the entries at once.
+    generation = _get_cache().get(NEGATIVE_GENERATION_KEY, 0)
+    return f'{NEGATIVE_KEY_PREFIX}:{generation}:{code}'
+
+
+def get_negative_entry(code: str) -> Optional[dict]:
+    """Returns ``{'status': ..., 'expires_at': ...}`` if the code should not be looked up in the API now."""
+    return _get_cache().get(_negative_key(code))
+
+
+def remember_negative_result(code: str, status: str) -> None:
+    timeout = settings.PRODUKTY_W_SIECI_NEGATIVE_CACHE[NEGATIVE_TIMEOUT_SETTINGS[status]]
+    LOGGER.info("Remembering %s result for product %s for %s seconds", status, code, timeout)
+    _get_cache().set(_negative_key(code), {'status': status, 'expires_at': time.time() + timeout}, timeout)
+
+
+def purge_negative_entries(codes: Optional[list[str]] = None) -> None:
+    """Removes the entries of the codes or all the entries if no codes are given."""
+    cache = _get_cache()
+    if codes is None:
+        cache.add(NEGATIVE_GENERATION_KEY, 0, timeout=None)
+        cache.incr(NEGATIVE_GENERATION_KEY)
+        return
+    cache.delete_many([_negative_key(code) for code in codes])
+
+
+def _single_flight(code: str, wait: float):
+    if not settings.PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE:
+        return nullcontext(True)
+    return single_flight(
+        _get_cache(),
+        f'produkty_w_sieci:{code}',
+        timeout=settings.PRODUKTY_W_SIECI_SINGLE_FLIGHT['LOCK_TIMEOUT'],
+        wait=wait,
+    )
+
+
+def fetch_from_api(
+    code: str, product: Optional[Product] = None, wait: Optional[float] = None, **request_kwargs
+) -> Product | None:
+    """Fetches the product from Produkty w Sieci and creates or updates it in the database.
+
+    Concurrent calls for the same code, also in other workers, make a single API call. The other callers wait for
+    it (at most ``wait`` seconds, ``WAIT_TIMEOUT`` by default) and get the product it stored, or
+    :class:`SingleFlightTimeout` if it is still being fetched. Codes which recently were not found or had no company
+    data are not looked up again until their negative cache entry expires.
+    """
+    if get_negative_entry(code) is not None:
+        return product
+    if wait is None:
+        wait = settings.PRODUKTY_W_SIECI_SINGLE_FLIGHT['WAIT_TIMEOUT']
+    with _single_flight(code, wait) as is_leader:
+        if not is_leader:
+            LOGGER.info("Product %s is being fetched by another request. Reusing its result.", code)
+            return Product.objects.filter(code=code).first()
+        products_response = produkty_w_sieci_client.get_products(gtin_number=code, **request_kwargs)
+        if products_response is None:
+            remember_negative_result(code, NEGATIVE_NOT_FOUND)
+            return product
+        if not (products_response.company and products_response.company.nip and products_response.company.name):
+            remember_negative_result(code, NEGATIVE_NO_COMPANY)
+        return create_from_api(code, products_response, product=product)
+
+
+def enrich_product(code: str) -> Product | None:
+    """RQ job fetching the product data from Produkty w Sieci."""
+    try:
+        product = Product.objects.filter(code=code).first()
+        if product and product.company:
+            return product
+        return fetch_from_api(code, product=product)
+    except SingleFlightTimeout:
+        LOGGER.info("Product %s is still being fetched by another request.", code)
+        return None
+    except (ApiException, requests.exceptions.RequestException):
+        remember_negative_result(code, NEGATIVE_ERROR)
+        raise
+    finally:
+        _get_cache().delete(_pending_key(code))
+
+
+def create_within_budget(code: str, product: Optional[Product] = None) -> Product | None:
+    """Fetches the product inline if Produkty w Sieci answers within the latency budget.
+
+    Otherwise the enrichment is scheduled in the background and ``None`` is returned. Waiting for another request
+    fetching the product is bounded by the budget too, see :func:`fetch_from_api`.
+    """
+    if is_enrichment_pending(code):
+        return None
+    budget = settings.PRODUKTY_W_SIECI_ASYNC['INLINE_TIMEOUT']
+    try:
+        return fetch_from_api(
+            code,
+            product=product,
+            wait=min(budget, settings.PRODUKTY_W_SIECI_SINGLE_FLIGHT['WAIT_TIMEOUT']),
+            num_retries=0,
+            timeout=budget,
+        )
+    except CircuitOpenException:
+        return None
+    except (ApiException, requests.exceptions.RequestException) as ex:
+        LOGGER.info("Produkty w Sieci did not answer inline for %s: %s", code, ex)
+        schedule_enrichment(code)
+        return None
+
+
 def create_from_api(
     code: str, get_products_response: Optional[ProductBase], product: Optional[Product] = None
 ) -> Product | None:
@@ -32,20 +220,24 @@ def create_from_api(
 
     if not product and result_product:
         LOGGER.info("Product missing. Creating a new product.")
-        product = Product.objects.create(
-            name=result_product.name,
-            code=code,
-            company=expected_company,
-            brand=expected_brand,
-            # TODO: co jesli jest wiecej niz jeden GPC?
-            gpc_brick=(
-                GPCBrick.objects.filter(code=result_product.gpc[0].code).first()
-                if len(result_product.gpc) > 0
-                else None
-            ),
-            commit_desc="Produkt utworzony automatycznie na podstawie skanu użytkownika",
-        )
-        return product
+        try:
+            with transaction.atomic():
+                return Product.objects.create(
+                    name=result_product.name,
+                    code=code,
+                    company=expected_company,
+                    brand=expected_brand,
+                    # TODO: co jesli jest wiecej niz jeden GPC?
+                    gpc_brick=(
+                        GPCBrick.objects.filter(code=result_product.gpc[0].code).first()
+                        if len(result_product.gpc) > 0
+                        else None
+                    ),
+                    commit_desc="Produkt utworzony automatycznie na podstawie skanu użytkownika",
+                )
+        except IntegrityError:
+            # Created in the meantime, e.g. empty by a scan which did not wait for this request.
+            product = Product.objects.get(code=code)
 
     LOGGER.info("Product exists. Updating a product.")
     product_commit_desc = ""
@@ -1,9 +1,21 @@
+import threading
+import time
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import timedelta
 
+import requests
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
-from pola.integrations.produkty_w_sieci import produkty_w_sieci_client
+from pola.collection_utils import chunks
+from pola.integrations.produkty_w_sieci import (
+    ApiException,
+    CircuitOpenException,
+    produkty_w_sieci_client,
+)
 from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
 from pola.product.models import Product
 
@@ -13,7 +25,7 @@ REQUERY_ALL_FREQUENCY_DAYS = 60
 REQUERY_ALL_LIMIT = 10000
 
 
-def requery_590_codes():
+def requery_590_codes(**kwargs):
     print("Starting requering 590 codes...")
 
     p590 = Product.objects.filter(
@@ -23,40 +35,112 @@ def requery_590_codes():
         ilim_queried_at__lt=timezone.now() - timedelta(days=REQUERY_590_FREQUENCY_DAYS),
     ).order_by('-query_count')[:REQUERY_590_LIMIT]
 
-    requery_products(p590)
+    requery_products(p590, **kwargs)
 
     print("Finished requering 590 codes...")
 
 
-def requery_all_codes():
+def requery_all_codes(**kwargs):
     print("Starting requering all codes...")
 
     products = Product.objects.filter(
         ilim_queried_at__lt=timezone.now() - timedelta(days=REQUERY_ALL_FREQUENCY_DAYS),
     ).order_by('-query_count')[:REQUERY_ALL_LIMIT]
 
-    requery_products(products)
+    requery_products(products, **kwargs)
 
     print("Finished requering all codes...")
 
 
-def requery_products(products: Iterable[Product]):
-    for prod in products:
-        print(prod.code, prod.query_count, " -> ")
-
-        prod.ilim_queried_at = timezone.now()
-        prod.save()
-
-        try:
-            if is_code_supported(prod.code):
-                products_response = produkty_w_sieci_client.get_products(gtin_number=prod.code)
-                p = create_from_api(prod.code, products_response, product=prod)
-                if p and p.company and p.company.name:
-                    print(p.company.name.encode(), p.brand)
-                else:
-                    print(".")
+class RateLimiter:
+    """Spaces the calls evenly, so at most ``rate`` calls per second are made from all the threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+@dataclass
+class RequeryStats:
+    processed: int = 0
+    updated: int = 0
+    not_found: int = 0
+    errors: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at
+        throughput = self.processed / elapsed if elapsed else 0
+        error_rate = self.errors / self.processed if self.processed else 0
+        return (
+            f"Processed {self.processed} products in {elapsed:.1f}s ({throughput:.1f}/s): "
+            f"{self.updated} updated, {self.not_found} not found, {self.errors} errors ({error_rate:.1%})"
+        )
+
+
+def _fetch(rate_limiter: RateLimiter, product: Product):
+    """Returns ``(product, response, error)``. Runs in the thread pool, so it must not touch the database."""
+    if not is_code_supported(product.code):
+        return product, None, None
+    rate_limiter.acquire()
+    try:
+        return product, produkty_w_sieci_client.get_products(gtin_number=product.code), None
+    except CircuitOpenException:
+        raise
+    except (ApiException, requests.exceptions.RequestException) as e:
+        return product, None, e
+
+
+def _write_batch(results, stats: RequeryStats):
+    """Stores the results of a batch in one transaction.
+
+    Committing ``ilim_queried_at`` together with the data is the checkpoint of the run: the requeried products
+    are not selected again, so an interrupted run resumes with the next batch.
+    """
+    queried_at = timezone.now()
+    not_updated = []
+    with transaction.atomic():
+        for product, response, error in results:
+            stats.processed += 1
+            product.ilim_queried_at = queried_at
+            if error is not None:
+                print(product.code, "error:", error)
+                stats.errors += 1
+                not_updated.append(product.pk)
+            elif response is None:
+                stats.not_found += is_code_supported(product.code)
+                not_updated.append(product.pk)
             else:
-                print(";")
-        except ConnectionError as e:
-            print(e)
-            raise e
+                create_from_api(product.code, response, product=product)
+                stats.updated += 1
+        Product.objects.filter(pk__in=not_updated).update(ilim_queried_at=queried_at)
+
+
+def requery_products(products: Iterable[Product], workers=None, rate=None, batch_size=None) -> RequeryStats:
+    """Fetches the products from Produkty w Sieci in parallel and updates them batch by batch."""
+    config = settings.REQUERY
+    workers = workers or config['WORKERS']
+    batch_size = batch_size or config['BATCH_SIZE']
+    rate_limiter = RateLimiter(rate or config['RATE_LIMIT'])
+    stats = RequeryStats()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in chunks(list(products), batch_size):
+            try:
+                results = list(executor.map(lambda p: _fetch(rate_limiter, p), batch))
+            except CircuitOpenException:
+                print("Produkty w Sieci is unavailable. Stopping, the next run will resume.")
+                break
+            _write_batch(results, stats)
+
+    print(stats.report())
+    return stats
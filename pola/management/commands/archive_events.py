@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pola import event_archive
+
+
+class Command(BaseCommand):
+    help = 'Moves the scan and search events of old months from the database to Parquet files in S3'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=settings.EVENT_ARCHIVE['ARCHIVE_AFTER_MONTHS'],
+            help='Archive the months which ended at least this many months ago',
+        )
+        parser.add_argument('--table', choices=sorted(event_archive.ARCHIVES), help='Archive only this table')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months to archive')
+
+    def handle(self, *args, **options):
+        tables = [options['table']] if options['table'] else list(event_archive.ARCHIVES)
+        months = event_archive.get_closed_months(options['older_than_months'])
+        if options['dry_run']:
+            for month in months:
+                self.stdout.write(f'Would archive {", ".join(tables)} of {month:%Y-%m}')
+            return
+
+        for month in months:
+            for table in tables:
+                archived_range = event_archive.archive_month(table, month)
+                if archived_range is None:
+                    continue
+                # Written after each archived month, so the manifest lists it even if a later month fails.
+                event_archive.write_manifest()
+                self.stdout.write(
+                    f'Archived {archived_range.row_count} rows of {table} of {month:%Y-%m} to {archived_range.location}'
+                )
@@ -0,0 +1,90 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test.utils import override_settings
+
+from pola import logic, scan_cache
+from pola.company.models import Brand, Company
+from pola.rpc_api import http
+
+DESCRIPTION = (
+    'Zakłady Mięsne „Łuków” to polska firma rodzinna z siedzibą w Łukowie. Produkuje wędliny i mięso, zatrudnia '
+    'ponad tysiąc pracowników w Polsce i prowadzi własny dział badań i rozwoju. '
+)
+
+
+def _synthetic_result(brands, replacements):
+    company = Company(
+        name='ZAKŁADY MIĘSNE ŁUKÓW SPÓŁKA AKCYJNA',
+        common_name='Zakłady Mięsne „Łuków”',
+        plCapital=100,
+        plWorkers=100,
+        plRnD=100,
+        plRegistered=100,
+        plNotGlobEnt=100,
+        plCapital_notes='Firma ma 100% polskiego kapitału.',
+        description=DESCRIPTION * 3,
+        sources='KRS|https://example.com/krs\nStrona producenta|https://example.com',
+        official_url='https://example.com',
+        is_friend=True,
+    )
+    company_data = logic.serialize_company(company)
+    company_data['brands'] = [
+        logic.serialize_brand(Brand(name=f'marka {i}', common_name=f'Marka „Łuków” {i}')) for i in range(brands)
+    ]
+    return {
+        'product_id': 1,
+        'code': '5900000000001',
+        'name': company_data['name'],
+        'card_type': logic.TYPE_WHITE,
+        'altText': None,
+        'report': {
+            'text': 'Zgłoś jeśli posiadasz bardziej aktualne dane na temat tego produktu',
+            'button_type': 'type_white',
+        },
+        'companies': [company_data],
+        'replacements': [
+            {'code': f'590000000{i:04d}', 'name': f'Kiełbasa śląska {i}', 'company': 'Łuków', 'display_name': 'Łuków'}
+            for i in range(replacements)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Measures the encoding of a scan result by JsonResponse and by the API encoders, see: pola.rpc_api.http'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--code', help='Code of a product in the database, a synthetic result is used otherwise')
+        parser.add_argument('--brands', type=int, default=20, help='Number of the brands of the synthetic result')
+        parser.add_argument(
+            '--replacements', type=int, default=5, help='Number of the replacements of the synthetic result'
+        )
+        parser.add_argument('--number', type=int, default=10000, help='Number of the encodings of each variant')
+
+    def handle(self, *args, **options):
+        if options['code']:
+            result, _, _ = logic.get_result_from_code(
+                options['code'], multiple_company_supported=True, report_as_object=True
+            )
+        else:
+            result = _synthetic_result(options['brands'], options['replacements'])
+        # The cached results keep these values encoded, see: pola.scan_cache
+        cached_result = {
+            key: http.RawJSON.encode(value) if key in scan_cache.ENCODED_KEYS else value
+            for key, value in result.items()
+        }
+
+        self._measure('JsonResponse', lambda: json.dumps(result, cls=DjangoJSONEncoder).encode(), options['number'])
+        for encoder in ['json'] + (['orjson'] if http.orjson is not None else []):
+            with override_settings(API_JSON_ENCODER=encoder):
+                self._measure(encoder, lambda: http.dumps(result).encode(), options['number'])
+                self._measure(
+                    f'{encoder}, cached result', lambda: http.dumps(cached_result).encode(), options['number']
+                )
+
+    def _measure(self, name, encode, number):
+        size = len(encode())
+        elapsed = timeit.timeit(encode, number=number)
+        self.stdout.write(f'{name}: {size} bytes, {elapsed / number * 1_000_000:.1f} µs per response')
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from pola.company.filters import CompanyFilter, CompanyMergeFilter
+from pola.company.views import CompanyAutocomplete
+from pola.management.commands.benchmark_product_search import (
+    INSERT_PRODUCTS,
+    WORDS,
+)
+from pola.product.filters import ProductFilter
+from pola.product.views import ProductAutocomplete
+
+INSERT_COMPANIES = """
+INSERT INTO company_company
+    (created, modified, name, official_name, common_name, nip, query_count, verified, is_friend,
+     display_brands_in_description)
+SELECT now(), now(), name, name || ' sp. z o.o.', initcap(name), lpad(i::text, 10, '0'), 0, false, false, false
+FROM (
+    SELECT i, (ARRAY[{words}])[1 + i % {count}] || ' ' || md5(i::text) AS name
+    FROM generate_series(1, %s) AS i
+) AS s
+"""
+
+
+def _autocomplete(view_class, query):
+    view = view_class()
+    view.q = query
+    return view.get_queryset()
+
+
+class Command(BaseCommand):
+    help = 'Measures the CMS filters and autocompletes on tables with synthetic rows and shows the query plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2_000_000, help='Number of synthetic products')
+        parser.add_argument('--companies', type=int, default=200_000, help='Number of synthetic companies')
+        parser.add_argument('queries', nargs='*', default=['baton', 'czekol', '59000'])
+
+    def handle(self, *args, **options):
+        # The synthetic rows are inserted in a transaction which is rolled back at the end.
+        with transaction.atomic():
+            self.stdout.write(f'Inserting {options["products"]} products and {options["companies"]} companies...')
+            words = ', '.join(f"'{word}'" for word in WORDS)
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_PRODUCTS.format(words=words, count=len(WORDS)), [options['products']])
+                cursor.execute(INSERT_COMPANIES.format(words=words, count=len(WORDS)), [options['companies']])
+                cursor.execute('ANALYZE product_product')
+                cursor.execute('ANALYZE company_company')
+
+            for query in options['queries']:
+                querysets = {
+                    'ProductFilter': ProductFilter({'name__icontains': query}).qs,
+                    'ProductAutocomplete': _autocomplete(ProductAutocomplete, query),
+                    'CompanyFilter': CompanyFilter({'name__icontains': query}).qs,
+                    'CompanyMergeFilter': CompanyMergeFilter({'q': query}).qs,
+                    'CompanyAutocomplete': _autocomplete(CompanyAutocomplete, query),
+                }
+                for name, qs in querysets.items():
+                    qs = qs[:25]
+                    started = time.perf_counter()
+                    list(qs)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    plan = qs.explain(analyze=True)
+                    uses_index = '_trgm' in plan
+                    self.stdout.write(f'\n{name} {query!r}: {elapsed:.1f} ms, uses a trigram index: {uses_index}')
+                    self.stdout.write(plan)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from pola.product.search import search_products
+
+WORDS = ['mleko', 'baton', 'czekolada', 'kawa', 'herbata', 'sok', 'chleb', 'ser', 'woda', 'piwo']
+
+INSERT_PRODUCTS = """
+INSERT INTO product_product
+    (created, modified, ilim_queried_at, name, code, query_count, ai_pics_count, search_text)
+SELECT now(), now(), now(), name, 'bench' || i, (random() * 1000)::int, 0, pola_search_normalize(name)
+FROM (
+    SELECT i, (ARRAY[{words}])[1 + i % {count}] || ' ' || md5(i::text) AS name
+    FROM generate_series(1, %s) AS i
+) AS s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures /a/v4/search on a table with synthetic products and shows the query plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000, help='Number of synthetic products')
+        parser.add_argument('queries', nargs='*', default=['baton', 'czekol', 'kawa 1a'])
+
+    def handle(self, *args, **options):
+        # The synthetic products are inserted in a transaction which is rolled back at the end.
+        with transaction.atomic():
+            self.stdout.write(f'Inserting {options["rows"]} products...')
+            words = ', '.join(f"'{word}'" for word in WORDS)
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_PRODUCTS.format(words=words, count=len(WORDS)), [options['rows']])
+                cursor.execute('ANALYZE product_product')
+
+            for query in options['queries']:
+                qs = search_products(query)[:10]
+                started = time.perf_counter()
+                list(qs)
+                elapsed = (time.perf_counter() - started) * 1000
+                plan = qs.explain(analyze=True)
+                uses_index = 'product_search_text_trgm' in plan
+                self.stdout.write(f'\n{query!r}: {elapsed:.1f} ms, uses the trigram index: {uses_index}')
+                self.stdout.write(plan)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pola import query_partitions
+
+
+class Command(BaseCommand):
+    help = 'Creates the monthly partitions of pola_query in advance and detaches or drops the expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.QUERY_PARTITIONS['MONTHS_AHEAD'],
+            help='Number of future months to create the partitions for',
+        )
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            default=settings.QUERY_PARTITIONS['RETENTION_MONTHS'],
+            help='Partitions of the months older than this are expired, none when not set',
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            default=settings.QUERY_PARTITIONS['DROP_EXPIRED'],
+            help='Drop the expired partitions instead of detaching them, and delete the expired legacy rows',
+        )
+
+    def handle(self, *args, **options):
+        for name in query_partitions.ensure_partitions(options['months_ahead']):
+            self.stdout.write(f'Created {name}')
+
+        if options['retention_months'] is None:
+            return
+        if options['drop']:
+            deleted = query_partitions.prune_legacy_partition(options['retention_months'])
+            self.stdout.write(f'Deleted {deleted} rows of {query_partitions.LEGACY_PARTITION}')
+        for name in query_partitions.expire_partitions(options['retention_months'], drop=options['drop']):
+            self.stdout.write(f'{"Dropped" if options["drop"] else "Detached"} {name}')
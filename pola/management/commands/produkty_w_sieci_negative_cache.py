@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pola.logic_produkty_w_sieci import (
+    get_negative_entry,
+    purge_negative_entries,
+)
+
+
+class Command(BaseCommand):
+    help = 'Inspects and purges the cache of codes not found in Produkty w Sieci'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['show', 'purge'])
+        parser.add_argument('codes', nargs='*')
+        parser.add_argument('--all', action='store_true', help='Purge all the entries')
+
+    def handle(self, *args, **options):
+        codes = options['codes']
+        if options['action'] == 'show':
+            if not codes:
+                raise CommandError('Specify the codes to show')
+            for code in codes:
+                entry = get_negative_entry(code)
+                if entry is None:
+                    self.stdout.write(f'{code}: not cached')
+                else:
+                    expires_at = datetime.fromtimestamp(entry['expires_at']).isoformat(timespec='seconds')
+                    self.stdout.write(f'{code}: {entry["status"]} until {expires_at}')
+            return
+
+        if options['all']:
+            purge_negative_entries()
+            self.stdout.write('Purged all entries')
+        elif codes:
+            purge_negative_entries(codes)
+            self.stdout.write(f'Purged {len(codes)} entries')
+        else:
+            raise CommandError('Specify the codes to purge or --all')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from pola import work_queue
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the counts and the lists of the CMS front page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', action='store_true', help='Run the refresh on the RQ worker')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = work_queue.schedule_refresh()
+            self.stdout.write(f'Enqueued {job.id}')
+            return
+        work_queue.refresh()
+        self.stdout.write(f'Refreshed {", ".join(work_queue.VIEWS)}')
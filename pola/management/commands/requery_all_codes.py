@@ -6,5 +6,10 @@ from pola.logic_workers import requery_all_codes
 class Command(BaseCommand):
     help = 'Requeries all codes for data from ILiM'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Number of parallel requests')
+        parser.add_argument('--rate', type=float, help='Maximum number of requests per second')
+        parser.add_argument('--batch-size', type=int, help='Number of products stored in a transaction')
+
     def handle(self, *args, **options):
-        requery_all_codes()
+        requery_all_codes(workers=options['workers'], rate=options['rate'], batch_size=options['batch_size'])
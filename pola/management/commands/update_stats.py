@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pola import stats_rollup
+
+
+class Command(BaseCommand):
+    help = 'Updates the daily rollups of the stats page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.STATS_ROLLUP['DAYS'], help='Number of the last days to update'
+        )
+        parser.add_argument('--enqueue', action='store_true', help='Run the update on the RQ worker')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = stats_rollup.schedule_update(options['days'])
+            self.stdout.write(f'Enqueued {job.id}')
+            return
+        stats_rollup.update_stats(options['days'])
+        self.stdout.write(f'Updated the stats of the last {options["days"]} days')
@@ -0,0 +1,99 @@
+import re
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+# The existing table becomes the first partition, holding all the rows up to the end of the next month, so no
+# rows are copied. Only the CHECK constraint, which lets ATTACH PARTITION skip its own scan, reads the table. It is
+# validated first, outside of a transaction, which locks out only the schema changes, not the inserts. The
+# partitioning itself runs in a short transaction after that. The constraint is committed before it, so its bound
+# is a month ahead, in case the month ends in the meantime.
+CHECK_TIMESTAMP = [
+    # The constraint is left behind when the partitioning fails.
+    'ALTER TABLE pola_query DROP CONSTRAINT IF EXISTS pola_query_timestamp_check',
+    '''
+    ALTER TABLE pola_query ADD CONSTRAINT pola_query_timestamp_check
+    CHECK ("timestamp" IS NOT NULL AND "timestamp" < '{boundary}') NOT VALID
+    ''',
+    'ALTER TABLE pola_query VALIDATE CONSTRAINT pola_query_timestamp_check',
+]
+
+RENAME_QUERY = [
+    'ALTER TABLE pola_query RENAME TO pola_query_legacy',
+    'ALTER INDEX pola_query_timesta_ea44b7_brin RENAME TO pola_query_legacy_timestamp_brin',
+]
+
+# The tables created by Django 4.1 and later have an identity column, whose sequence cannot be moved to another
+# table, and which LIKE does not copy as a default. It is replaced with a regular sequence of the same name, which
+# continues where the identity stopped, like the serial columns of the older databases.
+DROP_IDENTITY = [
+    'ALTER TABLE pola_query_legacy ALTER id DROP IDENTITY',
+    'CREATE SEQUENCE {sequence} AS integer START WITH {next_id}',
+]
+
+PARTITION_QUERY = [
+    'CREATE TABLE pola_query (LIKE pola_query_legacy INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")',
+    "ALTER TABLE pola_query ALTER id SET DEFAULT nextval('{sequence}')",
+    "ALTER SEQUENCE {sequence} OWNED BY pola_query.id",
+    '''
+    ALTER TABLE pola_query ADD CONSTRAINT pola_query_product_id_fk FOREIGN KEY (product_id)
+    REFERENCES product_product (id) DEFERRABLE INITIALLY DEFERRED
+    ''',
+    'CREATE INDEX pola_query_product_id_idx ON pola_query (product_id)',
+    '''
+    CREATE INDEX pola_query_timesta_ea44b7_brin ON pola_query USING brin ("timestamp") WITH (pages_per_range = 64)
+    ''',
+    "ALTER TABLE pola_query ATTACH PARTITION pola_query_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary}')",
+    'ALTER TABLE pola_query_legacy DROP CONSTRAINT pola_query_timestamp_check',
+    'CREATE TABLE pola_query_default PARTITION OF pola_query DEFAULT',
+    'ALTER TABLE pola_query_default ADD PRIMARY KEY (id)',
+]
+
+
+def check_timestamp(apps, schema_editor):
+    now = datetime.now(timezone.utc)
+    year, month = divmod(now.year * 12 + now.month + 1, 12)
+    boundary = datetime(year, month + 1, 1, tzinfo=timezone.utc).isoformat()
+    for statement in CHECK_TIMESTAMP:
+        schema_editor.execute(statement.format(boundary=boundary))
+
+
+def partition_query(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence('pola_query', 'id')")
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conname = 'pola_query_timestamp_check'"
+        )
+        # CHECK ((("timestamp" IS NOT NULL) AND ("timestamp" < '2024-06-01 00:00:00+00'::timestamp with time zone)))
+        boundary = re.search(r"'([^']+)'", cursor.fetchone()[0])[1]
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = 'pola_query'::regclass AND attname = 'id'"
+        )
+        identity = cursor.fetchone()[0] != ''
+
+    for statement in RENAME_QUERY:
+        schema_editor.execute(statement)
+    if identity:
+        # The table is locked by the rename, no other id is taken in the meantime.
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [sequence])
+            next_id = cursor.fetchone()[0]
+        for statement in DROP_IDENTITY:
+            schema_editor.execute(statement.format(sequence=sequence, next_id=next_id))
+    for statement in PARTITION_QUERY:
+        schema_editor.execute(statement.format(sequence=sequence, boundary=boundary))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('pola', '0009_appconfiguration'),
+    ]
+
+    # The monthly partitions are created by the manage_query_partitions command, see: pola.query_partitions
+    operations = [
+        migrations.RunPython(check_timestamp, elidable=False),
+        migrations.RunPython(partition_query, atomic=True, elidable=False),
+    ]
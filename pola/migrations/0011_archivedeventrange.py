@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('pola', '0010_partition_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEventRange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=64)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('location', models.CharField(max_length=1024)),
+                ('row_count', models.BigIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['table', 'start'],
+                'unique_together': {('table', 'start')},
+            },
+        ),
+    ]
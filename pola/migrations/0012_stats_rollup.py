@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('pola', '0011_archivedeventrange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stats',
+            name='last_query_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='StatsClient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.CharField(max_length=40)),
+                (
+                    'stats',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name='clients', to='pola.stats'
+                    ),
+                ),
+            ],
+            options={
+                'unique_together': {('stats', 'client')},
+            },
+        ),
+    ]
@@ -0,0 +1,158 @@
+from django.db import migrations, models
+
+CREATE_COUNTS = '''
+CREATE MATERIALIZED VIEW pola_workqueuecounts AS
+SELECT 1 AS id, companies.*, products.*, reports.*, now() AS refreshed_at
+FROM
+    (
+        SELECT
+            count(*) AS no_of_companies,
+            count(*) FILTER (WHERE verified) AS no_of_verified_companies,
+            count(*) FILTER (WHERE NOT verified) AS no_of_not_verified_companies
+        FROM company_company
+    ) AS companies,
+    (
+        SELECT
+            count(*) FILTER (WHERE code LIKE '590%') AS no_of_590_products,
+            count(*) FILTER (WHERE code NOT LIKE '590%') AS no_of_not_590_products
+        FROM product_product
+        WHERE company_id IS NULL
+    ) AS products,
+    (
+        SELECT
+            count(*) FILTER (WHERE resolved_at IS NULL AND resolved_by_id IS NULL) AS no_of_open_reports,
+            count(*) FILTER (WHERE resolved_at IS NOT NULL AND resolved_by_id IS NOT NULL) AS no_of_resolved_reports,
+            count(*) AS no_of_reports
+        FROM report_report
+    ) AS reports
+'''
+
+# Top 10 companies or products of each list of the front page, by the value the list is ordered by.
+CREATE_ITEMS = '''
+CREATE MATERIALIZED VIEW pola_workqueueitem AS
+SELECT
+    row_number() OVER (ORDER BY kind, value DESC, object_id) AS id,
+    kind,
+    row_number() OVER (PARTITION BY kind ORDER BY value DESC, object_id) AS position,
+    object_id,
+    value
+FROM (
+    (
+        SELECT 'most_popular_companies' AS kind, id AS object_id, query_count::bigint AS value
+        FROM company_company
+        WHERE NOT verified
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'companies_by_name_length', id, length(common_name)
+        FROM company_company
+        ORDER BY length(common_name) DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'companies_with_most_open_reports', p.company_id, count(*)
+        FROM report_report AS r
+        JOIN product_product AS p ON p.id = r.product_id
+        WHERE r.resolved_at IS NULL AND p.company_id IS NOT NULL
+        GROUP BY p.company_id
+        ORDER BY count(*) DESC, p.company_id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'products_with_most_open_reports', product_id, count(*)
+        FROM report_report
+        WHERE resolved_at IS NULL AND product_id IS NOT NULL
+        GROUP BY product_id
+        ORDER BY count(*) DESC, product_id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_590_products', id, query_count
+        FROM product_product
+        WHERE company_id IS NULL AND code LIKE '590%'
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_not_590_products', id, query_count
+        FROM product_product
+        WHERE company_id IS NULL AND code NOT LIKE '590%'
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_products_without_name', id, query_count
+        FROM product_product
+        WHERE name IS NULL
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+) AS items
+'''
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('company', '0035_trigram_indexes'),
+        ('product', '0024_trigram_indexes'),
+        ('report', '0011_alter_attachment_attachment'),
+        ('pola', '0012_stats_rollup'),
+    ]
+
+    # The views are refreshed by the refresh_work_queue command, see: pola.work_queue
+    operations = [
+        migrations.RunSQL(
+            [
+                CREATE_COUNTS,
+                'CREATE UNIQUE INDEX pola_workqueuecounts_id ON pola_workqueuecounts (id)',
+                CREATE_ITEMS,
+                'CREATE UNIQUE INDEX pola_workqueueitem_id ON pola_workqueueitem (id)',
+                'CREATE INDEX pola_workqueueitem_kind ON pola_workqueueitem (kind, position)',
+            ],
+            [
+                'DROP MATERIALIZED VIEW pola_workqueueitem',
+                'DROP MATERIALIZED VIEW pola_workqueuecounts',
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkQueueCounts',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('no_of_companies', models.BigIntegerField()),
+                ('no_of_verified_companies', models.BigIntegerField()),
+                ('no_of_not_verified_companies', models.BigIntegerField()),
+                ('no_of_590_products', models.BigIntegerField()),
+                ('no_of_not_590_products', models.BigIntegerField()),
+                ('no_of_open_reports', models.BigIntegerField()),
+                ('no_of_resolved_reports', models.BigIntegerField()),
+                ('no_of_reports', models.BigIntegerField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'pola_workqueuecounts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkQueueItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=64)),
+                ('position', models.BigIntegerField()),
+                ('object_id', models.IntegerField()),
+                ('value', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'pola_workqueueitem',
+                'managed': False,
+                'ordering': ['kind', 'position'],
+            },
+        ),
+    ]
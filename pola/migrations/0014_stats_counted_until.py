@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('pola', '0013_work_queue'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='stats',
+            name='last_query_id',
+        ),
+        migrations.AddField(
+            model_name='stats',
+            name='counted_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
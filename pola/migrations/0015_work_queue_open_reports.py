@@ -0,0 +1,97 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# Top 10 companies or products of each list of the front page, by the value the list is ordered by. The open
+# reports are the reports of Report.objects.only_open, the same as in pola_workqueuecounts.
+CREATE_ITEMS = '''
+CREATE MATERIALIZED VIEW pola_workqueueitem AS
+SELECT
+    row_number() OVER (ORDER BY kind, value DESC, object_id) AS id,
+    kind,
+    row_number() OVER (PARTITION BY kind ORDER BY value DESC, object_id) AS position,
+    object_id,
+    value
+FROM (
+    (
+        SELECT 'most_popular_companies' AS kind, id AS object_id, query_count::bigint AS value
+        FROM company_company
+        WHERE NOT verified
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'companies_by_name_length', id, length(common_name)
+        FROM company_company
+        ORDER BY length(common_name) DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'companies_with_most_open_reports', p.company_id, count(*)
+        FROM report_report AS r
+        JOIN product_product AS p ON p.id = r.product_id
+        WHERE r.resolved_at IS NULL AND r.resolved_by_id IS NULL AND p.company_id IS NOT NULL
+        GROUP BY p.company_id
+        ORDER BY count(*) DESC, p.company_id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'products_with_most_open_reports', product_id, count(*)
+        FROM report_report
+        WHERE resolved_at IS NULL AND resolved_by_id IS NULL AND product_id IS NOT NULL
+        GROUP BY product_id
+        ORDER BY count(*) DESC, product_id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_590_products', id, query_count
+        FROM product_product
+        WHERE company_id IS NULL AND code LIKE '590%'
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_not_590_products', id, query_count
+        FROM product_product
+        WHERE company_id IS NULL AND code NOT LIKE '590%'
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+    UNION ALL
+    (
+        SELECT 'most_popular_products_without_name', id, query_count
+        FROM product_product
+        WHERE name IS NULL
+        ORDER BY query_count DESC, id
+        LIMIT 10
+    )
+) AS items
+'''
+
+
+CREATE_INDEXES = [
+    'CREATE UNIQUE INDEX pola_workqueueitem_id ON pola_workqueueitem (id)',
+    'CREATE INDEX pola_workqueueitem_kind ON pola_workqueueitem (kind, position)',
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('pola', '0014_stats_counted_until'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            ['DROP MATERIALIZED VIEW pola_workqueueitem', CREATE_ITEMS, *CREATE_INDEXES],
+            [
+                'DROP MATERIALIZED VIEW pola_workqueueitem',
+                import_module('pola.migrations.0013_work_queue').CREATE_ITEMS,
+                *CREATE_INDEXES,
+            ],
+        ),
+    ]
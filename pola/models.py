@@ -1,12 +1,23 @@
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.contrib.postgres.indexes import BrinIndex
-from django.db import models
+from django.db import connection, models
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import get_default_timezone
 
-from pola.company.models import Company
+from pola import scan_cache
+from pola.company.models import Brand, Company
+from pola.product import search, search_cache
 from pola.product.models import Product
 from pola.report.models import Report
 
@@ -34,11 +45,40 @@ class SearchQuery(models.Model):
         indexes = [BrinIndex(fields=['timestamp'], pages_per_range=64)]
 
 
+class ArchivedEventRange(models.Model):
+    """Range of scan or search events moved from the database to a file in the archive. See: pola.event_archive"""
+
+    table = models.CharField(max_length=64)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    location = models.CharField(max_length=1024)
+    row_count = models.BigIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('table', 'start')
+        ordering = ['table', 'start']
+
+
 class Stats(models.Model):
+    """Daily rollup of the scans and of the new companies, products and reports. See: pola.stats_rollup"""
+
+    QUERY_COUNTS = (
+        'no_of_queries',
+        'no_of_verified',
+        'no_of_plScore',
+        'no_of_590',
+        'no_of_not_verified_590',
+        'no_of_not_verified_not_590',
+    )
+    NEW_OBJECT_COUNTS = ('no_of_new_companies', 'no_of_new_products', 'no_of_new_reports')
+
     year = models.IntegerField()
     month = models.IntegerField()
     day = models.IntegerField()
     calculated_at = models.DateTimeField(auto_now_add=True)
+    # The scans of the day older than this are counted in this row, the next update counts only the newer ones.
+    counted_until = models.DateTimeField(null=True, blank=True)
     no_of_queries = models.IntegerField()
     no_of_clients = models.IntegerField()
     no_of_verified = models.IntegerField()
@@ -60,55 +100,146 @@ class Stats(models.Model):
         unique_together = ('year', 'month', 'day')
         indexes = [BrinIndex(fields=['calculated_at'], pages_per_range=16)]
 
-    def calculate(self, year, month, day):
+    @classmethod
+    def empty(cls, year, month, day):
+        counts = dict.fromkeys(cls.QUERY_COUNTS + cls.NEW_OBJECT_COUNTS + ('no_of_clients',), 0)
+        return cls(year=year, month=month, day=day, **counts)
+
+    @staticmethod
+    def get_bounds(year, month, day):
         today_midnight = datetime(year, month, day, tzinfo=get_default_timezone())
-        tomorrow_midnight = today_midnight + timedelta(days=1)
+        return today_midnight, today_midnight + timedelta(days=1)
+
+    def is_finished(self, delay=timedelta()):
+        """Whether the row was calculated at least ``delay`` after the end of its day."""
+        if self.pk is None:
+            return False
+        return self.calculated_at >= self.get_bounds(self.year, self.month, self.day)[1] + delay
+
+    def _count_new_objects(self, cursor, start, end):
+        cursor.execute(
+            f'''
+            SELECT
+                (SELECT count(*) FROM {Company._meta.db_table} WHERE created >= %(start)s AND created < %(end)s),
+                (SELECT count(*) FROM {Product._meta.db_table} WHERE created >= %(start)s AND created < %(end)s),
+                (SELECT count(*) FROM {Report._meta.db_table} WHERE created >= %(start)s AND created < %(end)s)
+            ''',
+            {'start': start, 'end': end},
+        )
+        for field, value in zip(self.NEW_OBJECT_COUNTS, cursor.fetchone()):
+            setattr(self, field, value)
+
+    def calculate(self, year, month, day):
+        """Counts the whole day in a single scan of its scans."""
+        start, end = self.get_bounds(year, month, day)
 
         self.year = year
         self.month = month
         self.day = day
         self.calculated_at = timezone.now()
-        self.no_of_queries = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight
-        ).count()
-        self.no_of_clients = (
-            Query.objects.filter(timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight)
-            .distinct('client')
-            .count()
-        )
-        self.no_of_verified = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight, was_verified=True
-        ).count()
-        self.no_of_plScore = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight, was_plScore=True
-        ).count()
-        self.no_of_590 = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight, was_590=True
-        ).count()
-        self.no_of_not_verified_590 = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight, was_verified=False, was_590=True
-        ).count()
-        self.no_of_not_verified_not_590 = Query.objects.filter(
-            timestamp__gte=today_midnight, timestamp__lt=tomorrow_midnight, was_verified=False, was_590=False
-        ).count()
-        self.no_of_new_companies = (
-            Company.objects.filter(created__gte=today_midnight, created__lt=tomorrow_midnight)
-            .order_by('id')
-            .distinct('id')
-            .count()
-        )
-        self.no_of_new_products = (
-            Product.objects.filter(created__gte=today_midnight, created__lt=tomorrow_midnight)
-            .order_by('id')
-            .distinct('id')
-            .count()
-        )
-        self.no_of_new_reports = (
-            Report.objects.filter(created__gte=today_midnight, created__lt=tomorrow_midnight)
-            .order_by('id')
-            .distinct('id')
-            .count()
-        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                SELECT {_QUERY_COUNTS_SQL}, count(DISTINCT coalesce(client, ''))
+                FROM {Query._meta.db_table}
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                ''',
+                [start, end],
+            )
+            *counts, self.no_of_clients = cursor.fetchone()
+            for field, value in zip(self.QUERY_COUNTS, counts):
+                setattr(self, field, value)
+            self._count_new_objects(cursor, start, end)
+        self.counted_until = end
+
+    def add_new_queries(self, until, now=None):
+        """Adds the scans of the day from ``counted_until`` to ``until`` to the counts of the saved row.
+
+        The clients of the day are kept in :class:`StatsClient` until the day is calculated again, so the number
+        of the distinct clients can be increased too. The new companies, products and reports are counted again.
+        """
+        day_start, end = self.get_bounds(self.year, self.month, self.day)
+        start = max(day_start, self.counted_until or day_start)
+        until = max(start, min(end, until))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH new_queries AS (
+                    SELECT * FROM {Query._meta.db_table}
+                    WHERE "timestamp" >= %(start)s AND "timestamp" < %(until)s
+                ),
+                new_clients AS (
+                    INSERT INTO {StatsClient._meta.db_table} (stats_id, client)
+                    SELECT DISTINCT %(stats_id)s, coalesce(client, '') FROM new_queries
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                SELECT {_QUERY_COUNTS_SQL}, (SELECT count(*) FROM new_clients)
+                FROM new_queries
+                ''',
+                {'start': start, 'until': until, 'stats_id': self.pk},
+            )
+            *counts, new_clients = cursor.fetchone()
+            for field, value in zip(self.QUERY_COUNTS, counts):
+                setattr(self, field, getattr(self, field) + value)
+            self.no_of_clients += new_clients
+            self._count_new_objects(cursor, day_start, end)
+        self.counted_until = until
+        self.calculated_at = now or timezone.now()
+
+
+# Columns of Stats.QUERY_COUNTS.
+_QUERY_COUNTS_SQL = '''
+    count(*),
+    count(*) FILTER (WHERE was_verified),
+    count(*) FILTER (WHERE "was_plScore"),
+    count(*) FILTER (WHERE was_590),
+    count(*) FILTER (WHERE NOT was_verified AND was_590),
+    count(*) FILTER (WHERE NOT was_verified AND NOT was_590)
+'''
+
+
+class StatsClient(models.Model):
+    """Client which scanned on the day of a :class:`Stats` row which is still being counted."""
+
+    stats = models.ForeignKey(Stats, on_delete=models.CASCADE, related_name='clients')
+    client = models.CharField(max_length=40)
+
+    class Meta:
+        unique_together = ('stats', 'client')
+
+
+class WorkQueueCounts(models.Model):
+    """Counts of the CMS front page, a materialized view. See: pola.work_queue"""
+
+    no_of_companies = models.BigIntegerField()
+    no_of_verified_companies = models.BigIntegerField()
+    no_of_not_verified_companies = models.BigIntegerField()
+    no_of_590_products = models.BigIntegerField()
+    no_of_not_590_products = models.BigIntegerField()
+    no_of_open_reports = models.BigIntegerField()
+    no_of_resolved_reports = models.BigIntegerField()
+    no_of_reports = models.BigIntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'pola_workqueuecounts'
+
+
+class WorkQueueItem(models.Model):
+    """Company or product on a list of the CMS front page, a materialized view. See: pola.work_queue"""
+
+    id = models.BigIntegerField(primary_key=True)
+    kind = models.CharField(max_length=64)
+    position = models.BigIntegerField()
+    object_id = models.IntegerField()
+    value = models.BigIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'pola_workqueueitem'
+        ordering = ['kind', 'position']
 
 
 class SingletonModel(models.Model):
@@ -123,6 +254,7 @@ class SingletonModel(models.Model):
 
 DEFAULT_DONATE_URL = "https://www.pola-app.pl/1-5-podatku-na-aplikacje-pola"
 DEFAULT_DONATE_TEXT = "1,5% podatku na aplikację Pola?"
+APP_CONFIGURATION_CACHE_KEY = 'app_configuration_singleton'
 
 
 class AppConfiguration(SingletonModel):
@@ -145,3 +277,199 @@ class AppConfiguration(SingletonModel):
             app_config = AppConfiguration()
             app_config.save()
         return app_config
+
+    @staticmethod
+    def get_cached_singleton():
+        if not settings.SCAN_RESULT_CACHE_ENABLE:
+            return AppConfiguration.get_singleton()
+        return scan_cache.get_cache().get_or_set(
+            APP_CONFIGURATION_CACHE_KEY, AppConfiguration.get_singleton, settings.SCAN_RESULT_CACHE['TIMEOUT']
+        )
+
+
+# Scan result cache invalidation. See: pola.scan_cache
+#
+# The invalidation of a saved company selects the codes of all its products, brands and replacements, so it is
+# skipped when the save does not change any field shown on the cards, e.g. the requery writing
+# ``ilim_queried_at``. The fields are compared with the values selected by primary key before the save, unless
+# ``update_fields`` does not contain any of them.
+
+PRODUCT_CARD_FIELDS = ('code', 'name', 'company_id', 'brand_id')
+# Timestamps feed only the validators of the cards, which may stay cached while the cards do not change.
+COMPANY_NON_CARD_FIELDS = ('created', 'modified', 'Editor_notes', 'nip', 'address', 'query_count')
+BRAND_NON_CARD_FIELDS = ('created', 'modified')
+# Fields search_text is built from, see: refresh_product_search_text
+PRODUCT_SEARCH_FIELDS = ('name', 'company_id', 'brand_id')
+COMPANY_SEARCH_FIELDS = ('name', 'common_name', 'official_name')
+BRAND_SEARCH_FIELDS = ('name', 'common_name')
+
+
+def _card_fields(model, non_card_fields):
+    return tuple(field.attname for field in model._meta.concrete_fields if field.attname not in non_card_fields)
+
+
+COMPANY_CARD_FIELDS = _card_fields(Company, COMPANY_NON_CARD_FIELDS)
+BRAND_CARD_FIELDS = _card_fields(Brand, BRAND_NON_CARD_FIELDS)
+
+
+def remember_old_values(instance, fields, update_fields):
+    """Stores the saved values of the fields in ``instance._old_values``, see: :func:`get_changed_fields`."""
+    if update_fields is not None:
+        updated = {instance._meta.get_field(name).attname for name in update_fields}
+        fields = [field for field in fields if field in updated]
+    if not fields:
+        instance._old_values = {}
+        return
+    instance._old_values = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def get_changed_fields(instance, fields):
+    """Returns the fields changed by the save, all the fields if their old values are not known."""
+    old_values = getattr(instance, '_old_values', None)
+    if old_values is None:
+        return set(fields)
+    # Compared in the database form, e.g. a file field without a file is saved as an empty string.
+    prep_value = {field.attname: field.get_prep_value for field in instance._meta.concrete_fields}
+    return {
+        name
+        for name in fields
+        if name in old_values and prep_value[name](old_values[name]) != prep_value[name](getattr(instance, name))
+    }
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_values(instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    remember_old_values(instance, {*PRODUCT_CARD_FIELDS, *PRODUCT_SEARCH_FIELDS, 'search_text'}, update_fields)
+    if instance._old_values and 'search_text' in instance._old_values:
+        # The loaded value may be outdated by a refresh, see: refresh_product_search_text
+        instance.search_text = instance._old_values['search_text']
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_on_save(instance, created, raw=False, **kwargs):
+    if raw or not get_changed_fields(instance, PRODUCT_CARD_FIELDS):
+        return
+    if created:
+        scan_cache.invalidate_codes([instance.code])
+        return
+    old_code = (getattr(instance, '_old_values', None) or {}).get('code')
+    scan_cache.invalidate_codes([*scan_cache.codes_for_product(instance), old_code])
+
+
+@receiver(pre_delete, sender=Product)
+def collect_product_codes(instance, **kwargs):
+    instance._scan_cache_codes = scan_cache.codes_for_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_product_on_delete(instance, **kwargs):
+    scan_cache.invalidate_codes(getattr(instance, '_scan_cache_codes', [instance.code]))
+
+
+@receiver(m2m_changed, sender=Product.replacements.through)
+def invalidate_product_on_replacements_change(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        scan_cache.invalidate_codes([instance.code])
+    elif action == 'pre_clear':
+        scan_cache.invalidate_codes(instance.replaced_by.values_list('code', flat=True))
+    else:
+        scan_cache.invalidate_codes(Product.objects.filter(pk__in=pk_set).values_list('code', flat=True))
+
+
+@receiver(pre_save, sender=Company)
+def remember_company_values(instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    remember_old_values(instance, COMPANY_CARD_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Company)
+def invalidate_company_on_save(instance, created, raw=False, **kwargs):
+    if raw or created or not get_changed_fields(instance, COMPANY_CARD_FIELDS):
+        return
+    scan_cache.invalidate_company(instance.pk)
+
+
+@receiver(pre_delete, sender=Company)
+def collect_company_codes(instance, **kwargs):
+    instance._scan_cache_codes = scan_cache.codes_for_company(instance.pk)
+
+
+@receiver(post_delete, sender=Company)
+def invalidate_company_on_delete(instance, **kwargs):
+    scan_cache.invalidate_codes(getattr(instance, '_scan_cache_codes', []))
+
+
+@receiver(pre_save, sender=Brand)
+def remember_brand_values(instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    remember_old_values(instance, BRAND_CARD_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Brand)
+def invalidate_brand_on_save(instance, raw=False, **kwargs):
+    if raw or not get_changed_fields(instance, BRAND_CARD_FIELDS):
+        return
+    codes = scan_cache.codes_for_brand(instance.pk, instance.company_id)
+    old_company_id = (getattr(instance, '_old_values', None) or {}).get('company_id')
+    if old_company_id and old_company_id != instance.company_id:
+        codes += scan_cache.codes_for_brand(instance.pk, old_company_id)
+    scan_cache.invalidate_codes(codes)
+
+
+@receiver(pre_delete, sender=Brand)
+def collect_brand_codes(instance, **kwargs):
+    instance._scan_cache_codes = scan_cache.codes_for_brand(instance.pk, instance.company_id)
+
+
+@receiver(post_delete, sender=Brand)
+def invalidate_brand_on_delete(instance, **kwargs):
+    scan_cache.invalidate_codes(getattr(instance, '_scan_cache_codes', []))
+
+
+# search_text is maintained by pola.product.search, saving a product keeps the stored value. It is refreshed only
+# when the names it is built from change.
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_text(instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_values = getattr(instance, '_old_values', None)
+    if old_values and 'code' in get_changed_fields(instance, ('code',)):
+        # The results of a query with the code show only the product with this code.
+        search_cache.invalidate_texts([old_values['code'], instance.code])
+    if not get_changed_fields(instance, PRODUCT_SEARCH_FIELDS):
+        return
+    search_texts = search.refresh_search_text(product_id=instance.pk)
+    instance.search_text = search_texts.get(instance.pk, instance.search_text)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_search_results(instance, **kwargs):
+    search_cache.invalidate_texts([instance.code, instance.search_text])
+
+
+@receiver(post_save, sender=Company)
+def refresh_company_search_text(instance, created, raw=False, **kwargs):
+    if raw or created or not get_changed_fields(instance, COMPANY_SEARCH_FIELDS):
+        return
+    search.refresh_search_text(company_id=instance.pk)
+
+
+@receiver(post_save, sender=Brand)
+def refresh_brand_search_text(instance, created, raw=False, **kwargs):
+    if raw or created or not get_changed_fields(instance, BRAND_SEARCH_FIELDS):
+        return
+    search.refresh_search_text(brand_id=instance.pk)
+
+
+@receiver(post_save, sender=AppConfiguration)
+@receiver(post_delete, sender=AppConfiguration)
+def invalidate_app_configuration(**kwargs):
+    scan_cache.get_cache().delete(APP_CONFIGURATION_CACHE_KEY)
@@ -4,7 +4,7 @@ from django import forms
 from django.utils.translation import gettext_lazy as _
 
 from pola.company.models import Company
-from pola.filters import CrispyFilterMixin
+from pola.filters import CrispyFilterMixin, SimilarityOrderingMixin
 
 from . import models
 
@@ -18,7 +18,7 @@ class NullProductFilter(django_filters.Filter):
         return qs
 
 
-class ProductFilter(CrispyFilterMixin, django_filters.FilterSet):
+class ProductFilter(SimilarityOrderingMixin, CrispyFilterMixin, django_filters.FilterSet):
     company_empty = NullProductFilter(label="Tylko produkty bez producenta")
 
     company = django_filters.ModelChoiceFilter(
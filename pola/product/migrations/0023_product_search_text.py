@@ -0,0 +1,49 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    TrigramExtension,
+    UnaccentExtension,
+)
+from django.db import migrations, models
+
+CREATE_NORMALIZE_FUNCTION = """
+CREATE OR REPLACE FUNCTION pola_search_normalize(value text) RETURNS text AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, coalesce(value, '')))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+"""
+
+DROP_NORMALIZE_FUNCTION = "DROP FUNCTION IF EXISTS pola_search_normalize(text)"
+
+FILL_SEARCH_TEXT = """
+UPDATE product_product AS p
+SET search_text = pola_search_normalize(concat_ws(' ',
+    p.name,
+    (SELECT concat_ws(' ', b.name, NULLIF(b.common_name, '')) FROM company_brand AS b WHERE b.id = p.brand_id),
+    (SELECT concat_ws(' ', c.name, NULLIF(c.common_name, ''), NULLIF(c.official_name, '')) FROM company_company AS c WHERE c.id = p.company_id)
+))
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('company', '0034_alter_company_logotype'),
+        ('product', '0022_alter_product_replacements_asym'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_NORMALIZE_FUNCTION, DROP_NORMALIZE_FUNCTION),
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        # Fill the column before creating the index, which is faster than updating the index row by row.
+        migrations.RunSQL(FILL_SEARCH_TEXT, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_text'], name='product_search_text_trgm', opclasses=['gin_trgm_ops']
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+def upper_trigram_index(field, name):
+    return django.contrib.postgres.indexes.GinIndex(
+        django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(field), name='gin_trgm_ops'),
+        name=name,
+    )
+
+
+class Migration(migrations.Migration):
+    # The product table is big, the indexes are created without locking it for writes.
+    atomic = False
+
+    dependencies = [
+        ('product', '0023_product_search_text'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(model_name='product', index=upper_trigram_index('name', 'product_name_upper_trgm')),
+        AddIndexConcurrently(model_name='product', index=upper_trigram_index('code', 'product_code_upper_trgm')),
+    ]
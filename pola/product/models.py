@@ -1,4 +1,4 @@
-from django.contrib.postgres.indexes import BrinIndex
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.core import validators
 from django.db import connection, models
 from django.urls import reverse
@@ -10,6 +10,7 @@ from reversion import revisions as reversion
 from pola.company.models import Brand, Company
 from pola.concurency import concurency
 from pola.gpc.models import GPCBrick
+from pola.text_search import upper_trigram_index
 
 
 class ProductQuerySet(models.query.QuerySet):
@@ -41,6 +42,8 @@ class Product(TimeStampedModel):
     query_count = models.PositiveIntegerField(null=False, default=0, db_index=True)
     ai_pics_count = models.PositiveIntegerField(null=False, default=0)
     gs1_last_response = models.JSONField(null=True)
+    # Maintained by pola.product.search
+    search_text = models.TextField(default='', blank=True, editable=False)
     replacements = models.ManyToManyField(
         'self',
         symmetrical=False,
@@ -74,10 +77,6 @@ class Product(TimeStampedModel):
             reversion.set_user(commit_user)
             reversion.add_to_revision(self)
 
-    def increment_query_count(self):
-        with connection.cursor() as cursor:
-            cursor.execute('update product_product set query_count = query_count +1 ' 'where id=%s', [self.id])
-
     def increment_ai_pics_count(self):
         with connection.cursor() as cursor:
             cursor.execute('update product_product set ai_pics_count = ai_pics_count +1 ' 'where id=%s', [self.id])
@@ -111,4 +110,9 @@ class Product(TimeStampedModel):
             # ("change_product", "Can edit the product"),
             # ("delete_product", "Can delete the product"),
         )
-        indexes = [BrinIndex(fields=['created'], pages_per_range=16)]
+        indexes = [
+            BrinIndex(fields=['created'], pages_per_range=16),
+            GinIndex(fields=['search_text'], name='product_search_text_trgm', opclasses=['gin_trgm_ops']),
+            upper_trigram_index('name', 'product_name_upper_trgm'),
+            upper_trigram_index('code', 'product_code_upper_trgm'),
+        ]
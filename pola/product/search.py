@@ -0,0 +1,98 @@
+"""Full-text search of products.
+
+Each product keeps ``search_text``: its name and the names of its brand and company, lowercased and without
+Polish diacritics (``pola_search_normalize``, see migration ``0023``). The column has a trigram GIN index, so
+substring queries of 3 and more characters do not scan the whole table. The matches are ranked by the trigram
+word similarity blended with the popularity of the product.
+
+``search_text`` is refreshed by the signals in ``pola.models`` when a product, brand or company is saved. Code
+changing the names or the companies with ``QuerySet.update`` has to call :func:`refresh_search_text`.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Func, TextField, Value
+from django.db.models.functions import Cast, Ln
+
+from pola.company.models import Brand, Company
+from pola.product import search_cache
+from pola.product.models import Product
+
+# Unique, so the results can be paginated by keyset (see ``pola.rpc_api.paginator.TokenizedPaginator``).
+ORDERING = ('-rank', 'pk')
+
+
+class SearchNormalize(Func):
+    function = 'pola_search_normalize'
+    output_field = TextField()
+
+
+def refresh_search_text(product_id=None, company_id=None, brand_id=None):
+    """Recomputes ``search_text`` of the products with the given id, company or brand, or of all the products.
+
+    Invalidates the cached search results of the products whose ``search_text`` changed, see
+    :mod:`pola.product.search_cache`.
+    Returns the new ``search_text`` keyed by the id of the product, ``None`` when all the products are refreshed.
+    """
+    conditions = {'p.id': product_id, 'p.company_id': company_id, 'p.brand_id': brand_id}
+    conditions = {column: value for column, value in conditions.items() if value is not None}
+    table = Product._meta.db_table
+    search_text = f'''
+        pola_search_normalize(concat_ws(' ',
+            p.name,
+            (SELECT concat_ws(' ', b.name, NULLIF(b.common_name, ''))
+             FROM {Brand._meta.db_table} AS b WHERE b.id = p.brand_id),
+            (SELECT concat_ws(' ', c.name, NULLIF(c.common_name, ''), NULLIF(c.official_name, ''))
+             FROM {Company._meta.db_table} AS c WHERE c.id = p.company_id)
+        ))
+    '''
+    with connection.cursor() as cursor:
+        if not conditions:
+            cursor.execute(f'UPDATE {table} AS p SET search_text = {search_text}')
+            search_cache.invalidate_all()
+            return None
+
+        where = ' AND '.join(f'{column} = %s' for column in conditions)
+        # The CTE keeps the old values, which the cached results may still show.
+        cursor.execute(
+            f'''
+            WITH old AS (SELECT p.id, p.search_text FROM {table} AS p WHERE {where} FOR UPDATE)
+            UPDATE {table} AS p
+            SET search_text = {search_text}
+            FROM old
+            WHERE p.id = old.id
+            RETURNING p.id, p.code, old.search_text, p.search_text
+            ''',
+            list(conditions.values()),
+        )
+        rows = cursor.fetchall()
+    search_cache.invalidate_texts(
+        [text for _, code, old_text, new_text in rows if old_text != new_text for text in (code, old_text, new_text)]
+    )
+    return {product_id: search_text for product_id, _, _, search_text in rows}
+
+
+def is_code_query(query):
+    return len(query) in (13, 9) and query.isnumeric()
+
+
+def search_products(query):
+    """Returns the products matching the query, the best matches first.
+
+    A query with an EAN of a known product returns only this product.
+    """
+    if is_code_query(query):
+        exact = Product.objects.filter(code=query)
+        if exact.exists():
+            return exact.annotate(rank=Value(1.0, FloatField())).order_by(*ORDERING)
+
+    normalized = SearchNormalize(Value(query))
+    return (
+        Product.objects.filter(search_text__contains=normalized)
+        .annotate(
+            rank=TrigramWordSimilarity(normalized, 'search_text')
+            + settings.PRODUCT_SEARCH['POPULARITY_WEIGHT'] * Ln(Cast(F('query_count'), FloatField()) + 1)
+        )
+        .order_by(*ORDERING)
+    )
@@ -0,0 +1,156 @@
+"""Cache of the /a/v4/search responses of hot queries, keyed by the normalized query and the page token.
+
+Only the queries asked at least ``MIN_HITS`` times within ``HITS_WINDOW`` seconds are cached, so the one-off
+queries and typos do not push the popular ones out of the cache.
+
+Each cached query has a version which is a part of the keys of its entries. When ``search_text`` of products
+changes (see :func:`pola.product.search.refresh_search_text`), the versions of the cached queries contained in
+their old or new ``search_text`` or code are bumped when the transaction commits. The entries also expire after
+``TIMEOUT`` seconds, which bounds the staleness caused by changes which are not invalidated, e.g. of the
+popularity of the products.
+
+The cached queries are registered in a ring of ``MAX_TERMS`` keys. A query takes the next slot of the ring, which
+an ``incr`` of a sequence allocates, so concurrent registrations never overwrite each other. Only when more than
+``MAX_TERMS`` queries are registered within ``TIMEOUT`` seconds, the oldest ones are dropped and not invalidated.
+"""
+
+import hashlib
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'search_result'
+VERSION_KEY_PREFIX = 'search_result_version'
+HITS_KEY_PREFIX = 'search_result_hits'
+TERM_KEY_PREFIX = 'search_result_term'
+TERM_SLOT_KEY_PREFIX = 'search_result_term_slot'
+TERMS_SEQUENCE_KEY = 'search_result_terms_sequence'
+GENERATION_KEY = 'search_result_generation'
+
+# Texts to invalidate when the transaction of the thread commits, see: invalidate_texts
+_local = threading.local()
+
+# Letters which unaccent maps, but which are not decomposed by Unicode.
+_UNACCENT = str.maketrans({'ł': 'l', 'Ł': 'L'})
+
+
+def get_cache():
+    return caches[settings.SEARCH_RESULT_CACHE['CACHE_ALIAS']]
+
+
+def normalize(query):
+    """Python counterpart of ``pola_search_normalize``: lowercase and without diacritics."""
+    decomposed = unicodedata.normalize('NFKD', query.translate(_UNACCENT))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _digest(value):
+    return hashlib.sha1(value.encode()).hexdigest()
+
+
+def _count_hit(cache, digest, count):
+    key = f'{HITS_KEY_PREFIX}:{digest}'
+    if not count:
+        return cache.get(key, 0)
+    cache.add(key, 0, timeout=settings.SEARCH_RESULT_CACHE['HITS_WINDOW'])
+    return cache.incr(key)
+
+
+def _slot_key(sequence):
+    return f'{TERM_SLOT_KEY_PREFIX}:{sequence % settings.SEARCH_RESULT_CACHE["MAX_TERMS"]}'
+
+
+def _register_term(cache, term):
+    term_key = f'{TERM_KEY_PREFIX}:{_digest(term)}'
+    sequence = cache.get(term_key)
+    # The slot of the term is taken by another one after the ring wraps around.
+    if sequence is None or cache.get(_slot_key(sequence)) != term:
+        cache.add(TERMS_SEQUENCE_KEY, 0, timeout=None)
+        sequence = cache.incr(TERMS_SEQUENCE_KEY)
+    cache.set_many({term_key: sequence, _slot_key(sequence): term}, timeout=settings.SEARCH_RESULT_CACHE['TIMEOUT'])
+
+
+def _get_terms(cache):
+    last_sequence = cache.get(TERMS_SEQUENCE_KEY, 0)
+    first_sequence = max(last_sequence - settings.SEARCH_RESULT_CACHE['MAX_TERMS'], 0) + 1
+    return set(cache.get_many([_slot_key(i) for i in range(first_sequence, last_sequence + 1)]).values())
+
+
+def get_or_compute(query, page_token, compute):
+    """Returns the cached response data of the query and page, or computes it with ``compute()``.
+
+    Only the first pages (without ``page_token``) count as asking the query.
+    """
+    if not settings.SEARCH_RESULT_CACHE_ENABLE:
+        return compute()
+
+    cache = get_cache()
+    term = normalize(query)
+    digest = _digest(term)
+    if _count_hit(cache, digest, count=page_token is None) < settings.SEARCH_RESULT_CACHE['MIN_HITS']:
+        return compute()
+
+    version_key = f'{VERSION_KEY_PREFIX}:{digest}'
+    versions = cache.get_many([version_key, GENERATION_KEY])
+    key = (
+        f'{KEY_PREFIX}:{digest}:{versions.get(GENERATION_KEY, 0)}.{versions.get(version_key, 0)}:'
+        f'{_digest(page_token or "")}'
+    )
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    _register_term(cache, term)
+    data = compute()
+    timeout = settings.SEARCH_RESULT_CACHE['TIMEOUT']
+    # The entry is stored only when the transaction commits, so data of a rolled back request never reaches the
+    # cache. An invalidation in the meantime bumps the version, so the entry is stored under a stale key.
+    transaction.on_commit(lambda: cache.set(key, data, timeout))
+    return data
+
+
+def _bump(cache, key):
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def _get_pending_texts() -> set:
+    if not hasattr(_local, 'pending_texts'):
+        _local.pending_texts = set()
+    return _local.pending_texts
+
+
+def invalidate_texts(texts):
+    """Invalidates the cached queries contained in any of the texts (``search_text`` values and codes).
+
+    The versions are bumped when the transaction commits. Until then, the texts are collected, so the registered
+    queries are fetched and matched once per transaction, however many products it changes: the first callback
+    takes all the texts and the others find none. The texts of a rolled back transaction are invalidated with the
+    next one.
+    """
+    if not settings.SEARCH_RESULT_CACHE_ENABLE:
+        return
+    _get_pending_texts().update(text for text in texts if text)
+    transaction.on_commit(_invalidate_pending_texts)
+
+
+def _invalidate_pending_texts():
+    texts = _get_pending_texts()
+    _local.pending_texts = set()
+    if not texts:
+        return
+    cache = get_cache()
+    for term in _get_terms(cache):
+        if any(term in text for text in texts):
+            _bump(cache, f'{VERSION_KEY_PREFIX}:{_digest(term)}')
+
+
+def invalidate_all():
+    if not settings.SEARCH_RESULT_CACHE_ENABLE:
+        return
+    cache = get_cache()
+    _bump(cache, GENERATION_KEY)
+    transaction.on_commit(lambda: _bump(cache, GENERATION_KEY))
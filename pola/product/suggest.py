@@ -0,0 +1,325 @@
+"""Search-as-you-type suggestions served from an in-memory prefix index.
+
+Each worker process keeps an index of the names of the most popular products and of all the brands and
+companies, weighted by ``query_count``. Every word of a name is a separate key, so "kozie" completes
+"Mleko kozie". The keys are normalized like ``search_text`` and kept in a sorted list searched with bisect. The
+best completions of the prefixes matching more than ``MAX_SCANNED_KEYS`` keys are precomputed, so a request ranks
+at most ``MAX_SCANNED_KEYS`` keys, whatever the length of the prefix.
+
+The requests never touch the database. When the index is older than ``REFRESH_INTERVAL`` seconds, a background
+thread reads the new products and the brands and companies modified since the last refresh and merges them into
+the index, which updates the keys and the precomputed completions of the changed names (see
+:meth:`SuggestIndex.merge` for its cost). Every
+``FULL_REFRESH_INTERVAL`` seconds it rereads all of them and builds a new index, which picks up renamed
+products, deleted rows and new popularity. Until the first refresh of the process finishes, there are no suggestions.
+"""
+
+import copy
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+from pola.company.models import Brand, Company
+from pola.product.models import Product
+from pola.product.search_cache import normalize
+
+LOGGER = logging.getLogger(__file__)
+
+MAX_LIMIT = 20
+MAX_SCANNED_KEYS = 1000
+
+PRODUCT = 'product'
+BRAND = 'brand'
+COMPANY = 'company'
+
+
+def _normalize_label(label):
+    return ' '.join(normalize(label).split())
+
+
+def _word_keys(normalized):
+    words = normalized.split(' ')
+    return [' '.join(words[start:]) for start in range(len(words))]
+
+
+class SuggestIndex:
+    """Immutable prefix index of ``{(type, pk): (label, weight)}`` entries.
+
+    Entries with the same normalized label are suggested once, with the type and label of the heaviest one.
+    """
+
+    def __init__(self, entries):
+        self._entries = dict(entries)
+        self._normalized = {key: _normalize_label(label) for key, (label, _) in self._entries.items()}
+        self._members = defaultdict(set)
+        for key, normalized in self._normalized.items():
+            if normalized:
+                self._members[normalized].add(key)
+        self._members = dict(self._members)
+
+        self._ids_by_normalized = {}
+        self._types = []
+        self._labels = []
+        self._weights = array('q')
+        keys = []
+        for i, (normalized, members) in enumerate(self._members.items()):
+            entry_type, label, weight = self._heaviest_entry(members)
+            self._ids_by_normalized[normalized] = i
+            self._types.append(entry_type)
+            self._labels.append(label)
+            self._weights.append(weight)
+            keys.extend((key, i) for key in _word_keys(normalized))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._ids = array('I', (i for _, i in keys))
+        self._precompute_top()
+
+    def __len__(self):
+        return len(self._ids_by_normalized)
+
+    def _heaviest_entry(self, members):
+        key = max(members, key=lambda key: (self._entries[key][1], key))
+        label, weight = self._entries[key]
+        return key[0], label, weight
+
+    def _best(self, ids, limit):
+        return tuple(heapq.nlargest(limit, ids, key=lambda i: (self._weights[i], -i)))
+
+    def _range(self, prefix):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\uffff', lo=start)
+        return set(self._ids[start:end])
+
+    def _precompute_top(self):
+        """Precomputes the best completions of the prefixes matching too many keys to be ranked on request."""
+        self._top = {}
+        # Ranges of the keys sharing a prefix of the given length, which are split by the next character.
+        pending = [(0, len(self._keys), 0)]
+        while pending:
+            start, end, length = pending.pop()
+            position = start
+            while position < end:
+                key = self._keys[position]
+                if len(key) == length:
+                    position += 1
+                    continue
+                prefix = key[: length + 1]
+                prefix_end = bisect_left(self._keys, prefix + '\uffff', lo=position, hi=end)
+                if prefix_end - position > MAX_SCANNED_KEYS:
+                    self._top[prefix] = self._best(set(self._ids[position:prefix_end]), MAX_LIMIT)
+                    pending.append((position, prefix_end, length + 1))
+                position = prefix_end
+
+    def _precomputed_prefixes(self, normalized):
+        # A prefix is precomputed only if the shorter ones are too.
+        for key in _word_keys(normalized):
+            for length in range(1, len(key) + 1):
+                if key[:length] not in self._top:
+                    break
+                yield key[:length]
+
+    def suggest(self, prefix, limit=10):
+        """Returns up to ``limit`` ``(type, label)`` completions of the prefix, the most popular first."""
+        prefix = ' '.join(normalize(prefix).split()) + (' ' if prefix[-1:].isspace() else '')
+        if not prefix.strip():
+            return []
+        if prefix in self._top:
+            ids = self._top[prefix][:limit]
+        else:
+            ids = self._best(self._range(prefix), limit)
+        return [(self._types[i], self._labels[i]) for i in ids]
+
+    def merge(self, changed):
+        """Returns a new index with the ``changed`` entries added or replaced.
+
+        The index is served while the new one is built, so its lists and dicts are copied, and every added or
+        removed key shifts the tail of the sorted keys. Both are linear in the size of the index, but they are
+        memory copies, far cheaper than a build, which normalizes, sorts and ranks all the entries. Only the labels
+        and the precomputed completions of the changed entries are recomputed. The prefixes which grow past
+        ``MAX_SCANNED_KEYS`` keys are precomputed with the next build. The ids of the labels which are no longer
+        used are not reused until the next build either.
+        """
+        index = copy.copy(self)
+        index._entries = {**self._entries, **changed}
+        index._normalized = dict(self._normalized)
+        index._members = dict(self._members)
+        index._ids_by_normalized = dict(self._ids_by_normalized)
+        index._types = list(self._types)
+        index._labels = list(self._labels)
+        index._weights = array('q', self._weights)
+        index._keys = list(self._keys)
+        index._ids = array('I', self._ids)
+        index._top = dict(self._top)
+
+        affected = set()
+        for key, (label, _) in changed.items():
+            old_normalized = self._normalized.get(key)
+            normalized = index._normalized[key] = _normalize_label(label)
+            if old_normalized:
+                index._members[old_normalized] = index._members[old_normalized] - {key}
+                affected.add(old_normalized)
+            if normalized:
+                index._members[normalized] = index._members.get(normalized, set()) | {key}
+                affected.add(normalized)
+
+        ids_by_prefix = defaultdict(set)
+        lowered = set()
+        for normalized in affected:
+            members = index._members[normalized]
+            i = index._ids_by_normalized.get(normalized)
+            if not members:
+                del index._members[normalized]
+                del index._ids_by_normalized[normalized]
+                index._remove_keys(normalized, i)
+                index._types[i] = index._labels[i] = None
+                lowered.add(i)
+            elif i is None:
+                i = index._ids_by_normalized[normalized] = len(index._labels)
+                index._types.append(None)
+                index._labels.append(None)
+                index._weights.append(0)
+                index._insert_keys(normalized, i)
+            if members:
+                index._types[i], index._labels[i], weight = index._heaviest_entry(members)
+                if weight < index._weights[i]:
+                    lowered.add(i)
+                index._weights[i] = weight
+            for prefix in index._precomputed_prefixes(normalized):
+                ids_by_prefix[prefix].add(i)
+
+        for prefix, ids in ids_by_prefix.items():
+            top = self._top.get(prefix, ())
+            if lowered.intersection(top):
+                # Other labels can take the place of a lighter or removed one, they are looked up again.
+                top = index._best(index._range(prefix), MAX_LIMIT)
+            else:
+                # The labels outside of the top ones are not heavier than them and did not change.
+                top = index._best(set(top).union(i for i in ids if index._labels[i] is not None), MAX_LIMIT)
+            if top:
+                index._top[prefix] = top
+            else:
+                index._top.pop(prefix, None)
+        return index
+
+    def _insert_keys(self, normalized, i):
+        # The new ids are the highest ones, so they go after the same keys, like in the sorted (key, id) pairs.
+        for key in _word_keys(normalized):
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, i)
+
+    def _remove_keys(self, normalized, i):
+        for key in _word_keys(normalized):
+            position = bisect_left(self._keys, key)
+            while self._ids[position] != i:
+                position += 1
+            del self._keys[position]
+            del self._ids[position]
+
+
+def _product_entries(after_pk):
+    products = Product.objects.filter(name__isnull=False).exclude(name='')
+    if after_pk is None:
+        products = products.order_by('-query_count')[: settings.PRODUCT_SUGGEST['MAX_PRODUCTS']]
+    else:
+        # The product table is too big to be scanned for modified rows, only new products are read.
+        products = products.filter(pk__gt=after_pk)
+    return {(PRODUCT, pk): (name, weight) for pk, name, weight in products.values_list('pk', 'name', 'query_count')}
+
+
+def _brand_entries(since):
+    brands = Brand.objects.filter(Q(common_name__gt='') | Q(name__gt=''))
+    if since is not None:
+        brands = brands.filter(modified__gte=since)
+    brands = brands.annotate(weight=Coalesce(Sum('product__query_count'), 0))
+    return {
+        (BRAND, pk): (common_name or name, weight)
+        for pk, common_name, name, weight in brands.values_list('pk', 'common_name', 'name', 'weight')
+    }
+
+
+def _company_entries(since):
+    companies = Company.objects.filter(Q(common_name__gt='') | Q(name__gt=''))
+    if since is not None:
+        companies = companies.filter(modified__gte=since)
+    return {
+        (COMPANY, pk): (common_name or name, weight)
+        for pk, common_name, name, weight in companies.values_list('pk', 'common_name', 'name', 'query_count')
+    }
+
+
+class Suggester:
+    """Keeps the index of the process up to date, see the module docstring."""
+
+    def __init__(self):
+        self.index = None
+        self._max_product_pk = None
+        self._refreshed_at = None
+        self._full_refreshed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def suggest(self, prefix, limit=10):
+        self._refresh_in_background_if_stale()
+        index = self.index
+        return index.suggest(prefix, limit) if index is not None else []
+
+    def refresh(self, full=False):
+        """Reads the entries changed since the last refresh and merges them into the index, or builds the index of
+        all the entries."""
+        started_at = time.time()
+        full = full or self._full_refreshed_at is None
+        # Rows modified during the previous refresh are read again, the window overlaps by a second.
+        since = None if full else datetime.fromtimestamp(self._refreshed_at - 1, tz=timezone.utc)
+        max_product_pk = Product.objects.order_by('-pk').values_list('pk', flat=True).first()
+        changed = {
+            **_product_entries(None if full else self._max_product_pk),
+            **_brand_entries(since),
+            **_company_entries(since),
+        }
+        self.index = SuggestIndex(changed) if full else self.index.merge(changed)
+        self._max_product_pk = max_product_pk or 0
+        self._refreshed_at = started_at
+        if full:
+            self._full_refreshed_at = started_at
+        LOGGER.debug('Suggest index refreshed with %d changed entries', len(changed))
+
+    def _is_stale(self):
+        refresh_interval = settings.PRODUCT_SUGGEST['REFRESH_INTERVAL']
+        return self._refreshed_at is None or time.time() - self._refreshed_at > refresh_interval
+
+    def _refresh_in_background_if_stale(self):
+        if not self._is_stale():
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        full = (
+            self._full_refreshed_at is None
+            or time.time() - self._full_refreshed_at > settings.PRODUCT_SUGGEST['FULL_REFRESH_INTERVAL']
+        )
+        threading.Thread(target=self._refresh_in_thread, args=(full,), name='suggest-index', daemon=True).start()
+
+    def _refresh_in_thread(self, full):
+        try:
+            self.refresh(full=full)
+        except Exception:
+            LOGGER.exception('Failed to refresh the suggest index')
+        finally:
+            self._refreshing = False
+            # The thread has its own connection.
+            connection.close()
+
+
+suggester = Suggester()
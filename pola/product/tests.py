@@ -1,5 +1,7 @@
 import textwrap
+from unittest import mock
 
+from django.db import connection
 from django.test import override_settings
 from django.urls import reverse, reverse_lazy
 from django_webtest import WebTestMixin
@@ -7,10 +9,13 @@ from parameterized import parameterized
 from reversion.models import Version
 from test_plus.test import TestCase
 
-from pola.company.factories import CompanyFactory
+from pola.company.factories import BrandFactory, CompanyFactory
+from pola.product import search_cache, suggest
 from pola.product.factories import ProductFactory
 from pola.product.forms import AddBulkProductForm
 from pola.product.models import Product
+from pola.product.search import refresh_search_text, search_products
+from pola.product.suggest import Suggester, SuggestIndex
 from pola.tests.test_views import PermissionMixin
 
 
@@ -296,6 +301,267 @@ class TestProductBulkCreate(PermissionMixin, WebTestMixin, TestCase):
         self.assertEqual(messages[0].message, 'Zapisano 1 produktów,\n')
 
 
+class TestProductSearch(TestCase):
+    def test_should_keep_search_text_up_to_date(self):
+        company = CompanyFactory(name="Zakłady", common_name="", official_name=None)
+        brand = BrandFactory(name="Łaciate", common_name=None)
+        product = ProductFactory(name="Mleko", company=company, brand=brand)
+
+        product.refresh_from_db()
+        self.assertEqual("mleko laciate zaklady", product.search_text)
+
+        company.common_name = "Mlekovita"
+        company.save()
+        product.refresh_from_db()
+        self.assertEqual("mleko laciate zaklady mlekovita", product.search_text)
+
+    def test_should_refresh_search_text_only_when_names_change(self):
+        company = CompanyFactory()
+        ProductFactory(company=company)
+
+        company.description = "Opis"
+        with mock.patch("pola.product.search.refresh_search_text") as refresh:
+            company.save()
+
+        refresh.assert_not_called()
+
+    def test_should_keep_stored_search_text_of_outdated_instance(self):
+        company = CompanyFactory(name="Zakłady", common_name="", official_name=None)
+        product = ProductFactory(name="Mleko", company=company, brand=None)
+        outdated = Product.objects.get(pk=product.pk)
+        company.name = "Mlekovita"
+        company.save()
+
+        outdated.ai_pics_count = 1
+        outdated.save()
+
+        outdated.refresh_from_db()
+        self.assertEqual("mleko mlekovita", outdated.search_text)
+
+    def test_should_refresh_products_updated_without_signals(self):
+        product = ProductFactory(name="Mleko")
+        Product.objects.filter(pk=product.pk).update(name="Kefir")
+
+        refresh_search_text(product_id=product.pk)
+
+        self.assertEqual([product], list(search_products("kefir")))
+
+    def test_should_return_product_with_matching_code_only(self):
+        product = ProductFactory(code="5900000000001")
+        ProductFactory(name="5900000000001")
+
+        self.assertEqual([product], list(search_products("5900000000001")))
+
+    def test_should_use_trigram_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn("product_search_text_trgm", search_products("mleko").explain())
+
+
+@override_settings(
+    SEARCH_RESULT_CACHE_ENABLE=True,
+    SEARCH_RESULT_CACHE={'CACHE_ALIAS': 'default', 'TIMEOUT': 60, 'MIN_HITS': 2, 'HITS_WINDOW': 60, 'MAX_TERMS': 10},
+)
+class TestSearchResultCache(TestCase):
+    def setUp(self):
+        search_cache.get_cache().clear()
+        self.calls = 0
+
+    def create_product(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductFactory(**kwargs)
+
+    def search(self, query, page_token=None):
+        def compute():
+            self.calls += 1
+            return [p.code for p in search_products(query)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return search_cache.get_or_compute(query, page_token, compute)
+
+    def test_should_cache_only_hot_queries(self):
+        self.create_product(name="Mleko")
+
+        self.search("mleko")
+        self.search("mleko")
+        self.assertEqual(2, self.calls)
+        self.search("mleko")
+        self.assertEqual(2, self.calls)
+
+    def test_should_share_entries_of_normalized_queries(self):
+        self.create_product(name="Łaciate")
+        for _ in range(2):
+            self.search("łaciate")
+
+        self.search("LACIATE")
+        self.assertEqual(2, self.calls)
+
+    def test_should_cache_pages_separately(self):
+        self.create_product(name="Mleko")
+        for _ in range(2):
+            self.search("mleko")
+
+        self.search("mleko", page_token="next")
+        self.assertEqual(3, self.calls)
+
+    def test_should_invalidate_when_matching_product_changes(self):
+        product = self.create_product(name="Mleko")
+        for _ in range(2):
+            self.search("mleko")
+
+        product.name = "Kefir"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual([], self.search("mleko"))
+        self.assertEqual(3, self.calls)
+
+    def test_should_invalidate_when_product_starts_matching(self):
+        self.create_product(name="Mleko")
+        product = self.create_product(name="Kefir")
+        for _ in range(2):
+            self.search("mleko")
+
+        product.name = "Mleko kozie"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual(2, len(self.search("mleko")))
+
+    def test_should_keep_entries_of_other_queries(self):
+        self.create_product(name="Mleko")
+        product = self.create_product(name="Kefir")
+        for _ in range(2):
+            self.search("mleko")
+
+        product.name = "Kefir naturalny"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.search("mleko")
+        self.assertEqual(2, self.calls)
+
+    def test_should_register_query_again_when_its_slot_is_taken(self):
+        product = self.create_product(name="Mleko")
+        cache = search_cache.get_cache()
+        search_cache._register_term(cache, "mleko")
+        for i in range(10):
+            search_cache._register_term(cache, f"query {i}")
+        for _ in range(2):
+            self.search("mleko")
+
+        product.name = "Kefir"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual([], self.search("mleko"))
+
+    def test_should_match_queries_once_per_transaction(self):
+        products = [self.create_product(name="Mleko"), self.create_product(name="Kefir")]
+        for _ in range(2):
+            self.search("mleko")
+
+        with mock.patch("pola.product.search_cache._get_terms", wraps=search_cache._get_terms) as get_terms:
+            with self.captureOnCommitCallbacks(execute=True):
+                for product in products:
+                    product.name = f"{product.name} kozie"
+                    product.save()
+
+        get_terms.assert_called_once()
+        self.search("mleko")
+        self.assertEqual(3, self.calls)
+
+    def test_should_keep_entries_when_search_text_does_not_change(self):
+        product = self.create_product(name="Mleko")
+        for _ in range(2):
+            self.search("mleko")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_search_text(product_id=product.pk)
+
+        self.search("mleko")
+        self.assertEqual(2, self.calls)
+
+
+class TestSuggestIndex(TestCase):
+    def setUp(self):
+        self.index = SuggestIndex(
+            {
+                ('product', 1): ("Mleko kozie", 10),
+                ('product', 2): ("Mleko łaciate", 30),
+                ('product', 3): ("MLEKO KOZIE", 50),
+                ('brand', 1): ("Mlekovita", 20),
+                ('company', 1): ("Kozi Gródek", 5),
+            }
+        )
+
+    def test_should_return_most_popular_completions_first(self):
+        self.assertEqual(
+            [('product', "MLEKO KOZIE"), ('product', "Mleko łaciate"), ('brand', "Mlekovita")],
+            self.index.suggest("mle"),
+        )
+
+    def test_should_complete_any_word(self):
+        self.assertEqual([('product', "MLEKO KOZIE"), ('company', "Kozi Gródek")], self.index.suggest("koz"))
+
+    def test_should_ignore_case_and_diacritics(self):
+        self.assertEqual([('product', "Mleko łaciate")], self.index.suggest("MLEKO LAć"))
+        self.assertEqual([('company', "Kozi Gródek")], self.index.suggest("grod"))
+
+    def test_should_respect_word_boundary(self):
+        self.assertEqual([('product', "MLEKO KOZIE"), ('product', "Mleko łaciate")], self.index.suggest("mleko "))
+
+    def test_should_limit_completions(self):
+        self.assertEqual([('product', "MLEKO KOZIE")], self.index.suggest("m", limit=1))
+
+    def test_should_return_nothing_for_blank_prefix(self):
+        self.assertEqual([], self.index.suggest("  "))
+
+    def test_should_merge_changed_entries(self):
+        index = self.index.merge({('product', 3): ("Mleko owsiane", 1), ('brand', 2): ("Kozidar", 40)})
+
+        self.assertEqual(
+            [('brand', "Kozidar"), ('product', "Mleko kozie"), ('company', "Kozi Gródek")], index.suggest("koz")
+        )
+        self.assertEqual([('product', "Mleko owsiane")], index.suggest("mleko o"))
+        self.assertEqual([('product', "MLEKO KOZIE"), ('company', "Kozi Gródek")], self.index.suggest("koz"))
+
+
+class TestSuggestIndexWithPrecomputedCompletions(TestSuggestIndex):
+    def setUp(self):
+        patcher = mock.patch.object(suggest, 'MAX_SCANNED_KEYS', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_should_precompute_completions_of_prefixes_matching_many_keys(self):
+        self.assertIn("mleko ", self.index._top)
+        self.assertNotIn("mleko k", self.index._top)
+
+
+class TestSuggester(TestCase):
+    def test_should_add_new_products_on_refresh(self):
+        suggester = Suggester()
+        suggester.refresh()
+        self.assertEqual([], suggester.index.suggest("kefir"))
+
+        ProductFactory(name="Kefir", company=None, brand=None)
+        suggester.refresh()
+
+        self.assertEqual([('product', "Kefir")], suggester.index.suggest("kefir"))
+
+    def test_should_update_renamed_brands_on_refresh(self):
+        brand = BrandFactory(name="Mlekovita", common_name=None)
+        suggester = Suggester()
+        suggester.refresh()
+
+        brand.common_name = "Wypasione"
+        brand.save()
+        suggester.refresh()
+
+        self.assertEqual([('brand', "Wypasione")], suggester.index.suggest("wyp"))
+
+
 class TestUrls(TestCase):
     def test_should_render_url(self):
         self.assertEqual("/cms/product/create", reverse('product:create'))
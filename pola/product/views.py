@@ -2,6 +2,9 @@ from braces.views import FormValidMessageMixin, MessageMixin
 from dal import autocomplete
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q, Value
+from django.db.models.functions import Greatest
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
@@ -20,6 +23,7 @@ from reversion.models import Version
 from pola.concurency import ConcurencyProtectUpdateView
 from pola.mixins import LoginPermissionRequiredMixin
 from pola.product.models import Product
+from pola.product.search import SearchNormalize
 from pola.report.models import Report
 from pola.views import ExprAutocompleteMixin
 
@@ -98,15 +102,18 @@ def get_image(request, code):
 
 
 class ProductAutocomplete(LoginRequiredMixin, ExprAutocompleteMixin, autocomplete.Select2QuerySetView):
+    # The names of the product, its brand and company are searched in the indexed search_text, without a join.
     search_expr = [
-        'name__icontains',
         'code__icontains',
-        'company__name__icontains',
-        'company__official_name__icontains',
-        'company__common_name__icontains',
     ]
     model = Product
 
+    def get_filters(self):
+        return super().get_filters() | Q(search_text__contains=SearchNormalize(Value(self.q)))
+
+    def get_search_rank(self):
+        return Greatest(TrigramWordSimilarity(SearchNormalize(Value(self.q)), 'search_text'), super().get_search_rank())
+
     def get_result_label(self, item):
         return f"{item.code} - {item.name}"
 
@@ -0,0 +1,186 @@
+"""Monthly partitions of ``pola_query``.
+
+``pola_query`` is partitioned by range of ``timestamp`` (see migration ``pola.0010``). The rows from before the
+partitioning live in ``pola_query_legacy``; every month after that has its own partition ``pola_query_yYYYYmMM``,
+bounded by the first days of the months in UTC. ``pola_query_default`` catches the rows for which no partition
+exists yet and should stay empty - the ``manage_query_partitions`` command creates the partitions in advance.
+
+``pola_query_legacy`` holds many months, so it expires as a whole only when the last of them does. Until then the
+rows of its expired months can only be deleted, see :func:`prune_legacy_partition`.
+
+Queries bounded by ``timestamp`` read only the matching partitions. The parent table has no primary key, because
+it would have to include ``timestamp``; each partition has its own on ``id``, which is unique across the
+partitions, as all of them share the sequence of the parent.
+"""
+
+import re
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+TABLE = 'pola_query'
+LEGACY_PARTITION = 'pola_query_legacy'
+DEFAULT_PARTITION = 'pola_query_default'
+
+_NAME_RE = re.compile(r'^pola_query_y(\d{4})m(\d{2})$')
+_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(start, months):
+    year, month = divmod(start.year * 12 + start.month - 1 + months, 12)
+    return datetime(year, month + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start):
+    return f'{TABLE}_y{start.year:04d}m{start.month:02d}'
+
+
+def get_partitions():
+    """Returns ``{start of the month: partition name}`` of the monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ''',
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        if match := _NAME_RE.match(name):
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)] = name
+    return dict(sorted(partitions.items()))
+
+
+def get_legacy_end():
+    """Returns the upper bound of ``pola_query_legacy``, the months before it need no partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE relname = %s AND relispartition',
+            [LEGACY_PARTITION],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    # FOR VALUES FROM (MINVALUE) TO ('2024-05-01 00:00:00+00')
+    end = _BOUND_RE.search(row[0])[1]
+    return datetime.fromisoformat(end).astimezone(timezone.utc)
+
+
+def create_partition(start):
+    """Creates the partition of the month starting at ``start``, unless it exists.
+
+    Rows of the month which ended up in ``pola_query_default`` are moved to the new partition.
+    """
+    name = partition_name(start)
+    bounds = [start, add_months(start, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return name
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)', bounds
+        )
+        misplaced = cursor.fetchone()[0]
+        if misplaced:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)', bounds)
+        cursor.execute(f'ALTER TABLE {name} ADD PRIMARY KEY (id)')
+        if misplaced:
+            cursor.execute(
+                f'''
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                ''',
+                bounds,
+            )
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+    return name
+
+
+def ensure_partitions(months_ahead, now=None):
+    """Creates the partitions of the current month and of ``months_ahead`` next months. Returns the created ones."""
+    start = month_start(now or datetime.now(timezone.utc))
+    existing = get_partitions()
+    legacy_end = get_legacy_end()
+    created = []
+    for i in range(months_ahead + 1):
+        month = add_months(start, i)
+        if month not in existing and (legacy_end is None or month >= legacy_end):
+            created.append(create_partition(month))
+    return created
+
+
+def expire_partitions(retention_months, drop=False, now=None):
+    """Detaches, or drops, the partitions of the months older than ``retention_months``. Returns their names.
+
+    A detached partition stays in the database as a regular table, e.g. to be archived, and can be attached back.
+    """
+    cutoff = add_months(month_start(now or datetime.now(timezone.utc)), -retention_months)
+    expired = [name for start, name in get_partitions().items() if add_months(start, 1) <= cutoff]
+    legacy_end = get_legacy_end()
+    if legacy_end is not None and legacy_end <= cutoff:
+        expired.insert(0, LEGACY_PARTITION)
+    with connection.cursor() as cursor:
+        for name in expired:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+    return expired
+
+
+def prune_legacy_partition(retention_months, now=None):
+    """Deletes the rows older than ``retention_months`` from ``pola_query_legacy``. Returns their number."""
+    if get_legacy_end() is None:
+        return 0
+    return delete_legacy_rows(None, add_months(month_start(now or datetime.now(timezone.utc)), -retention_months))
+
+
+def delete_legacy_rows(start, end, batch_size=None):
+    """Deletes the rows of ``pola_query_legacy`` from ``start`` until ``end``. Returns their number.
+
+    ``start`` is ``None`` to delete from the oldest row. The rows are deleted by ranges of ``DELETE_BATCH_SIZE`` ids,
+    each in its own transaction, so that deleting millions of them neither holds the locks for long nor leaves all
+    the dead rows for a single vacuum.
+    """
+    batch_size = batch_size or settings.QUERY_PARTITIONS['DELETE_BATCH_SIZE']
+    where, bounds = '"timestamp" < %s', [end]
+    if start is not None:
+        where, bounds = f'"timestamp" >= %s AND {where}', [start, end]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(id), max(id) FROM {LEGACY_PARTITION} WHERE {where}', bounds)
+        first_id, last_id = cursor.fetchone()
+    if first_id is None:
+        return 0
+
+    deleted = 0
+    for batch_start in range(first_id, last_id + 1, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {LEGACY_PARTITION} WHERE id >= %s AND id < %s AND {where}',
+                [batch_start, batch_start + batch_size, *bounds],
+            )
+            deleted += cursor.rowcount
+    return deleted
+
+
+def drop_partition(start):
+    """Detaches and drops the partition of the month starting at ``start``. Returns the number of its rows."""
+    name = partition_name(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {name}')
+        rows = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+    return rows
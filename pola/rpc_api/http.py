@@ -1,9 +1,76 @@
+import json
+import secrets
 from typing import Any
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class JsonProblemResponse(JsonResponse):
+_django_encoder = DjangoJSONEncoder()
+
+
+class RawJSON:
+    """Already encoded JSON, spliced into the response without being encoded again.
+
+    Lets callers cache an encoded block of a response, e.g. ``RawJSON.encode(company_data)``.
+    """
+
+    __slots__ = ('encoded',)
+
+    def __init__(self, encoded: str):
+        self.encoded = encoded
+
+    @classmethod
+    def encode(cls, data) -> 'RawJSON':
+        return cls(dumps(data))
+
+
+def dumps(data) -> str:
+    """Encodes the data like ``JsonResponse``, but compact and without escaping non-ASCII characters.
+
+    The decoded values are the same. ``RawJSON`` values are inserted as they are. The encoder is chosen with the
+    ``API_JSON_ENCODER`` setting.
+    """
+    fragments = []
+    # The nonce keeps the placeholders apart from the strings in the data.
+    nonce = secrets.token_hex(8)
+
+    def default(o):
+        if isinstance(o, RawJSON):
+            fragments.append(o.encoded)
+            return f'\0{nonce}:{len(fragments) - 1}\0'
+        return _django_encoder.default(o)
+
+    encoded = _encode(data, default)
+    for i, fragment in enumerate(fragments):
+        encoded = encoded.replace(f'"\\u0000{nonce}:{i}\\u0000"', fragment, 1)
+    return encoded
+
+
+def _encode(data, default):
+    if settings.API_JSON_ENCODER == 'orjson' and orjson is not None:
+        # The dates are encoded by DjangoJSONEncoder, orjson would keep the microseconds.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(data, default=default, option=option).decode()
+    return json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=default).encode(data)
+
+
+class ApiJsonResponse(HttpResponse):
+    """``JsonResponse`` of the API, encoded with :func:`dumps`."""
+
+    def __init__(self, data, safe: bool = True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data).encode(), **kwargs)
+
+
+class JsonProblemResponse(ApiJsonResponse):
     def __init__(
         self,
         title: str,
@@ -1,11 +1,14 @@
 import functools
 import json
-import logging
 
 from django.http import HttpResponse, HttpResponseServerError
 from jsonschema.validators import validator_for
 
-log = logging.getLogger(__file__)
+from pola.rpc_api.response_validation import (
+    is_strict,
+    report_invalid_response,
+    should_validate_response,
+)
 
 
 def validate_json_response(schema, *args, **kwargs):
@@ -16,16 +19,16 @@ def validate_json_response(schema, *args, **kwargs):
 
     def wrapper(func):
         @functools.wraps(func)
-        def validate_json_schema(*args, **kwargs):
-            response: HttpResponse = func(*args, **kwargs)
-            if response['Content-Type'] == 'application/json':
-                errors = list(validator.iter_errors(json.loads(response.content)))
-                if errors:
-                    log.error("Invalid response. %d errors encountered", len(errors))
-                    for error in errors:
-                        log.error("%s", error)
-                        print(error)
-                    return HttpResponseServerError("The server generated an invalid response.")
+        def validate_json_schema(request, *args, **kwargs):
+            response: HttpResponse = func(request, *args, **kwargs)
+            if response['Content-Type'] != 'application/json' or not should_validate_response():
+                return response
+            data = json.loads(response.content)
+            if validator.is_valid(data):
+                return response
+            report_invalid_response(request, list(validator.iter_errors(data)))
+            if is_strict():
+                return HttpResponseServerError("The server generated an invalid response.")
             return response
 
         return validate_json_schema
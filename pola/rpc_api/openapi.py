@@ -7,6 +7,11 @@ from openapi_core.contrib.django.handlers import DjangoOpenAPIErrorsHandler
 from openapi_core.validation.schemas.exceptions import InvalidSchemaValue
 
 from pola.rpc_api.http import JsonProblemResponse
+from pola.rpc_api.response_validation import (
+    is_strict,
+    report_invalid_response,
+    should_validate_response,
+)
 
 
 class PolaDjangoOpenAPIErrorsHandler(DjangoOpenAPIErrorsHandler):
@@ -40,8 +45,25 @@ class PolaDjangoOpenAPIErrorsHandler(DjangoOpenAPIErrorsHandler):
         )
 
 
+class PolaDjangoOpenAPIViewDecorator(DjangoOpenAPIViewDecorator):
+    """Validates all the requests, but only a sample of the responses. See: pola.rpc_api.response_validation"""
+
+    # Overrides DjangoIntegration.handle_response of openapi-core, pinned in dependencies/requirements-production.txt
+    def handle_response(self, request, response, errors_handler):
+        if not should_validate_response():
+            return response
+        if is_strict():
+            return super().handle_response(request, response, errors_handler)
+
+        def report_errors(errors):
+            report_invalid_response(request, list(errors))
+            return response
+
+        return super().handle_response(request, response, report_errors)
+
+
 # Build a single decorator object for the entire application.
-openapi_decorator = DjangoOpenAPIViewDecorator()
+openapi_decorator = PolaDjangoOpenAPIViewDecorator()
 # HACK: Workaround for: https://github.com/python-openapi/openapi-core/pull/979
 openapi_decorator.errors_handler_cls = PolaDjangoOpenAPIErrorsHandler
 
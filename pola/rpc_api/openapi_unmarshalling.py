@@ -0,0 +1,74 @@
+"""Unmarshallers of the API requests and responses which build the schema validators once.
+
+For every parameter, request body and response body, openapi-core 0.20 builds a new jsonschema validator, together
+with a deep copy of the format checker, and validates the value twice: once when validating it and once again when
+unmarshalling it. These unmarshallers keep the validator of each schema and validate the value once, when it is
+unmarshalled.
+
+Imported by the settings, so this module must not use the settings. See: ``OPENAPI`` in the settings.
+"""
+
+from openapi_core.casting.schemas.factories import SchemaCastersFactory
+from openapi_core.unmarshalling.request.unmarshallers import (
+    V30RequestUnmarshaller,
+)
+from openapi_core.unmarshalling.response.unmarshallers import (
+    V30ResponseUnmarshaller,
+)
+from openapi_core.unmarshalling.schemas.factories import (
+    SchemaUnmarshallersFactory,
+)
+from openapi_core.validation.schemas.factories import SchemaValidatorsFactory
+
+
+class CachedSchemaValidatorsFactory(SchemaValidatorsFactory):
+    """Builds the validator of a schema on the first use and returns the same validator afterwards.
+
+    The schema paths of different specs compare equal, so a factory must serve only one spec.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._validators = {}
+
+    def create(self, schema, format_validators=None, extra_format_validators=None):
+        if format_validators is not None or extra_format_validators:
+            return super().create(schema, format_validators, extra_format_validators)
+        validator = self._validators.get(schema)
+        if validator is None:
+            validator = self._validators[schema] = super().create(schema)
+        return validator
+
+
+class CachedSchemaValidatorsMixin:
+    """Makes an openapi-core unmarshaller reuse the schema validators of its spec."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # An unmarshaller is built once per spec, see: openapi_core.OpenAPI.request_unmarshaller
+        validators_factory = CachedSchemaValidatorsFactory(
+            self.schema_validators_factory.schema_validator_class,
+            self.schema_validators_factory.format_checker,
+        )
+        self.schema_validators_factory = validators_factory
+        self.schema_casters_factory = SchemaCastersFactory(
+            validators_factory,
+            self.schema_casters_factory.types_caster,
+        )
+        self.schema_unmarshallers_factory = SchemaUnmarshallersFactory(
+            validators_factory,
+            self.schema_unmarshallers_factory.types_unmarshaller,
+            format_unmarshallers=self.schema_unmarshallers_factory.format_unmarshallers,
+        )
+
+    def _validate_schema(self, schema, value):
+        # Every validated value is unmarshalled next, and the unmarshalling validates it with the same validator.
+        pass
+
+
+class PolaV30RequestUnmarshaller(CachedSchemaValidatorsMixin, V30RequestUnmarshaller):
+    pass
+
+
+class PolaV30ResponseUnmarshaller(CachedSchemaValidatorsMixin, V30ResponseUnmarshaller):
+    pass
@@ -1,6 +1,10 @@
+import json
+
 from django.core import signing
 from django.core.paginator import InvalidPage, Page, Paginator
 from django.core.signing import BadSignature
+from django.db import connections
+from django.db.models import Q
 
 
 class InvalidPageToken(InvalidPage):
@@ -12,24 +16,118 @@ class TokenizedPage(Page):
         return signing.dumps({"page_num": self.next_page_number()}, compress=True, salt=self.paginator.token_salt)
 
 
+class KeysetPage:
+    def __init__(self, object_list, next_page_token):
+        self.object_list = object_list
+        self._next_page_token = next_page_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._next_page_token is not None
+
+    def next_page_token(self):
+        return self._next_page_token
+
+
 class TokenizedPaginator(Paginator):
-    def __init__(self, *args, token_salt='search', **kwargs):
-        super().__init__(*args, **kwargs)
+    """Paginator with the signed page tokens.
+
+    By default the token carries the page number. With ``ordering`` the pages are paginated by keyset: the token
+    carries the values of the ordering fields of the last item, so next pages do not use ``OFFSET`` and deep pages
+    are as fast as the first one. ``ordering`` must be unique (end with the primary key) and the values of its
+    fields JSON serializable. The page number tokens are accepted in the keyset mode too.
+
+    With ``count_limit``, ``count`` is exact up to ``count_limit``, above that it is the planner estimate. In the
+    keyset mode it is computed for the first page and carried in the token to the next ones.
+    """
+
+    def __init__(self, object_list, per_page, *args, token_salt='search', ordering=None, count_limit=None, **kwargs):
+        if ordering is not None:
+            object_list = object_list.order_by(*ordering)
+        super().__init__(object_list, per_page, *args, **kwargs)
         self.token_salt = token_salt
+        self.ordering = None
+        if ordering is not None:
+            self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.count_limit = count_limit
+        self._count = None
 
     def _get_page(self, *args, **kwargs):
         return TokenizedPage(*args, **kwargs)
 
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self._get_count()
+        return self._count
+
     def get_page_by_token(self, page_token=None):
-        return self.get_page(self._page_token_to_page_num(page_token))
+        if self.ordering is None:
+            return self.get_page(self._page_token_to_page_num(page_token))
+        return self._get_keyset_page(page_token)
 
     def _page_token_to_page_num(self, page_token):
+        return self._load_token(page_token).get('page_num', 1)
+
+    def _get_keyset_page(self, page_token):
+        msg = self._load_token(page_token)
+        qs = self.object_list
+        if 'after' in msg:
+            qs = qs.filter(self._after(msg['after']))
+        elif isinstance(msg.get('page_num'), int) and msg['page_num'] > 1:
+            qs = qs[(msg['page_num'] - 1) * self.per_page :]
+        if 'count' in msg:
+            self._count = msg['count']
+
+        items = list(qs[: self.per_page + 1])
+        next_page_token = None
+        if len(items) > self.per_page:
+            items = items[: self.per_page]
+            after = [getattr(items[-1], field) for field, _ in self.ordering]
+            next_page_token = signing.dumps({'after': after, 'count': self.count}, compress=True, salt=self.token_salt)
+        return KeysetPage(items, next_page_token)
+
+    def _load_token(self, page_token):
         if not page_token:
-            return 1
+            return {}
         try:
             msg = signing.loads(page_token, salt=self.token_salt)
-            if not isinstance(msg, dict):
-                return 1
-            return msg.get('page_num', 1)
         except BadSignature:
             raise InvalidPageToken("Invalid page token")
+        if not isinstance(msg, dict):
+            return {}
+        if 'after' in msg and (self.ordering is None or len(msg['after']) != len(self.ordering)):
+            raise InvalidPageToken("Invalid page token")
+        return msg
+
+    def _after(self, values):
+        # (a, b) > (x, y) is a > x OR (a = x AND b > y), with < for the descending fields.
+        pred = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, values):
+            pred |= equal & Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+            equal &= Q(**{field: value})
+        return pred
+
+    def _get_count(self):
+        if self.count_limit is None:
+            return super().count
+        qs = self.object_list.order_by()
+        count = qs[: self.count_limit + 1].count()
+        if count <= self.count_limit:
+            return count
+        return max(self._estimate_count(qs), count)
+
+    def _estimate_count(self, qs):
+        sql, params = qs.query.sql_with_params()
+        with connections[qs.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,29 @@
+"""Sampling of the validation of the API responses against their schemas.
+
+Validating a response means parsing its body again, so in production only ``SAMPLE_RATE`` of the responses are
+validated. Invalid responses are reported to Sentry and sent to the client anyway, unless ``STRICT`` is set, in
+which case they are replaced with an error. See ``API_RESPONSE_VALIDATION`` in the settings.
+"""
+
+import logging
+import random
+
+import sentry_sdk
+from django.conf import settings
+
+log = logging.getLogger(__file__)
+
+
+def should_validate_response():
+    return random.random() < settings.API_RESPONSE_VALIDATION['SAMPLE_RATE']
+
+
+def is_strict():
+    return settings.API_RESPONSE_VALIDATION['STRICT']
+
+
+def report_invalid_response(request, errors):
+    log.error("Invalid response of %s. %d errors encountered", request.path, len(errors))
+    for error in errors:
+        log.error("%s", error)
+        sentry_sdk.capture_exception(error)
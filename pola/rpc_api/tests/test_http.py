@@ -0,0 +1,69 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import SimpleTestCase, override_settings
+
+from pola.rpc_api import http
+from pola.rpc_api.http import ApiJsonResponse, RawJSON, dumps
+
+
+@override_settings(API_JSON_ENCODER='json')
+class TestDumps(SimpleTestCase):
+    def test_should_decode_to_same_values_as_json_response(self):
+        data = {
+            "name": "Zakłady Mięsne „Łuków”",
+            "plScore": 70,
+            "sources": {"KRS": "https://example.com"},
+            "brands": [{"name": "Ąę", "logotype_url": None}],
+            "price": Decimal("1.50"),
+            "modified": datetime.datetime(2024, 1, 2, 3, 4, 5),
+        }
+
+        self.assertEqual(json.loads(json.dumps(data, cls=DjangoJSONEncoder)), json.loads(dumps(data)))
+
+    def test_should_not_escape_non_ascii_characters(self):
+        self.assertEqual('{"name":"Łuków"}', dumps({"name": "Łuków"}))
+
+    def test_should_splice_raw_json(self):
+        company = RawJSON.encode({"name": "Test", "plScore": 100})
+
+        encoded = dumps({"companies": [company, company], "code": "590"})
+
+        self.assertEqual(
+            '{"companies":[{"name":"Test","plScore":100},{"name":"Test","plScore":100}],"code":"590"}', encoded
+        )
+
+    def test_should_not_splice_strings_looking_like_placeholders(self):
+        data = {"name": "\0abc:0\0", "company": RawJSON('{"name":"Test"}')}
+
+        self.assertEqual(data["name"], json.loads(dumps(data))["name"])
+
+
+@skipIf(http.orjson is None, 'orjson is not installed')
+@override_settings(API_JSON_ENCODER='orjson')
+class TestDumpsWithOrjson(TestDumps):
+    def test_should_use_orjson(self):
+        with mock.patch.object(http.orjson, 'dumps', wraps=http.orjson.dumps) as orjson_dumps:
+            dumps({"name": "Łuków"})
+
+        orjson_dumps.assert_called_once()
+
+    def test_should_fall_back_to_json_without_orjson(self):
+        with mock.patch.object(http, 'orjson', None):
+            self.assertEqual('{"name":"Łuków"}', dumps({"name": "Łuków"}))
+
+
+class TestApiJsonResponse(SimpleTestCase):
+    def test_should_return_json(self):
+        response = ApiJsonResponse({"name": "Łuków"})
+
+        self.assertEqual("application/json", response["Content-Type"])
+        self.assertEqual({"name": "Łuków"}, json.loads(response.content))
+
+    def test_should_reject_non_dict_unless_not_safe(self):
+        with self.assertRaises(TypeError):
+            ApiJsonResponse([1, 2])
+        self.assertEqual(b"[1,2]", ApiJsonResponse([1, 2], safe=False).content)
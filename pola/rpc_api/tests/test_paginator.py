@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.core import signing
+from test_plus import TestCase
+
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+from pola.rpc_api.paginator import InvalidPageToken, TokenizedPaginator
+
+
+class TestKeysetTokenizedPaginator(TestCase):
+    def setUp(self):
+        self.products = [ProductFactory(query_count=i % 3) for i in range(7)]
+
+    def _paginator(self, **kwargs):
+        kwargs.setdefault('ordering', ['-query_count', 'pk'])
+        return TokenizedPaginator(Product.objects.all(), 3, **kwargs)
+
+    def _all_pages(self, paginator):
+        pages, token = [], None
+        while True:
+            page = paginator.get_page_by_token(token)
+            pages.append([p.pk for p in page])
+            if not page.has_next():
+                return pages
+            token = page.next_page_token()
+
+    def test_should_return_all_items_in_order(self):
+        expected = list(Product.objects.order_by('-query_count', 'pk').values_list('pk', flat=True))
+
+        pages = self._all_pages(self._paginator())
+
+        self.assertEqual([expected[0:3], expected[3:6], expected[6:]], pages)
+
+    def test_should_not_count_next_pages(self):
+        paginator = self._paginator()
+        token = paginator.get_page_by_token().next_page_token()
+        self.assertEqual(7, paginator.count)
+
+        paginator = self._paginator()
+        with self.assertNumQueries(1):
+            paginator.get_page_by_token(token)
+            self.assertEqual(7, paginator.count)
+
+    def test_should_estimate_count_above_limit(self):
+        paginator = self._paginator(count_limit=5)
+        with mock.patch.object(TokenizedPaginator, '_estimate_count', return_value=6000) as estimate_count:
+            self.assertEqual(6000, paginator.count)
+        estimate_count.assert_called_once()
+
+    def test_should_count_exactly_up_to_limit(self):
+        paginator = self._paginator(count_limit=7)
+        with mock.patch.object(TokenizedPaginator, '_estimate_count') as estimate_count:
+            self.assertEqual(7, paginator.count)
+        estimate_count.assert_not_called()
+
+    def test_should_estimate_count_with_planner(self):
+        self.assertGreaterEqual(self._paginator(count_limit=2).count, 3)
+
+    def test_should_support_page_num_tokens(self):
+        expected = list(Product.objects.order_by('-query_count', 'pk').values_list('pk', flat=True))
+        token = signing.dumps({"page_num": 2}, compress=True, salt='search')
+
+        page = self._paginator().get_page_by_token(token)
+
+        self.assertEqual(expected[3:6], [p.pk for p in page])
+        self.assertTrue(page.has_next())
+
+    def test_should_reject_invalid_token(self):
+        with self.assertRaises(InvalidPageToken):
+            self._paginator().get_page_by_token('invalid')
+
+    def test_should_reject_token_of_other_ordering(self):
+        token = self._paginator(ordering=['pk']).get_page_by_token().next_page_token()
+
+        with self.assertRaises(InvalidPageToken):
+            self._paginator().get_page_by_token(token)
+
+
+class TestPageNumberTokenizedPaginator(TestCase):
+    def setUp(self):
+        self.products = [ProductFactory() for _ in range(5)]
+
+    def _paginator(self):
+        return TokenizedPaginator(Product.objects.order_by('pk'), 3)
+
+    def test_should_return_pages_by_page_number(self):
+        first_page = self._paginator().get_page_by_token()
+        second_page = self._paginator().get_page_by_token(first_page.next_page_token())
+
+        self.assertEqual(self.products[:3], list(first_page))
+        self.assertEqual(self.products[3:], list(second_page))
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(5, self._paginator().count)
+
+    def test_should_reject_keyset_token(self):
+        token = TokenizedPaginator(Product.objects.all(), 3, ordering=['pk']).get_page_by_token().next_page_token()
+
+        with self.assertRaises(InvalidPageToken):
+            self._paginator().get_page_by_token(token)
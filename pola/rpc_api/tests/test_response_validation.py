@@ -0,0 +1,86 @@
+import inspect
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, override_settings
+from openapi_core import OpenAPI
+from openapi_core.contrib.django.integrations import DjangoIntegration
+from openapi_core.contrib.django.requests import DjangoOpenAPIRequest
+from openapi_core.validation.schemas.factories import SchemaValidatorsFactory
+from test_plus import TestCase
+
+from pola.rpc_api.openapi import PolaDjangoOpenAPIViewDecorator
+
+
+class TestJsonSchemaResponseValidation(TestCase):
+    url = '/a/PrTy9Df7k3hCeRW-raise-exception'
+
+    def test_should_return_500_for_invalid_response_when_strict(self):
+        response = self.client.post(self.url)
+        self.assertEqual(500, response.status_code)
+
+    @override_settings(API_RESPONSE_VALIDATION={'SAMPLE_RATE': 1, 'STRICT': False})
+    @mock.patch('pola.rpc_api.jsonschema.report_invalid_response')
+    def test_should_report_invalid_response(self, mock_report):
+        response = self.client.post(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'invalid': "42"}, response.json())
+        mock_report.assert_called_once()
+
+    @override_settings(API_RESPONSE_VALIDATION={'SAMPLE_RATE': 0, 'STRICT': True})
+    def test_should_not_validate_response_outside_sample(self):
+        response = self.client.post(self.url)
+        self.assertEqual(200, response.status_code)
+
+
+@mock.patch('pola.rpc_api.views_v4.get_by_code_internal', return_value={'invalid': 42})
+class TestOpenApiResponseValidation(TestCase):
+    url = '/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code=123'
+
+    def test_should_reject_invalid_response_when_strict(self, mock_get_by_code_internal):
+        response = self.client.get(self.url)
+        self.assertNotEqual(200, response.status_code)
+
+    @override_settings(API_RESPONSE_VALIDATION={'SAMPLE_RATE': 1, 'STRICT': False})
+    @mock.patch('pola.rpc_api.openapi.report_invalid_response')
+    def test_should_report_invalid_response(self, mock_report, mock_get_by_code_internal):
+        response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        mock_report.assert_called_once()
+
+    @override_settings(API_RESPONSE_VALIDATION={'SAMPLE_RATE': 0, 'STRICT': True})
+    def test_should_still_validate_request_outside_sample(self, mock_get_by_code_internal):
+        response = self.client.get('/a/v4/get_by_code?code=123')
+        self.assertEqual(400, response.status_code)
+
+
+class TestOpenApiValidation(TestCase):
+    def test_should_override_handle_response_of_openapi_core(self):
+        self.assertEqual(
+            list(inspect.signature(DjangoIntegration.handle_response).parameters),
+            list(inspect.signature(PolaDjangoOpenAPIViewDecorator.handle_response).parameters),
+        )
+
+    def test_should_build_schema_validators_once(self):
+        openapi = OpenAPI(settings.OPENAPI.spec, config=settings.OPENAPI.config)
+        request = DjangoOpenAPIRequest(RequestFactory().get('/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code=123'))
+
+        with mock.patch.object(
+            SchemaValidatorsFactory, 'create', autospec=True, side_effect=SchemaValidatorsFactory.create
+        ) as mock_create:
+            self.assertEqual([], openapi.unmarshal_request(request).errors)
+            self.assertEqual(2, mock_create.call_count)
+            mock_create.reset_mock()
+
+            self.assertEqual([], openapi.unmarshal_request(request).errors)
+            mock_create.assert_not_called()
+
+    def test_should_reject_invalid_parameter(self):
+        openapi = OpenAPI(settings.OPENAPI.spec, config=settings.OPENAPI.config)
+        request = DjangoOpenAPIRequest(
+            RequestFactory().get('/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code=123&noai=maybe')
+        )
+
+        self.assertEqual(1, len(openapi.unmarshal_request(request).errors))
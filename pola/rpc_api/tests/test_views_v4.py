@@ -1,19 +1,24 @@
 import json
 import os
 import unittest
+from unittest import mock
 
+import requests
 from django.conf import settings
 from django.core.files.base import ContentFile
 from test_plus import TestCase
 from vcr import VCR
 
+from pola.card_validators import get_card_validator
 from pola.company.factories import BrandFactory, CompanyFactory
 from pola.models import (
     DEFAULT_DONATE_TEXT,
     DEFAULT_DONATE_URL,
     AppConfiguration,
+    Query,
     SearchQuery,
 )
+from pola.product import suggest
 from pola.product.factories import ProductFactory
 from pola.product.models import Product
 from pola.rpc_api.tests.test_views import JsonRequestMixin
@@ -43,6 +48,15 @@ class TestGetByCodeV4(TestCase, JsonRequestMixin):
         )
         self.assertEqual(200, response.status_code)
 
+    @mock.patch("pola.integrations.produkty_w_sieci.sleep")
+    def test_should_return_200_when_produkty_w_sieci_times_out(self, mock_sleep):
+        with self.settings(PRODUKTY_W_SIECI_ENABLE=True, PRODUKTY_W_SIECI_ASYNC_ENABLE=False), mock.patch(
+            "requests.Session.request", side_effect=requests.ConnectTimeout("timed out")
+        ):
+            response = self.json_request(self.url + "?device_id=TEST-DEVICE-ID&code=5900049011829")
+
+        self.assertEqual(200, response.status_code, response.content)
+
     @unittest.skipUnless(
         settings.PRODUKTY_W_SIECI_ENABLE,
         "Runs only when PRODUKTY_W_SIECI_ENABLE is True",
@@ -333,6 +347,121 @@ class TestGetByCodeV4(TestCase, JsonRequestMixin):
         )
 
 
+class TestGetByCodeV4Conditional(TestCase):
+    url = '/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code='
+
+    def setUp(self):
+        self.company = CompanyFactory(name="Test company")
+        self.product = ProductFactory.create(code="5900049011829", company=self.company, brand=None)
+
+    def test_should_return_validators(self):
+        response = self.client.get(self.url + self.product.code)
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["ETag"])
+        self.assertTrue(response["Last-Modified"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_should_return_304_and_record_scan_when_not_modified(self):
+        etag = self.client.get(self.url + self.product.code)["ETag"]
+
+        response = self.client.get(self.url + self.product.code, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(2, Query.objects.filter(product=self.product).count())
+
+    def test_should_return_200_when_company_changed(self):
+        etag = self.client.get(self.url + self.product.code)["ETag"]
+        self.company.description = "Changed"
+        self.company.save()
+
+        response = self.client.get(self.url + self.product.code, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_should_return_200_when_replacement_added(self):
+        etag = self.client.get(self.url + self.product.code)["ETag"]
+        self.product.replacements.add(ProductFactory(code="5900049011836"))
+
+        response = self.client.get(self.url + self.product.code, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()["replacements"]))
+
+    def test_should_return_200_when_brand_deleted(self):
+        brand = BrandFactory(company=self.company)
+        response = self.client.get(self.url + self.product.code)
+        brand.delete()
+
+        response = self.client.get(
+            self.url + self.product.code,
+            HTTP_IF_NONE_MATCH=response["ETag"],
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, len(response.json()["companies"][0]["brands"]))
+
+    def test_should_not_answer_if_modified_since(self):
+        last_modified = self.client.get(self.url + self.product.code)["Last-Modified"]
+
+        response = self.client.get(self.url + self.product.code, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(200, response.status_code)
+
+    def test_should_compute_validator_with_single_query(self):
+        app_configuration = AppConfiguration.get_singleton()
+        with self.assertNumQueries(1):
+            validator = get_card_validator(self.product.code, app_configuration)
+        self.assertEqual(self.product.id, validator.product.id)
+
+    def test_should_not_validate_unknown_product(self):
+        response = self.client.get(self.url + "4000000000001")
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn("ETag", response)
+
+
+class TestGetByCodesV4(TestCase, JsonRequestMixin):
+    url = '/a/v4/get_by_codes'
+
+    def test_should_return_card_for_each_code(self):
+        company = CompanyFactory(common_name="Test company", description="TEST")
+        ProductFactory.create(code="5900049011829", company=company, brand=None)
+
+        response = self.json_request(self.url, data={"device_id": "TEST-DEVICE-ID", "codes": ["5900049011829", "123"]})
+
+        self.assertEqual(200, response.status_code, response.content)
+        products = response.json()["products"]
+        self.assertEqual(["5900049011829", "123"], [p["code"] for p in products])
+        self.assertEqual("Test company", products[0]["companies"][0]["name"])
+        self.assertEqual("Nieprawidłowy kod", products[1]["name"])
+        self.assertIn("donate", products[1])
+
+    def test_should_record_scan_of_each_product(self):
+        p1 = ProductFactory.create(code="5900049011829")
+        p2 = ProductFactory.create(code="5900049011836")
+
+        response = self.json_request(self.url, data={"device_id": "TEST-DEVICE-ID", "codes": [p1.code, p2.code, "123"]})
+
+        self.assertEqual(200, response.status_code, response.content)
+        self.assertEqual(
+            {p1.id, p2.id}, set(Query.objects.filter(client="TEST-DEVICE-ID").values_list('product_id', flat=True))
+        )
+
+    def test_should_return_400_for_too_many_codes(self):
+        response = self.json_request(
+            self.url, data={"device_id": "TEST-DEVICE-ID", "codes": [str(i) for i in range(51)]}
+        )
+        self.assertEqual(400, response.status_code)
+
+    def test_should_return_400_without_codes(self):
+        response = self.json_request(self.url, data={"device_id": "TEST-DEVICE-ID"})
+        self.assertEqual(400, response.status_code)
+
+
 class TestSearchV4(TestCase):
     url = '/a/v4/search'
 
@@ -599,3 +728,62 @@ class TestSearchV4(TestCase):
         response_data = json.loads(response.content)
         self.assertEqual(1, len(response_data['products']))
         self.assertEqual(11, response_data['totalItems'])
+
+    def test_should_find_products_by_company_name_without_diacritics(self):
+        p1 = ProductFactory(name="baton", company__common_name="Łódzkie Zakłady Cukiernicze")
+        ProductFactory(name="ser")
+
+        response = self.client.get(f"{self.url}?query=lodzkie zaklady", content_type="application/json")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([p1.code], [p['code'] for p in json.loads(response.content)['products']])
+
+    def test_should_rank_popular_products_first(self):
+        p1 = ProductFactory(name="baton", query_count=0)
+        p2 = ProductFactory(name="baton", query_count=1000)
+
+        response = self.client.get(f"{self.url}?query=baton", content_type="application/json")
+
+        self.assertEqual([p2.code, p1.code], [p['code'] for p in json.loads(response.content)['products']])
+
+    def test_should_rank_better_matches_first(self):
+        p1 = ProductFactory(name="czekolada mleczna z batonem")
+        p2 = ProductFactory(name="baton")
+
+        response = self.client.get(f"{self.url}?query=baton", content_type="application/json")
+
+        self.assertEqual([p2.code, p1.code], [p['code'] for p in json.loads(response.content)['products']])
+
+
+class TestSuggestV4(TestCase):
+    url = '/a/v4/suggest'
+
+    def setUp(self):
+        self.suggester = suggest.Suggester()
+        patcher = mock.patch.object(suggest, 'suggester', self.suggester)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_should_return_completions(self):
+        ProductFactory(name="Mleko kozie", query_count=5, company=None, brand=None)
+        BrandFactory(name="Mlekovita", common_name=None)
+        self.suggester.refresh()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{self.url}?query=mle&limit=1", content_type="application/json")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {'suggestions': [{'type': 'product', 'text': 'Mleko kozie'}]},
+            json.loads(response.content),
+        )
+
+    def test_should_return_empty_list_before_index_is_built(self):
+        with mock.patch.object(suggest.Suggester, '_refresh_in_background_if_stale'):
+            response = self.client.get(f"{self.url}?query=mle", content_type="application/json")
+
+        self.assertEqual({'suggestions': []}, json.loads(response.content))
+
+    def test_should_reject_too_big_limit(self):
+        response = self.client.get(f"{self.url}?query=mle&limit=100", content_type="application/json")
+        self.assertEqual(400, response.status_code)
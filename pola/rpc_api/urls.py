@@ -6,7 +6,9 @@ from pola.social.views import SubscribeNewsletterFormView
 urlpatterns = [
     # API v4
     path(route='v4/get_by_code', view=views_v4.get_by_code_v4, name="get_by_code_v4"),
+    path(route='v4/get_by_codes', view=views_v4.get_by_codes_v4, name="get_by_codes_v4"),
     path(route='v4/search', view=views_v4.SearchV4ApiView.as_view(), name="search_v4"),
+    path(route='v4/suggest', view=views_v4.suggest_v4, name="suggest_v4"),
     re_path(route=r'v4/create_report$', view=views_v3.create_report_v3, name="create_report_v4"),
     re_path(route=r'v4/update_report$', view=views_v2.update_report_v2, name="update_report_v4"),
     path(route='v4/subscribe_newsletter', view=SubscribeNewsletterFormView.as_view(), name="subscribe_newsletter_v4"),
@@ -1,7 +1,7 @@
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django_ratelimit.decorators import ratelimit
 
+from pola.rpc_api.http import ApiJsonResponse
 from pola.rpc_api.jsonschema import validate_json_response
 from pola.rpc_api.rates import whitelist
 
@@ -18,4 +18,4 @@ from pola.rpc_api.rates import whitelist
 )
 def raise_exception(request):
     del request
-    return JsonResponse({'invalid': "42"})
+    return ApiJsonResponse({'invalid': "42"})
@@ -1,10 +1,11 @@
 import json
 
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 from django_ratelimit.decorators import ratelimit
 
 from pola.report.models import Report
+from pola.rpc_api.http import ApiJsonResponse
 from pola.rpc_api.jsonschema import validate_json_response
 from pola.rpc_api.rates import whitelist
 from pola.rpc_api.views_v3 import attach_file_internal, create_report_internal
@@ -73,7 +74,7 @@ from pola.rpc_api.views_v4 import get_by_code_internal
 def get_by_code_v2(request):
     result = get_by_code_internal(request)
 
-    return JsonResponse(result)
+    return ApiJsonResponse(result)
 
 
 @csrf_exempt
@@ -115,7 +116,7 @@ def update_report_v2(request):
     report.description = description
     report.save()
 
-    return JsonResponse({'id': report.id})
+    return ApiJsonResponse({'id': report.id})
 
 
 @csrf_exempt
@@ -143,4 +144,4 @@ def attach_file_v2(request):
 
     signed_request = attach_file_internal(report, file_ext, mime_type)
 
-    return JsonResponse({'signed_request': [signed_request]})
+    return ApiJsonResponse({'signed_request': [signed_request]})
@@ -5,13 +5,14 @@ from datetime import timedelta
 import boto3
 from botocore.config import Config
 from django.conf import settings
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 from django_ratelimit.decorators import ratelimit
 
 from pola.ai_pics.models import AIAttachment, AIPics
 from pola.product.models import Product
 from pola.report.models import Attachment, Report
+from pola.rpc_api.http import ApiJsonResponse
 from pola.rpc_api.jsonschema import validate_json_response
 from pola.rpc_api.rates import whitelist
 from pola.rpc_api.views_v4 import get_by_code_internal
@@ -71,7 +72,7 @@ def add_ai_pics(request):
 
     product.increment_ai_pics_count()
 
-    return JsonResponse({'signed_requests': signed_requests})
+    return ApiJsonResponse({'signed_requests': signed_requests})
 
 
 def attach_pic_internal(ai_pics, file_no, file_ext, mime_type):
@@ -150,7 +151,7 @@ def get_by_code_v3(request):
     noai = request.GET.get('noai')
     result = get_by_code_internal(request, ai_supported=noai is None)
 
-    response = JsonResponse(result)
+    response = ApiJsonResponse(result)
     response["Access-Control-Allow-Origin"] = "*"
 
     return response
@@ -195,7 +196,7 @@ def create_report_internal(request, extra_comma=False):
             signed_request = attach_file_internal(report, file_ext, mime_type)
             signed_requests.append(signed_request)
 
-    return JsonResponse({'id': report.id, 'signed_requests': signed_requests})
+    return ApiJsonResponse({'id': report.id, 'signed_requests': signed_requests})
 
 
 def attach_file_internal(report, file_ext, mime_type):
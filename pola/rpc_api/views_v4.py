@@ -1,15 +1,19 @@
+import json
+
 from django.core.paginator import InvalidPage
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django_ratelimit.decorators import ratelimit
 
-from pola import logic, logic_ai
-from pola.models import AppConfiguration, Query, SearchQuery
-from pola.product.models import Product
+from pola import event_buffer, logic, logic_ai, scan_cache
+from pola.models import AppConfiguration
+from pola.product import search, search_cache, suggest
 from pola.rpc_api.api_models import SearchResult, SearchResultCollection
-from pola.rpc_api.http import JsonProblemResponse
+from pola.rpc_api.http import ApiJsonResponse, JsonProblemResponse
 from pola.rpc_api.openapi import validate_pola_openapi_spec
 from pola.rpc_api.paginator import TokenizedPaginator
 from pola.rpc_api.rates import whitelist
@@ -18,27 +22,50 @@ from pola.rpc_api.rates import whitelist
 @ratelimit(key='ip', rate=whitelist('2/s'), block=True)
 @validate_pola_openapi_spec
 def get_by_code_v4(request):
+    validator = None
+    if request.method in ('GET', 'HEAD'):
+        validator = scan_cache.get_card_validator(request.GET['code'], AppConfiguration.get_cached_singleton())
+    if validator is not None:
+        # Only the ETag: deleting a brand or a replacement changes the card, but not Last-Modified.
+        response = get_conditional_response(request, etag=validator.etag)
+        if response is not None:
+            if response.status_code == 304:
+                # The client already has the card, but it is still a scan.
+                event_buffer.record_query(client=request.GET['device_id'], product=validator.product, **validator.stats)
+            add_validator_headers(response, validator)
+            response["Access-Control-Allow-Origin"] = "*"
+            return response
+
     noai = request.GET.get('noai')
     result = get_by_code_internal(
         request, ai_supported=noai is None, multiple_company_supported=True, report_as_object=True
     )
 
-    response = JsonResponse(result)
+    response = ApiJsonResponse(result)
+    if validator is not None:
+        add_validator_headers(response, validator)
     response["Access-Control-Allow-Origin"] = "*"
 
     return response
 
 
+def add_validator_headers(response, validator):
+    response["ETag"] = validator.etag
+    response["Last-Modified"] = http_date(validator.last_modified.timestamp())
+    # Caches have to revalidate the card on each scan, so the scans are counted.
+    patch_cache_control(response, no_cache=True)
+
+
 def get_by_code_internal(request, ai_supported=False, multiple_company_supported=False, report_as_object=False):
     code = request.GET['code']
     device_id = request.GET['device_id']
 
-    result, stats, product = logic.get_result_from_code(
+    result, stats, product = scan_cache.get_result_from_code(
         code, multiple_company_supported=multiple_company_supported, report_as_object=report_as_object
     )
 
     if product is not None:
-        Query.objects.create(
+        event_buffer.record_query(
             client=device_id,
             product=product,
             was_verified=stats['was_verified'],
@@ -46,51 +73,90 @@ def get_by_code_internal(request, ai_supported=False, multiple_company_supported
             was_plScore=stats['was_plScore'],
         )
 
-    if product:
-        product.increment_query_count()
-        if product.company:
-            product.company.increment_query_count()
-
     if ai_supported:
         result = logic_ai.add_ask_for_pics(product, result)
 
-    app_configuration = AppConfiguration.get_singleton()
+    add_donate(result, AppConfiguration.get_cached_singleton())
+    return result
+
+
+def add_donate(result, app_configuration):
     result["donate"] = {
         "show_button": True,
         "title": app_configuration.donate_text,
         "url": app_configuration.donate_url,
     }
-    return result
+
+
+@csrf_exempt
+@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@validate_pola_openapi_spec
+def get_by_codes_v4(request):
+    """Resolves up to 50 codes in one request, e.g. the scans made by the app while offline."""
+    data = json.loads(request.body)
+    items = logic.get_results_from_codes(data['codes'], multiple_company_supported=True, report_as_object=True)
+
+    event_buffer.record_queries(
+        client=data['device_id'], scans=[(product, stats) for _, stats, product in items if product is not None]
+    )
+
+    app_configuration = AppConfiguration.get_cached_singleton()
+    results = []
+    for result, _, _ in items:
+        add_donate(result, app_configuration)
+        results.append(result)
+
+    response = ApiJsonResponse({'products': results})
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
 
 
 class SearchV4ApiView(View):
     PAGE_SIZE = 10
+    # Above this number of results totalItems is the planner estimate.
+    COUNT_LIMIT = 1000
 
     @method_decorator(ratelimit(key='ip', rate=whitelist('2/s'), block=True))
     @method_decorator(validate_pola_openapi_spec)
     def get(self, request):
         query = request.GET['query']
-        qs = self.get_queryset(query)
-        paginator = TokenizedPaginator(qs.all(), self.PAGE_SIZE, token_salt=self.__class__.__name__)
         page_token = request.GET.get('pageToken')
         if page_token is None:
-            SearchQuery(client=request.GET.get('device_id'), text=query).save()
+            event_buffer.record_search_query(client=request.GET.get('device_id'), text=query)
         try:
-            page = paginator.get_page_by_token(page_token)
+            data = search_cache.get_or_compute(query, page_token, lambda: self.get_results(query, page_token))
         except InvalidPage as e:
             return JsonProblemResponse(status=400, title="Invalid value of pageToken parameter", detail=str(e))
-
-        return JsonResponse(
-            SearchResultCollection(
-                nextPageToken=page.next_page_token() if page.has_next() else None,
-                products=[SearchResult.create_from_product(p) for p in page],
-                totalItems=paginator.count,
-            )
+        return ApiJsonResponse(data)
+
+    def get_results(self, query, page_token):
+        paginator = TokenizedPaginator(
+            self.get_queryset(query),
+            self.PAGE_SIZE,
+            ordering=search.ORDERING,
+            token_salt=self.__class__.__name__,
+            count_limit=self.COUNT_LIMIT,
+        )
+        page = paginator.get_page_by_token(page_token)
+        return SearchResultCollection(
+            nextPageToken=page.next_page_token() if page.has_next() else None,
+            products=[SearchResult.create_from_product(p) for p in page],
+            totalItems=paginator.count,
         )
 
     def get_queryset(self, query):
-        pred = Q(name__icontains=query)
-        if len(query) in (13, 9) and query.isnumeric():
-            pred = pred | Q(code=query)
-        qs = Product.objects.filter(pred).order_by('pk')
-        return qs
+        return search.search_products(query).select_related('company', 'brand')
+
+
+# The suggestions are served from memory, the request does not need a transaction.
+@transaction.non_atomic_requests
+@ratelimit(key='ip', rate=whitelist('10/s'), block=True)
+@validate_pola_openapi_spec
+def suggest_v4(request):
+    limit = int(request.GET.get('limit', 10))
+    suggestions = suggest.suggester.suggest(request.GET['query'], limit)
+    response = ApiJsonResponse(
+        {'suggestions': [{'type': suggestion_type, 'text': text} for suggestion_type, text in suggestions]}
+    )
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
@@ -1,7 +1,12 @@
 import os
+from datetime import timedelta
 
+import django
 import redis
 from rq import Connection, Queue, Worker
+from rq.job import Job
+from rq.registry import clean_registries
+from rq.utils import import_attribute
 
 listen = ['high', 'default', 'low']
 
@@ -9,7 +14,50 @@ redis_url = os.getenv('REDISTOGO_URL', 'redis://localhost:6379')
 
 conn = redis.from_url(redis_url)
 
+
+def run_periodically(func_name, queue_name, interval):
+    """Job which calls ``func_name`` and enqueues itself again ``interval`` seconds after the call ends.
+
+    The next run is enqueued even if the call fails. The scheduler of the worker moves it to the queue.
+    """
+    try:
+        import_attribute(func_name)()
+    finally:
+        _enqueue_periodically(func_name, queue_name, interval)
+
+
+def _enqueue_periodically(func_name, queue_name, interval):
+    queue = Queue(queue_name, connection=conn)
+    return queue.enqueue_in(timedelta(seconds=interval), run_periodically, func_name, queue_name, interval)
+
+
+def schedule_periodically(func_name, queue_name, interval):
+    """Starts running ``func_name`` every ``interval`` seconds, unless it is already queued, scheduled or running.
+
+    Called when the worker starts, so a run lost with a killed worker is scheduled again. Returns the job or
+    ``None``.
+    """
+    queue = Queue(queue_name, connection=conn)
+    clean_registries(queue)
+    job_ids = (
+        queue.get_job_ids() + queue.scheduled_job_registry.get_job_ids() + queue.started_job_registry.get_job_ids()
+    )
+    for job in Job.fetch_many(job_ids, connection=conn):
+        if job is not None and job.func_name == f'{__name__}.run_periodically' and job.args[0] == func_name:
+            return None
+    return _enqueue_periodically(func_name, queue_name, interval)
+
+
 if __name__ == '__main__':
+    # Jobs like pola.logic_produkty_w_sieci.enrich_product use the ORM.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pola.config.settings.production")
+    django.setup()
+    # Imported after the setup, the modules use the models.
+    from pola import stats_rollup, work_queue
+
+    stats_rollup.schedule_periodic_update()
+    work_queue.schedule_periodic_refresh()
     with Connection(conn):
         worker = Worker(map(Queue, listen))
-        worker.work()
+        # The scheduler moves the jobs enqueued with enqueue_in to their queues.
+        worker.work(with_scheduler=True)
@@ -0,0 +1,207 @@
+"""Cache of finished scan results keyed by product code.
+
+The entries are invalidated by model signals (see ``pola.models``), so a popular code is served without touching
+the database until a product, company, brand or replacement it depends on changes. The validators of the v4 cards
+(see ``pola.card_validators``) are cached with the results.
+
+The companies and the replacements of a cached result are encoded to JSON once, when the result is cached, and are
+served as :class:`pola.rpc_api.http.RawJSON`.
+"""
+
+import copy
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from pola import card_validators, logic
+from pola.logic_produkty_w_sieci import is_code_supported
+from pola.product.models import Product
+from pola.rpc_api.http import RawJSON
+
+KEY_PREFIX = 'scan_result'
+STATS_KEY_PREFIX = 'scan_result_stats'
+STATS_FLUSH_EVERY = 100
+INVALIDATION_CHUNK_SIZE = 1000
+
+# (multiple_company_supported, report_as_object) pairs used by the API views.
+VARIANTS = ((False, False), (False, True), (True, False), (True, True))
+# Values of the cached results kept encoded.
+ENCODED_KEYS = ('companies', 'replacements')
+
+
+def get_cache():
+    return caches[settings.SCAN_RESULT_CACHE['CACHE_ALIAS']]
+
+
+def make_key(code, multiple_company_supported=False, report_as_object=False):
+    return f'{KEY_PREFIX}:{code}:{int(multiple_company_supported)}{int(report_as_object)}'
+
+
+def make_validator_key(code):
+    return f'{KEY_PREFIX}:{code}:validator'
+
+
+class HitCounter:
+    """Counts hits and misses locally and periodically adds them to shared counters in the cache."""
+
+    def __init__(self, flush_every=STATS_FLUSH_EVERY):
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            should_flush = self.hits + self.misses >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending = {'hits': self.hits, 'misses': self.misses}
+            self.hits = 0
+            self.misses = 0
+        cache = get_cache()
+        for name, value in pending.items():
+            if not value:
+                continue
+            key = f'{STATS_KEY_PREFIX}:{name}'
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, value)
+
+
+hit_counter = HitCounter()
+
+
+def get_stats():
+    hit_counter.flush()
+    values = get_cache().get_many([f'{STATS_KEY_PREFIX}:hits', f'{STATS_KEY_PREFIX}:misses'])
+    hits = values.get(f'{STATS_KEY_PREFIX}:hits', 0)
+    misses = values.get(f'{STATS_KEY_PREFIX}:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else None}
+
+
+def reset_stats():
+    hit_counter.flush()
+    get_cache().delete_many([f'{STATS_KEY_PREFIX}:hits', f'{STATS_KEY_PREFIX}:misses'])
+
+
+def is_cacheable(code, product):
+    if product is None:
+        return False
+    if product.company_id:
+        return True
+    # Products without a company are enriched from Produkty w Sieci on every scan, so they cannot be cached.
+    return not (is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE)
+
+
+def get_result_from_code(code, multiple_company_supported=False, report_as_object=False):
+    """Cached version of :func:`pola.logic.get_result_from_code`.
+
+    Returns the same ``(result, stats, product)`` tuple. The result is a fresh copy on each call, so callers may
+    modify it. The values of ``ENCODED_KEYS`` of the cached results are :class:`pola.rpc_api.http.RawJSON`.
+    """
+    if not settings.SCAN_RESULT_CACHE_ENABLE:
+        return logic.get_result_from_code(
+            code, multiple_company_supported=multiple_company_supported, report_as_object=report_as_object
+        )
+
+    cache = get_cache()
+    key = make_key(code, multiple_company_supported, report_as_object)
+    entry = cache.get(key)
+    if entry is not None:
+        hit_counter.record(hit=True)
+        return entry
+
+    hit_counter.record(hit=False)
+    result, stats, product = logic.get_result_from_code(
+        code, multiple_company_supported=multiple_company_supported, report_as_object=report_as_object
+    )
+    if is_cacheable(code, product):
+        # Snapshot now, the caller is free to modify the result. The entry is stored only when the transaction
+        # commits, so data created by a rolled back request never reaches the cache.
+        entry = copy.deepcopy((_encode_values(result), stats, product))
+        timeout = settings.SCAN_RESULT_CACHE['TIMEOUT']
+        transaction.on_commit(lambda: cache.set(key, entry, timeout))
+    return result, stats, product
+
+
+def _encode_values(result):
+    return {key: RawJSON.encode(value) if key in ENCODED_KEYS else value for key, value in result.items()}
+
+
+def get_card_validator(code, app_configuration):
+    """Cached version of :func:`pola.card_validators.get_card_validator`."""
+    if not settings.SCAN_RESULT_CACHE_ENABLE:
+        return card_validators.get_card_validator(code, app_configuration)
+
+    cache = get_cache()
+    key = make_validator_key(code)
+    validator = cache.get(key)
+    if validator is None:
+        validator = card_validators.get_product_validator(code)
+        if validator is None:
+            return None
+        timeout = settings.SCAN_RESULT_CACHE['TIMEOUT']
+        transaction.on_commit(lambda: cache.set(key, validator, timeout))
+    return card_validators.with_app_configuration(validator, app_configuration)
+
+
+def invalidate_codes(codes):
+    keys = [
+        key
+        for code in set(codes)
+        if code
+        for key in (make_validator_key(code), *(make_key(code, *variant) for variant in VARIANTS))
+    ]
+    if not keys:
+        return
+    cache = get_cache()
+
+    def delete_keys():
+        for i in range(0, len(keys), INVALIDATION_CHUNK_SIZE):
+            cache.delete_many(keys[i : i + INVALIDATION_CHUNK_SIZE])
+
+    delete_keys()
+    # Repeat after commit, in case a concurrent request cached the old state in the meantime.
+    transaction.on_commit(delete_keys)
+
+
+def _codes(queryset):
+    return list(queryset.values_list('code', flat=True).distinct())
+
+
+def codes_for_product(product):
+    """Codes whose scan result shows the product - the product itself and the products it replaces."""
+    return [product.code, *_codes(Product.objects.filter(replacements=product))]
+
+
+def codes_for_company(company_id):
+    return _codes(
+        Product.objects.filter(
+            Q(company_id=company_id)
+            | Q(brand__company_id=company_id)
+            | Q(replacements__company_id=company_id)
+            | Q(replacements__brand__company_id=company_id)
+        )
+    )
+
+
+def codes_for_brand(brand_id, company_id):
+    pred = Q(brand_id=brand_id) | Q(replacements__brand_id=brand_id)
+    if company_id:
+        # Companies list their brands in the description.
+        pred |= Q(company_id=company_id) | Q(brand__company_id=company_id)
+    return _codes(Product.objects.filter(pred))
+
+
+def invalidate_company(company_id):
+    invalidate_codes(codes_for_company(company_id))
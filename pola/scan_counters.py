@@ -0,0 +1,69 @@
+"""Scan counters of products and companies.
+
+Instead of updating ``query_count`` of the same hot rows on every scan, the deltas are accumulated in memory and
+folded into the table with a single ``UPDATE`` per flush.
+
+The deltas are collected from the buffered ``Query`` events (see ``pola.event_buffer``) and folded in the same
+transaction in which the events are inserted, so ``query_count`` always matches the rows in ``pola_query`` that
+``recalculate_query_count`` counts.
+"""
+
+import threading
+from collections import Counter
+
+from pola.company.models import Company
+from pola.product.models import Product
+
+
+class DeltaCounter:
+    """Accumulates ``query_count`` deltas of a model keyed by primary key.
+
+    ``key`` maps an event to the primary key of the counted row or ``None`` if the event does not count.
+    """
+
+    def __init__(self, model, key, field='query_count'):
+        self.model = model
+        self.key = key
+        self.field = field
+        self._deltas = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def add(self, event):
+        pk = self.key(event)
+        if pk is None:
+            return
+        with self._lock:
+            self._deltas[pk] += 1
+
+    def drain(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, Counter()
+        return deltas
+
+    def fold(self, deltas, connection):
+        if not deltas:
+            return
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        pk = connection.ops.quote_name(self.model._meta.pk.column)
+        field = connection.ops.quote_name(self.field)
+        # The rows are locked in the order of the primary keys, so concurrent folds of the workers do not deadlock.
+        ids = sorted(deltas)
+        values = ', '.join(['(%s, %s)'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {pk} FROM {table} WHERE {pk} = ANY(%s) ORDER BY {pk} FOR UPDATE', [ids])
+            cursor.execute(
+                f'UPDATE {table} SET {field} = {table}.{field} + d.delta '
+                f'FROM (VALUES {values}) AS d(id, delta) WHERE {table}.{pk} = d.id',
+                [v for pk_value in ids for v in (pk_value, deltas[pk_value])],
+            )
+
+
+def _company_id(query):
+    return query.product.company_id if query.product_id else None
+
+
+product_query_counts = DeltaCounter(Product, key=lambda query: query.product_id)
+company_query_counts = DeltaCounter(Company, key=_company_id)
@@ -0,0 +1,41 @@
+"""Single-flight locks shared by the workers through the cache."""
+
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+KEY_PREFIX = 'single_flight'
+POLL_INTERVAL = 0.1
+
+
+class SingleFlightTimeout(Exception):
+    """Raised to the callers which did not see the lock released within ``wait`` seconds."""
+
+
+@contextmanager
+def single_flight(cache, key, timeout, wait):
+    """Lets only one caller at a time run the block for the key.
+
+    Yields ``True`` to the caller holding the lock. The other callers wait until the lock is released and get
+    ``False``, so they can reuse the result of the holder. If the lock is not released within ``wait`` seconds,
+    :class:`SingleFlightTimeout` is raised, as the result of the holder is not there yet. The lock is released when
+    the current transaction commits, so the result is visible to the waiting callers. ``timeout`` bounds the lock
+    lifetime in case the holder dies or its transaction is rolled back.
+    """
+    lock_key = f'{KEY_PREFIX}:{key}'
+    if cache.add(lock_key, True, timeout):
+        try:
+            yield True
+        except BaseException:
+            cache.delete(lock_key)
+            raise
+        transaction.on_commit(lambda: cache.delete(lock_key))
+        return
+
+    deadline = time.monotonic() + wait
+    while cache.get(lock_key) is not None:
+        if time.monotonic() >= deadline:
+            raise SingleFlightTimeout(key)
+        time.sleep(POLL_INTERVAL)
+    yield False
@@ -0,0 +1,115 @@
+"""Daily rollups of the statistics shown on the CMS stats page.
+
+Each day has a :class:`pola.models.Stats` row. The ``update_stats`` job keeps the rows of the last ``DAYS`` days up
+to date. The RQ worker runs it every ``INTERVAL`` seconds (see :func:`schedule_periodic_update`), it can also be run
+by the ``update_stats`` command or enqueued with :func:`schedule_update`:
+
+* the rows of the days which are still being counted - today, and the previous days until ``FINALIZE_DELAY``
+  passes after their end - are updated incrementally, with only the scans newer than ``Stats.counted_until``. The
+  scans of the last ``OVERLAP`` seconds are left for the next update, so the scans buffered (see
+  ``pola.event_buffer``) or committed a bit later than their timestamp are not skipped,
+* a day is calculated once more from scratch, in a single scan of its rows, after ``FINALIZE_DELAY`` passes, which
+  also counts the scans committed after the incremental updates. After that the row is finished and never
+  calculated again, so it outlives the archived scans (see ``pola.event_archive``).
+
+The stats page reads the rows. It calculates the rows which are missing, or were not updated for two intervals,
+e.g. when the worker is not running, with :func:`get_stats`.
+"""
+
+import logging
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rq import Queue
+
+from pola.models import Stats
+from pola.rq_worker import conn, schedule_periodically
+
+LOGGER = logging.getLogger(__file__)
+
+
+def get_days(days, now=None):
+    """Returns the last ``days`` days in the default timezone, today first."""
+    today = timezone.localdate(now or timezone.now())
+    return [today - timedelta(days=i) for i in range(days)]
+
+
+def update_day(date, now=None):
+    """Updates the row of the day, unless it is finished. Returns the row."""
+    now = now or timezone.now()
+    delay = timedelta(seconds=settings.STATS_ROLLUP['FINALIZE_DELAY'])
+    with transaction.atomic():
+        stat = Stats.objects.select_for_update().filter(year=date.year, month=date.month, day=date.day).first()
+        if stat is not None and stat.is_finished(delay):
+            return stat
+
+        if now >= Stats.get_bounds(date.year, date.month, date.day)[1] + delay:
+            stat = stat or Stats()
+            stat.calculate(date.year, date.month, date.day)
+            stat.save()
+            stat.clients.all().delete()
+            return stat
+
+        if stat is None or stat.counted_until is None:
+            # Rows calculated from scratch before the end of the day are counted again.
+            stat = Stats.empty(date.year, date.month, date.day) if stat is None else _reset(stat)
+            stat.save()
+        stat.add_new_queries(until=now - timedelta(seconds=settings.STATS_ROLLUP['OVERLAP']), now=now)
+        stat.save()
+        return stat
+
+
+def _reset(stat):
+    empty = Stats.empty(stat.year, stat.month, stat.day)
+    for field in Stats.QUERY_COUNTS + Stats.NEW_OBJECT_COUNTS + ('no_of_clients',):
+        setattr(stat, field, getattr(empty, field))
+    stat.clients.all().delete()
+    return stat
+
+
+def get_stats(days, now=None):
+    """Returns the rows of the last ``days`` days, today first.
+
+    The rows which are missing, or are still being counted and were not updated for two ``INTERVAL``, are updated
+    first.
+    """
+    now = now or timezone.now()
+    dates = get_days(days, now=now)
+    delay = timedelta(seconds=settings.STATS_ROLLUP['FINALIZE_DELAY'])
+    stale = now - 2 * timedelta(seconds=settings.STATS_ROLLUP['INTERVAL'])
+    rows = {
+        (stat.year, stat.month, stat.day): stat
+        for stat in Stats.objects.filter(
+            reduce(or_, (Q(year=date.year, month=date.month, day=date.day) for date in dates))
+        )
+    }
+    stats = []
+    for date in dates:
+        stat = rows.get((date.year, date.month, date.day))
+        if stat is None or (not stat.is_finished(delay) and stat.calculated_at < stale):
+            stat = update_day(date, now=now)
+        stats.append(stat)
+    return stats
+
+
+def update_stats(days=None):
+    """Updates the rows of the last ``days`` days, the RQ job scheduled by :func:`schedule_update`."""
+    for date in get_days(days or settings.STATS_ROLLUP['DAYS']):
+        stat = update_day(date)
+        LOGGER.debug('Updated the stats of %s: %d queries', date, stat.no_of_queries)
+
+
+def schedule_update(days=None):
+    return Queue(settings.STATS_ROLLUP['QUEUE'], connection=conn).enqueue(update_stats, days)
+
+
+def schedule_periodic_update():
+    """Starts running :func:`update_stats` on the RQ worker every ``INTERVAL`` seconds, see: pola.rq_worker"""
+    return schedule_periodically(
+        f'{__name__}.update_stats', settings.STATS_ROLLUP['QUEUE'], settings.STATS_ROLLUP['INTERVAL']
+    )
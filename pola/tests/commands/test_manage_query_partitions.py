@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.db import connection
+from test_plus import TestCase
+
+from pola import query_partitions
+from pola.models import Query
+from pola.product.factories import ProductFactory
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def _count(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {table}')
+        return cursor.fetchone()[0]
+
+
+def _exists(table):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [table])
+        return cursor.fetchone()[0] is not None
+
+
+class ManageQueryPartitionsTestCase(TestCase):
+    def _query(self, timestamp):
+        query = Query.objects.create(product=ProductFactory())
+        Query.objects.filter(pk=query.pk).update(timestamp=timestamp)
+        return query
+
+    def test_run_command(self):
+        call_command('manage_query_partitions', '--months-ahead=2', '--retention-months=1200')
+
+        # The months up to the end of the next one are in pola_query_legacy of the test database.
+        current_month = query_partitions.month_start(datetime.now(timezone.utc))
+        self.assertIn(query_partitions.add_months(current_month, 2), query_partitions.get_partitions())
+
+    def test_should_create_monthly_partitions(self):
+        created = query_partitions.ensure_partitions(1, now=_utc(2100, 1, 15))
+
+        self.assertEqual(['pola_query_y2100m01', 'pola_query_y2100m02'], created)
+        self._query(_utc(2100, 1, 31, 23, 59))
+        self.assertEqual(1, _count('pola_query_y2100m01'))
+        self.assertEqual(0, _count('pola_query_y2100m02'))
+
+    def test_should_prune_partitions_of_time_bounded_queries(self):
+        query_partitions.ensure_partitions(1, now=_utc(2100, 1, 15))
+
+        plan = Query.objects.filter(timestamp__gte=_utc(2100, 1, 1), timestamp__lt=_utc(2100, 2, 1)).explain()
+
+        self.assertIn('pola_query_y2100m01', plan)
+        self.assertNotIn('pola_query_y2100m02', plan)
+        self.assertNotIn('pola_query_legacy', plan)
+
+    def test_should_move_rows_from_default_partition(self):
+        query = self._query(_utc(2200, 3, 10))
+        self.assertEqual(1, _count('pola_query_default'))
+
+        query_partitions.create_partition(_utc(2200, 3, 1))
+
+        self.assertEqual(0, _count('pola_query_default'))
+        self.assertEqual(1, _count('pola_query_y2200m03'))
+        self.assertTrue(Query.objects.filter(pk=query.pk).exists())
+
+    def test_should_detach_expired_partitions(self):
+        query_partitions.ensure_partitions(1, now=_utc(2100, 1, 15))
+
+        expired = query_partitions.expire_partitions(1, now=_utc(2100, 3, 5))
+
+        # The months of pola_query_legacy of the test database end long before.
+        self.assertEqual(['pola_query_legacy', 'pola_query_y2100m01'], expired)
+        self.assertNotIn(_utc(2100, 1, 1), query_partitions.get_partitions())
+        self.assertTrue(_exists('pola_query_y2100m01'))
+
+    def test_should_drop_expired_partitions(self):
+        query_partitions.ensure_partitions(0, now=_utc(2100, 1, 15))
+
+        query_partitions.expire_partitions(1, drop=True, now=_utc(2100, 3, 5))
+
+        self.assertFalse(_exists('pola_query_y2100m01'))
+
+    def test_should_delete_expired_rows_of_legacy_partition(self):
+        expired = self._query(_utc(2000, 1, 15))
+        kept = self._query(_utc(2000, 3, 10))
+
+        self.assertEqual(1, query_partitions.prune_legacy_partition(1, now=_utc(2000, 3, 5)))
+
+        self.assertFalse(Query.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(Query.objects.filter(pk=kept.pk).exists())
+
+    def test_should_delete_legacy_rows_in_batches(self):
+        self._query(_utc(2000, 1, 15))
+        self._query(_utc(2000, 1, 20))
+        self._query(_utc(2000, 2, 10))
+
+        self.assertEqual(2, query_partitions.delete_legacy_rows(_utc(2000, 1, 1), _utc(2000, 2, 1), batch_size=1))
+        self.assertEqual(1, _count('pola_query_legacy'))
+
+    def test_should_expire_legacy_partition_after_its_last_month(self):
+        expired = query_partitions.expire_partitions(1, now=_utc(2100, 3, 5))
+
+        self.assertEqual(['pola_query_legacy'], expired)
+        self.assertIsNone(query_partitions.get_legacy_end())
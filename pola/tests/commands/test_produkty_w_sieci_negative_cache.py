@@ -0,0 +1,40 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from test_plus import TestCase
+
+from pola.logic_produkty_w_sieci import (
+    NEGATIVE_NOT_FOUND,
+    get_negative_entry,
+    remember_negative_result,
+)
+
+TEST_EAN13 = "5900084231145"
+OTHER_EAN13 = "5900084231146"
+
+
+class ProduktyWSieciNegativeCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        remember_negative_result(TEST_EAN13, NEGATIVE_NOT_FOUND)
+        remember_negative_result(OTHER_EAN13, NEGATIVE_NOT_FOUND)
+
+    def test_show(self):
+        out = StringIO()
+        call_command('produkty_w_sieci_negative_cache', 'show', TEST_EAN13, "5900000000000", stdout=out)
+
+        self.assertIn(f'{TEST_EAN13}: not_found until', out.getvalue())
+        self.assertIn('5900000000000: not cached', out.getvalue())
+
+    def test_purge_codes(self):
+        call_command('produkty_w_sieci_negative_cache', 'purge', TEST_EAN13, stdout=StringIO())
+
+        self.assertIsNone(get_negative_entry(TEST_EAN13))
+        self.assertIsNotNone(get_negative_entry(OTHER_EAN13))
+
+    def test_purge_all(self):
+        call_command('produkty_w_sieci_negative_cache', 'purge', '--all', stdout=StringIO())
+
+        self.assertIsNone(get_negative_entry(TEST_EAN13))
+        self.assertIsNone(get_negative_entry(OTHER_EAN13))
@@ -0,0 +1,122 @@
+from unittest import mock
+
+from django.core.cache import cache
+from test_plus import TestCase
+
+from pola.cache_backends import TwoTierCache
+
+
+def make_cache(**options):
+    # The instances share the L2, like the processes of the dynos.
+    return TwoTierCache('', {'OPTIONS': {'L2_ALIAS': 'default', 'L1_KEY_PREFIXES': ['hot:'], **options}})
+
+
+class TestTwoTierCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = make_cache(SYNC_INTERVAL=0)
+        self.other_cache = make_cache(SYNC_INTERVAL=0)
+
+    def test_should_serve_hot_keys_from_l1(self):
+        self.cache.set("hot:a", {"value": 1})
+        cache.delete("hot:a")
+
+        self.assertEqual({"value": 1}, self.cache.get("hot:a"))
+        self.assertEqual({'hot': {'l1_hits': 1, 'l2_hits': 0, 'misses': 0}}, self.cache.get_stats())
+
+    def test_should_keep_other_keys_in_l2_only(self):
+        self.cache.set("cold:a", 1)
+        cache.delete("cold:a")
+
+        self.assertIsNone(self.cache.get("cold:a"))
+        self.assertEqual({'cold': {'l1_hits': 0, 'l2_hits': 0, 'misses': 1}}, self.cache.get_stats())
+
+    def test_should_return_copies(self):
+        self.cache.set("hot:a", {"value": 1})
+        self.cache.get("hot:a")["value"] = 2
+
+        self.assertEqual({"value": 1}, self.cache.get("hot:a"))
+
+    def test_should_drop_l1_entries_written_by_other_process(self):
+        self.cache.set("hot:a", 1)
+        self.other_cache.get("hot:a")
+
+        self.cache.set("hot:a", 2)
+
+        self.assertEqual(2, self.other_cache.get("hot:a"))
+
+    def test_should_drop_l1_entries_deleted_by_other_process(self):
+        self.cache.set("hot:a", 1)
+        self.other_cache.get("hot:a")
+
+        self.cache.delete("hot:a")
+
+        self.assertIsNone(self.other_cache.get("hot:a"))
+
+    def test_should_drop_l1_entries_written_together_by_other_process(self):
+        self.cache.set_many({"hot:a": 1, "hot:b": 1})
+        self.other_cache.get_many(["hot:a", "hot:b"])
+
+        self.cache.set_many({"hot:a": 2, "hot:b": 2})
+
+        self.assertEqual({"hot:a": 2, "hot:b": 2}, self.other_cache.get_many(["hot:a", "hot:b"]))
+
+    def test_should_read_l1_misses_in_one_round_trip(self):
+        self.cache.set("hot:a", 1)
+        cache.set_many({"hot:b": 2, "cold:c": 3})
+
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as mock_get_many:
+            self.assertEqual(
+                {"hot:a": 1, "hot:b": 2, "cold:c": 3}, self.cache.get_many(["hot:a", "hot:b", "cold:c", "d"])
+            )
+
+        mock_get_many.assert_called_once_with(["hot:b", "cold:c", "d"], version=None)
+        self.assertEqual(
+            {
+                'hot': {'l1_hits': 1, 'l2_hits': 1, 'misses': 0},
+                'cold': {'l1_hits': 0, 'l2_hits': 1, 'misses': 0},
+                'd': {'l1_hits': 0, 'l2_hits': 0, 'misses': 1},
+            },
+            self.cache.get_stats(),
+        )
+
+    def test_should_drop_whole_l1_when_log_is_lost(self):
+        self.cache.set("hot:a", 1)
+        self.other_cache.get("hot:a")
+
+        self.cache.set("hot:a", 2)
+        cache.delete_many([f"{TwoTierCache.LOG_KEY_PREFIX}:{i}" for i in range(10)])
+
+        self.assertEqual(2, self.other_cache.get("hot:a"))
+
+    def test_should_evict_least_recently_used_entries(self):
+        lru_cache = make_cache(L1_MAX_ENTRIES=2)
+        lru_cache.set("hot:a", 1)
+        lru_cache.set("hot:b", 2)
+        lru_cache.get("hot:a")
+        lru_cache.set("hot:c", 3)
+
+        self.assertEqual([lru_cache.make_key("hot:a"), lru_cache.make_key("hot:c")], list(lru_cache._l1))
+
+    def test_should_compute_value_once(self):
+        compute = mock.Mock(return_value=1)
+
+        self.assertEqual(1, self.cache.get_or_set("hot:a", compute))
+        self.assertEqual(1, self.other_cache.get_or_set("hot:a", compute))
+
+        compute.assert_called_once()
+
+    @mock.patch("pola.cache_backends.time.sleep")
+    def test_should_wait_for_value_computed_by_other_process(self, mock_sleep):
+        lock_key = f"{TwoTierCache.LOCK_KEY_PREFIX}:{self.cache.make_key('hot:a')}"
+        cache.add(lock_key, True)
+
+        def release_lock(_):
+            cache.set("hot:a", 1)
+            cache.delete(lock_key)
+
+        mock_sleep.side_effect = release_lock
+        compute = mock.Mock(return_value=2)
+
+        self.assertEqual(1, self.cache.get_or_set("hot:a", compute))
+        compute.assert_not_called()
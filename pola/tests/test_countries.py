@@ -0,0 +1,61 @@
+from parameterized import parameterized
+from test_plus import TestCase
+
+from pola.countries import (
+    CODE_PREFIX_TO_COUNTRY,
+    KIND_BOOK,
+    KIND_COUNTRY,
+    KIND_COUPON,
+    KIND_GS1_US,
+    KIND_INTERNAL,
+    KIND_INVALID,
+    KIND_UNASSIGNED,
+    Classification,
+    classify,
+    classify_many,
+    get_registration_country,
+)
+
+
+def get_registration_country_by_scan(code):
+    for prefix, name in CODE_PREFIX_TO_COUNTRY.items():
+        if code.startswith(prefix):
+            return name
+    return None
+
+
+class TestGetRegistrationCountry(TestCase):
+    def test_should_match_prefix_scan_for_all_prefixes(self):
+        for i in range(1000):
+            code = f"{i:03}0000000000"
+            self.assertEqual(get_registration_country_by_scan(code), get_registration_country(code), code)
+
+    def test_should_not_return_poland(self):
+        self.assertIsNone(get_registration_country("5900000000000"))
+
+    @parameterized.expand([("59",), ("ABC0000000000",), ("",)])
+    def test_should_not_return_country_of_invalid_code(self, code):
+        self.assertIsNone(get_registration_country(code))
+
+
+class TestClassify(TestCase):
+    @parameterized.expand(
+        [
+            ("5900000000000", Classification(KIND_COUNTRY, "Polska")),
+            ("4600000000000", Classification(KIND_COUNTRY, "Federacja Rosyjska")),
+            ("3830000000000", Classification(KIND_COUNTRY, "Słowenia")),
+            ("9780000000000", Classification(KIND_BOOK)),
+            ("0120000000000", Classification(KIND_GS1_US)),
+            ("2100000000000", Classification(KIND_INTERNAL)),
+            ("9910000000000", Classification(KIND_COUPON)),
+            ("1500000000000", Classification(KIND_UNASSIGNED)),
+            ("59", Classification(KIND_INVALID)),
+            ("ABC0000000000", Classification(KIND_INVALID)),
+        ]
+    )
+    def test_should_classify_code(self, code, expected):
+        self.assertEqual(expected, classify(code))
+
+    def test_classify_many(self):
+        codes = ["5900000000000", "9770000000000", "x"]
+        self.assertEqual([classify(code) for code in codes], classify_many(codes))
@@ -0,0 +1,182 @@
+import json
+import random
+import string
+import tempfile
+from datetime import datetime, timezone
+from unittest import mock
+
+import pyarrow.parquet as pq
+from django.core.management import call_command
+from django.db import connection
+from test_plus.test import TestCase
+
+from pola import event_archive, query_partitions
+from pola.models import ArchivedEventRange, Query, SearchQuery
+from pola.product.factories import ProductFactory
+from pola.s3 import create_s3_client, create_s3_resource
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestEventArchive(TestCase):
+    def setUp(self):
+        random_prefix = "".join(random.choices(list(string.ascii_lowercase), k=10))
+        self.bucket_name = f"test-bucket-{random_prefix}"
+        self.s3_client = create_s3_client()
+        self.s3_client.create_bucket(Bucket=self.bucket_name)
+        self.settings_override = self.settings(
+            EVENT_ARCHIVE={
+                'BUCKET_NAME': self.bucket_name,
+                'PREFIX': 'events',
+                'ARCHIVE_AFTER_MONTHS': 12,
+                'BATCH_SIZE': 2,
+            }
+        )
+        self.settings_override.enable()
+        self.product = ProductFactory()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        bucket = create_s3_resource().Bucket(self.bucket_name)
+        bucket.objects.all().delete()
+        self.s3_client.delete_bucket(Bucket=self.bucket_name)
+
+    def _query(self, timestamp, **kwargs):
+        query = Query.objects.create(product=self.product, **kwargs)
+        Query.objects.filter(pk=query.pk).update(timestamp=timestamp)
+        return query
+
+    def _read(self, key):
+        with tempfile.NamedTemporaryFile() as f:
+            self.s3_client.download_file(self.bucket_name, key, f.name)
+            return pq.read_table(f.name).to_pylist()
+
+    def test_should_move_month_to_archive(self):
+        q1 = self._query(_utc(2001, 1, 1), client='a', was_590=True)
+        self._query(_utc(2001, 1, 20))
+        self._query(_utc(2001, 1, 31, 23))
+        kept = self._query(_utc(2001, 2, 1))
+
+        archived_range = event_archive.archive_month('pola_query', _utc(2001, 1, 1))
+
+        self.assertEqual(3, archived_range.row_count)
+        key = 'events/pola_query/year=2001/month=01/pola_query-2001-01.parquet'
+        self.assertEqual(f's3://{self.bucket_name}/{key}', archived_range.location)
+        self.assertEqual([kept.pk], list(Query.objects.values_list('pk', flat=True)))
+        rows = {row['id']: row for row in self._read(key)}
+        self.assertEqual(3, len(rows))
+        self.assertEqual(
+            {
+                'id': q1.pk,
+                'client': 'a',
+                'product_id': self.product.pk,
+                'was_verified': False,
+                'was_plScore': False,
+                'was_590': True,
+                'timestamp': _utc(2001, 1, 1),
+            },
+            rows[q1.pk],
+        )
+
+    def test_should_drop_partition_of_archived_month(self):
+        query_partitions.create_partition(_utc(2100, 1, 1))
+        self._query(_utc(2100, 1, 5))
+        with connection.cursor() as cursor:
+            # The test runs in a transaction, the partition cannot be dropped with pending foreign key checks.
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        event_archive.archive_month('pola_query', _utc(2100, 1, 1))
+
+        self.assertNotIn(_utc(2100, 1, 1), query_partitions.get_partitions())
+        self.assertFalse(Query.objects.exists())
+
+    def test_should_delete_legacy_month_in_batches(self):
+        self._query(_utc(2001, 1, 1))
+        self._query(_utc(2001, 1, 2))
+
+        delete_legacy_rows = query_partitions.delete_legacy_rows
+        with mock.patch.object(query_partitions, 'delete_legacy_rows', wraps=delete_legacy_rows) as mock_delete:
+            archived_range = event_archive.archive_month('pola_query', _utc(2001, 1, 1))
+
+        mock_delete.assert_called_once_with(_utc(2001, 1, 1), _utc(2001, 2, 1))
+        self.assertEqual(2, archived_range.row_count)
+        self.assertFalse(Query.objects.exists())
+
+    def test_should_keep_rows_when_database_does_not_match_file(self):
+        self._query(_utc(2001, 1, 1))
+
+        export = event_archive._export
+
+        def export_and_insert(*args):
+            row_count = export(*args)
+            self._query(_utc(2001, 1, 2))
+            return row_count
+
+        with mock.patch.object(event_archive, '_export', side_effect=export_and_insert):
+            with mock.patch.object(query_partitions, 'delete_legacy_rows') as mock_delete:
+                with self.assertRaises(event_archive.ArchiveVerificationError):
+                    event_archive.archive_month('pola_query', _utc(2001, 1, 1))
+
+        mock_delete.assert_not_called()
+        self.assertEqual(2, Query.objects.count())
+        self.assertFalse(ArchivedEventRange.objects.exists())
+
+    def test_should_keep_rows_when_file_does_not_match(self):
+        self._query(_utc(2001, 1, 1))
+
+        export = event_archive._export
+        with mock.patch.object(event_archive, '_export', side_effect=lambda *args: export(*args) + 1):
+            with self.assertRaises(event_archive.ArchiveVerificationError):
+                event_archive.archive_month('pola_query', _utc(2001, 1, 1))
+
+        self.assertEqual(1, Query.objects.count())
+        self.assertFalse(ArchivedEventRange.objects.exists())
+
+    def test_should_skip_empty_and_archived_months(self):
+        self.assertIsNone(event_archive.archive_month('pola_query', _utc(2001, 1, 1)))
+
+        self._query(_utc(2001, 1, 1))
+        event_archive.archive_month('pola_query', _utc(2001, 1, 1))
+        self._query(_utc(2001, 1, 2))
+
+        self.assertIsNone(event_archive.archive_month('pola_query', _utc(2001, 1, 1)))
+
+    def test_should_list_closed_months(self):
+        self._query(_utc(2001, 11, 5))
+        search_query = SearchQuery.objects.create(text='mleko')
+        SearchQuery.objects.filter(pk=search_query.pk).update(timestamp=_utc(2001, 10, 5))
+
+        self.assertEqual(
+            [_utc(2001, 10, 1), _utc(2001, 11, 1)],
+            event_archive.get_closed_months(12, now=_utc(2002, 12, 15)),
+        )
+
+    def test_run_command(self):
+        self._query(_utc(2001, 1, 1))
+        search_query = SearchQuery.objects.create(text='mleko')
+        SearchQuery.objects.filter(pk=search_query.pk).update(timestamp=_utc(2001, 1, 2))
+
+        call_command('archive_events')
+
+        self.assertFalse(Query.objects.exists())
+        self.assertFalse(SearchQuery.objects.exists())
+        manifest = json.loads(
+            self.s3_client.get_object(Bucket=self.bucket_name, Key='events/manifest.json')['Body'].read()
+        )
+        self.assertEqual(
+            [('pola_query', 1), ('pola_searchquery', 1)],
+            [(archived_range['table'], archived_range['rows']) for archived_range in manifest['ranges']],
+        )
+
+    def test_should_not_write_manifest_when_month_fails(self):
+        self._query(_utc(2001, 1, 1))
+
+        export = event_archive._export
+        with mock.patch.object(event_archive, '_export', side_effect=lambda *args: export(*args) + 1):
+            with self.assertRaises(event_archive.ArchiveVerificationError):
+                call_command('archive_events')
+
+        keys = [obj['Key'] for obj in self.s3_client.list_objects_v2(Bucket=self.bucket_name).get('Contents', [])]
+        self.assertNotIn('events/manifest.json', keys)
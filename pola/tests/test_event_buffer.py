@@ -0,0 +1,159 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import override_settings
+from django.utils import timezone
+from test_plus import TestCase
+
+from pola.company.factories import CompanyFactory
+from pola.company.models import Company
+from pola.event_buffer import EventBuffer
+from pola.models import Query, SearchQuery
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+from pola.scan_counters import DeltaCounter
+
+
+@override_settings(EVENT_BUFFER_ENABLE=True)
+class TestEventBuffer(TestCase):
+    def setUp(self):
+        self.buffer = EventBuffer(SearchQuery, max_size=3, batch_size=2, flush_interval=60)
+        # Do not start the background thread.
+        self.buffer._ensure_thread = lambda: None
+
+    def test_should_insert_events_on_flush(self):
+        self.buffer.add(SearchQuery(client="A", text="mleko", timestamp=timezone.now()))
+        self.buffer.add(SearchQuery(client="B", text="ser", timestamp=timezone.now()))
+        self.buffer.add(SearchQuery(client="C", text="chleb", timestamp=timezone.now()))
+        self.assertFalse(SearchQuery.objects.exists())
+
+        self.buffer.flush()
+
+        self.assertEqual(["chleb", "mleko", "ser"], sorted(SearchQuery.objects.values_list('text', flat=True)))
+        self.assertEqual(0, len(self.buffer))
+        self.assertEqual(3, self.buffer.flushed)
+
+    def test_should_keep_event_timestamp(self):
+        timestamp = timezone.now() - timedelta(minutes=5)
+        product = ProductFactory()
+        buffer = EventBuffer(Query, max_size=10, batch_size=10, flush_interval=60)
+        buffer._ensure_thread = lambda: None
+        buffer.add(Query(client="A", product=product, was_590=True, timestamp=timestamp))
+        buffer.flush()
+
+        query = Query.objects.get()
+        self.assertEqual(timestamp, query.timestamp)
+        self.assertTrue(query.was_590)
+        self.assertEqual(product, query.product)
+
+    def test_should_drop_events_when_full(self):
+        for i in range(5):
+            self.buffer.add(SearchQuery(text=str(i), timestamp=timezone.now()))
+
+        self.assertEqual(3, len(self.buffer))
+        self.assertEqual(2, self.buffer.dropped)
+
+    def test_should_wake_up_flush_thread_on_batch_size(self):
+        self.buffer.add(SearchQuery(text="a", timestamp=timezone.now()))
+        self.assertFalse(self.buffer._wakeup.is_set())
+        self.buffer.add(SearchQuery(text="b", timestamp=timezone.now()))
+        self.assertTrue(self.buffer._wakeup.is_set())
+
+    def test_should_add_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.buffer.add_on_commit(SearchQuery(text="a", timestamp=timezone.now()))
+        self.assertEqual(0, len(self.buffer))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(1, len(self.buffer))
+
+    def test_should_retry_failed_insert_once(self):
+        self.buffer.add(SearchQuery(text="a", timestamp=timezone.now()))
+        insert = self.buffer._insert
+        failures = [OperationalError("deadlock detected")]
+
+        def fail_once(instances):
+            if failures:
+                raise failures.pop()
+            insert(instances)
+
+        with mock.patch.object(self.buffer, '_insert', side_effect=fail_once):
+            self.buffer.flush()
+
+        self.assertTrue(SearchQuery.objects.filter(text="a").exists())
+        self.assertEqual(1, self.buffer.flushed)
+        self.assertEqual(0, self.buffer.dropped)
+
+    def test_should_drop_events_failing_twice(self):
+        self.buffer.add(SearchQuery(text="a", timestamp=timezone.now()))
+        with mock.patch.object(self.buffer, '_insert', side_effect=OperationalError("deadlock detected")):
+            self.buffer.flush()
+
+        self.assertFalse(SearchQuery.objects.exists())
+        self.assertEqual(1, self.buffer.dropped)
+
+    @override_settings(EVENT_BUFFER_ENABLE=False)
+    def test_should_insert_immediately_when_disabled(self):
+        self.buffer.add(SearchQuery(text="a", timestamp=timezone.now()))
+
+        self.assertEqual(0, len(self.buffer))
+        self.assertTrue(SearchQuery.objects.filter(text="a").exists())
+
+
+@override_settings(EVENT_BUFFER_ENABLE=True)
+class TestScanCounters(TestCase):
+    def setUp(self):
+        self.company = CompanyFactory(query_count=10)
+        self.product = ProductFactory(company=self.company, query_count=5)
+        self.other_product = ProductFactory(company=None, query_count=0)
+        self.product_counts = DeltaCounter(Product, key=lambda query: query.product_id)
+        self.company_counts = DeltaCounter(Company, key=lambda query: query.product.company_id)
+        self.buffer = EventBuffer(
+            Query, max_size=10, batch_size=10, flush_interval=60, counters=(self.product_counts, self.company_counts)
+        )
+        self.buffer._ensure_thread = lambda: None
+
+    def scan(self, product):
+        self.buffer.add(Query(client="A", product=product, timestamp=timezone.now()))
+
+    def test_should_fold_counts_on_flush(self):
+        self.scan(self.product)
+        self.scan(self.product)
+        self.scan(self.other_product)
+
+        self.product.refresh_from_db()
+        self.assertEqual(5, self.product.query_count)
+
+        self.buffer.flush()
+
+        self.product.refresh_from_db()
+        self.other_product.refresh_from_db()
+        self.company.refresh_from_db()
+        self.assertEqual(7, self.product.query_count)
+        self.assertEqual(1, self.other_product.query_count)
+        self.assertEqual(12, self.company.query_count)
+        self.assertEqual(0, len(self.product_counts))
+
+    def test_should_not_count_dropped_events(self):
+        self.buffer.max_size = 1
+        self.scan(self.product)
+        self.scan(self.product)
+        self.buffer.flush()
+
+        self.product.refresh_from_db()
+        self.assertEqual(6, self.product.query_count)
+        self.assertEqual(1, Query.objects.filter(product=self.product).count())
+
+    def test_should_match_recalculated_count(self):
+        self.product.query_count = 0
+        self.product.save()
+        self.scan(self.product)
+        self.scan(self.product)
+        self.buffer.flush()
+
+        Product.recalculate_query_count()
+
+        self.product.refresh_from_db()
+        self.assertEqual(2, self.product.query_count)
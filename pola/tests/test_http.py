@@ -0,0 +1,31 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from pola.integrations.http import PooledSession
+
+
+class TestPooledSession(SimpleTestCase):
+    def setUp(self):
+        self.session = PooledSession(pool_size=2, connect_timeout=1, read_timeout=5)
+
+    @mock.patch("requests.Session.request")
+    def test_should_apply_default_timeout(self, mock_request):
+        self.session.request("get", "https://example.com/")
+
+        mock_request.assert_called_once_with("get", "https://example.com/", timeout=(1, 5))
+
+    @mock.patch("requests.Session.request")
+    def test_should_keep_explicit_timeout(self, mock_request):
+        self.session.request("get", "https://example.com/", timeout=0.5)
+
+        mock_request.assert_called_once_with("get", "https://example.com/", timeout=0.5)
+
+    @mock.patch("requests.Session.request")
+    def test_should_reuse_session(self, mock_request):
+        self.session.request("get", "https://example.com/")
+        first_session = self.session._session
+        self.session.request("get", "https://example.com/")
+
+        self.assertIs(first_session, self.session._session)
+        self.assertEqual({'requests': 2, 'connections': 0, 'reused': 2}, self.session.get_stats())
@@ -2,6 +2,7 @@ import os
 from unittest import mock
 
 from django.core.files.base import ContentFile
+from django.test import override_settings
 from parameterized import parameterized
 from test_plus import TestCase
 from vcr import VCR
@@ -12,6 +13,7 @@ from pola.logic import (
     _find_replacements,
     get_by_code,
     get_result_from_code,
+    get_results_from_codes,
     handle_product_replacements,
 )
 from pola.product.factories import ProductFactory
@@ -107,6 +109,17 @@ class TestGetResultFromCode(TestCase):
         )
         self.assertEqual(expected_response, response)
 
+    @override_settings(PRODUKTY_W_SIECI_ASYNC_ENABLE=True)
+    @mock.patch("pola.logic.is_enrichment_pending", return_value=True)
+    @mock.patch("pola.logic.get_by_code")
+    def test_missing_company_and_590_pending(self, mock_get_by_code, mock_is_enrichment_pending):
+        mock_get_by_code.return_value = ProductFactory.create(code=TEST_EAN13, company=None, brand=None)
+        result, _, _ = get_result_from_code(TEST_EAN13, multiple_company_supported=True, report_as_object=True)
+
+        mock_is_enrichment_pending.assert_called_once_with(TEST_EAN13)
+        self.assertEqual("Pobieramy dane o tym produkcie", result['name'])
+        self.assertEqual("type_grey", result['card_type'])
+
     @parameterized.expand([("977",), ('978',), ('979',)])
     def test_missing_company_and_book(self, prefix):
         current_ean = prefix + TEST_EAN13[3:]
@@ -612,6 +625,85 @@ class TestGetByCode(TestCase):
         self.assertEqual(1, Product.objects.count())
 
 
+class TestGetResultFromCodeQueryCount(TestCase):
+    def test_card_with_company(self):
+        company = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        BrandFactory.create_batch(3, company=company)
+        ProductFactory(code=TEST_EAN13, company=company, brand=None)
+
+        with self.assertNumQueries(3):
+            get_result_from_code(TEST_EAN13, multiple_company_supported=True, report_as_object=True)
+
+    def test_card_with_company_brand_and_replacements(self):
+        company = CompanyFactory(display_brands_in_description=True)
+        brand = BrandFactory(company=company)
+        product = ProductFactory(code=TEST_EAN13, company=company, brand=brand)
+        product.replacements.add(
+            ProductFactory(code="5900000000001", brand=BrandFactory()),
+            ProductFactory(code="5900000000002", brand=None),
+        )
+
+        with self.assertNumQueries(3):
+            result, _, _ = get_result_from_code(TEST_EAN13, multiple_company_supported=True, report_as_object=True)
+        self.assertEqual(2, len(result['replacements']))
+
+    def test_card_with_multiple_companies(self):
+        brand = BrandFactory(company=CompanyFactory())
+        ProductFactory(code=TEST_EAN13, company=CompanyFactory(), brand=brand)
+
+        with self.assertNumQueries(4):
+            result, _, _ = get_result_from_code(TEST_EAN13, multiple_company_supported=True, report_as_object=True)
+        self.assertEqual(2, len(result['companies']))
+
+    def test_legacy_card_with_company(self):
+        company = CompanyFactory(display_brands_in_description=True)
+        ProductFactory(code=TEST_EAN13, company=company, brand=BrandFactory(company=company))
+
+        with self.assertNumQueries(3):
+            get_result_from_code(TEST_EAN13)
+
+    def test_card_without_company(self):
+        ProductFactory(code="4000000000001", company=None, brand=None)
+
+        with self.assertNumQueries(2):
+            get_result_from_code("4000000000001", multiple_company_supported=True, report_as_object=True)
+
+
+class TestGetResultsFromCodes(TestCase):
+    def test_should_return_results_in_order(self):
+        company = CompanyFactory(common_name="Test company")
+        ProductFactory(code=TEST_EAN13, company=company, brand=None)
+
+        results = get_results_from_codes(["123", TEST_EAN13], multiple_company_supported=True)
+
+        self.assertEqual(["123", TEST_EAN13], [result['code'] for result, _, _ in results])
+        self.assertEqual('Nieprawidłowy kod', results[0][0]['name'])
+        self.assertIsNone(results[0][2])
+        self.assertEqual("Test company", results[1][0]['companies'][0]['name'])
+
+    def test_should_load_products_with_constant_number_of_queries(self):
+        for i in range(5):
+            company = CompanyFactory()
+            BrandFactory(company=company)
+            ProductFactory(code=f"590000000000{i}", company=company, brand=BrandFactory(company=company))
+        codes = [f"590000000000{i}" for i in range(5)]
+
+        with self.assertNumQueries(3):
+            results = get_results_from_codes(codes, multiple_company_supported=True, report_as_object=True)
+        self.assertEqual(5, len(results))
+
+    @override_settings(PRODUKTY_W_SIECI_ENABLE=True)
+    @mock.patch("pola.logic.schedule_enrichment")
+    @mock.patch("pola.logic.fetch_from_api")
+    def test_should_create_unknown_products_and_defer_enrichment(self, mock_fetch_from_api, mock_schedule_enrichment):
+        results = get_results_from_codes([TEST_EAN13, "4000000000001"], multiple_company_supported=True)
+
+        self.assertEqual(2, Product.objects.filter(code__in=[TEST_EAN13, "4000000000001"]).count())
+        self.assertEqual(TEST_EAN13, results[0][2].code)
+        mock_schedule_enrichment.assert_called_once_with(TEST_EAN13)
+        mock_fetch_from_api.assert_not_called()
+
+
 class TestCreateFromApi(TestCase):
     pass
 
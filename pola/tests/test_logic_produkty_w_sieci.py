@@ -1,12 +1,30 @@
 from functools import reduce
+from unittest import mock
 
+import requests
+from django.core.cache import cache
+from django.test import override_settings
 from parameterized import parameterized
 from test_plus import TestCase
 
 from pola import logic_produkty_w_sieci
 from pola.gpc.factories import GPCBrickFactory
-from pola.integrations.produkty_w_sieci import ProductBase
-from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
+from pola.integrations.produkty_w_sieci import ApiException, ProductBase
+from pola.logic import get_by_code
+from pola.logic_produkty_w_sieci import (
+    NEGATIVE_ERROR,
+    NEGATIVE_NO_COMPANY,
+    NEGATIVE_NOT_FOUND,
+    create_from_api,
+    create_within_budget,
+    enrich_product,
+    fetch_from_api,
+    get_negative_entry,
+    is_code_supported,
+    is_enrichment_pending,
+    purge_negative_entries,
+    remember_negative_result,
+)
 from pola.product.models import Product
 from pola.report.models import Report
 
@@ -479,6 +497,29 @@ class TestCreateFromApi(TestCase):
         self.assertIn('Product exists. Updating a product.', logConcat)
         self.assertIn('A previously unknown brand was found. Updating the product.', logConcat)
 
+    def test_should_update_product_created_in_the_meantime(self):
+        code = '5900102025473'
+        empty_product = Product.objects.create(code=code)
+        product_query_response = {
+            "gtinNumber": code,
+            "name": "Gorzka 70% cocoa 90g - czekolada pełna",
+            "targetMarket": ["WW"],
+            "netContent": ["90.0", "G"],
+            "imageUrls": [],
+            "brand": "Wawel",
+            "company": {"name": "WAWEL Spółka Akcyjna", "nip": "6760076868"},
+            "gpc": [],
+        }
+
+        result_product = create_from_api(
+            code=code, get_products_response=ProductBase.parse_obj(product_query_response), product=None
+        )
+
+        self.assertEqual(empty_product.pk, result_product.pk)
+        product_db = Product.objects.get(code=code)
+        self.assertEqual(product_query_response['name'], product_db.name)
+        self.assertEqual(product_query_response['company']['name'], product_db.company.name)
+
 
 class TestCreateFromApiUnsupportedCode(TestCase):
     def test_raises_exception_for_unsupported_code(self):
@@ -487,3 +528,129 @@ class TestCreateFromApiUnsupportedCode(TestCase):
         with self.assertRaises(Exception) as ctx:
             create_from_api(code=code, get_products_response=None, product=None)
         self.assertEqual(str(ctx.exception), f"Unsupported code: {code}")
+
+
+@override_settings(PRODUKTY_W_SIECI_ASYNC_ENABLE=True)
+class TestCreateWithinBudget(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("pola.logic_produkty_w_sieci.Queue")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_schedule_enrichment_on_timeout(self, mock_client, mock_queue):
+        mock_client.get_products.side_effect = requests.exceptions.Timeout()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(create_within_budget(TEST_EAN13))
+            self.assertIsNone(create_within_budget(TEST_EAN13))
+            mock_queue.assert_not_called()
+
+        mock_client.get_products.assert_called_once_with(gtin_number=TEST_EAN13, num_retries=0, timeout=1.5)
+        mock_queue.assert_called_once_with('high', connection=mock.ANY)
+        mock_queue.return_value.enqueue.assert_called_once_with(enrich_product, TEST_EAN13)
+        self.assertTrue(is_enrichment_pending(TEST_EAN13))
+
+    @mock.patch("pola.logic_produkty_w_sieci.Queue")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_clear_pending_flag_when_transaction_is_rolled_back(self, mock_client, mock_queue):
+        mock_client.get_products.side_effect = requests.exceptions.Timeout()
+
+        with self.captureOnCommitCallbacks(execute=False):
+            create_within_budget(TEST_EAN13)
+        self.assertTrue(is_enrichment_pending(TEST_EAN13))
+
+        # Not sent through request_finished, close_old_connections would close the connection of the test.
+        logic_produkty_w_sieci.clear_rolled_back_enrichments(sender=self.__class__)
+
+        mock_queue.assert_not_called()
+        self.assertFalse(is_enrichment_pending(TEST_EAN13))
+
+    @mock.patch("pola.logic_produkty_w_sieci.Queue")
+    @mock.patch("pola.logic_produkty_w_sieci.create_from_api")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_create_inline_when_api_is_fast(self, mock_client, mock_create_from_api, mock_queue):
+        create_within_budget(TEST_EAN13)
+
+        mock_create_from_api.assert_called_once_with(TEST_EAN13, mock_client.get_products.return_value, product=None)
+        mock_queue.assert_not_called()
+        self.assertFalse(is_enrichment_pending(TEST_EAN13))
+
+    @mock.patch("pola.logic_produkty_w_sieci.create_from_api")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_enrich_product_should_clear_pending_flag(self, mock_client, mock_create_from_api):
+        product = Product.objects.create(code=TEST_EAN13)
+        cache.set(f"{logic_produkty_w_sieci.PENDING_KEY_PREFIX}:{TEST_EAN13}", True)
+
+        enrich_product(TEST_EAN13)
+
+        mock_client.get_products.assert_called_once_with(gtin_number=TEST_EAN13)
+        mock_create_from_api.assert_called_once_with(TEST_EAN13, mock_client.get_products.return_value, product=product)
+        self.assertFalse(is_enrichment_pending(TEST_EAN13))
+
+    @override_settings(PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE=True)
+    @mock.patch("pola.single_flight.time.sleep")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_reuse_product_fetched_by_another_request(self, mock_client, mock_sleep):
+        product = Product.objects.create(code=TEST_EAN13)
+        cache.add(f"single_flight:produkty_w_sieci:{TEST_EAN13}", True, 10)
+        mock_sleep.side_effect = lambda _: cache.delete(f"single_flight:produkty_w_sieci:{TEST_EAN13}")
+
+        self.assertEqual(product, fetch_from_api(TEST_EAN13))
+
+        mock_client.get_products.assert_not_called()
+
+    @override_settings(
+        PRODUKTY_W_SIECI_ENABLE=True,
+        PRODUKTY_W_SIECI_SINGLE_FLIGHT_ENABLE=True,
+        PRODUKTY_W_SIECI_SINGLE_FLIGHT={'LOCK_TIMEOUT': 10, 'WAIT_TIMEOUT': 0},
+    )
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_not_create_product_still_fetched_by_another_request(self, mock_client):
+        cache.add(f"single_flight:produkty_w_sieci:{TEST_EAN13}", True, 10)
+
+        self.assertIsNone(get_by_code(TEST_EAN13))
+
+        mock_client.get_products.assert_not_called()
+        self.assertFalse(Product.objects.filter(code=TEST_EAN13).exists())
+
+
+class TestNegativeCache(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_not_query_api_again_after_not_found(self, mock_client):
+        mock_client.get_products.return_value = None
+
+        self.assertIsNone(fetch_from_api(TEST_EAN13))
+        self.assertIsNone(fetch_from_api(TEST_EAN13))
+
+        mock_client.get_products.assert_called_once_with(gtin_number=TEST_EAN13)
+        self.assertEqual(NEGATIVE_NOT_FOUND, get_negative_entry(TEST_EAN13)['status'])
+
+    @mock.patch("pola.logic_produkty_w_sieci.create_from_api")
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_remember_product_without_company(self, mock_client, mock_create_from_api):
+        mock_client.get_products.return_value.company = None
+
+        fetch_from_api(TEST_EAN13)
+
+        mock_create_from_api.assert_called_once()
+        self.assertEqual(NEGATIVE_NO_COMPANY, get_negative_entry(TEST_EAN13)['status'])
+
+    @override_settings(PRODUKTY_W_SIECI_NEGATIVE_CACHE={'ERROR_TIMEOUT': 60})
+    @mock.patch("pola.logic_produkty_w_sieci.produkty_w_sieci_client")
+    def test_should_remember_error_of_background_job(self, mock_client):
+        mock_client.get_products.side_effect = ApiException("Server error")
+
+        with self.assertRaises(ApiException):
+            enrich_product(TEST_EAN13)
+
+        self.assertEqual(NEGATIVE_ERROR, get_negative_entry(TEST_EAN13)['status'])
+
+    def test_should_purge_entries(self):
+        remember_negative_result(TEST_EAN13, NEGATIVE_NOT_FOUND)
+
+        purge_negative_entries()
+
+        self.assertIsNone(get_negative_entry(TEST_EAN13))
@@ -1,5 +1,16 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
 from test_plus import TestCase
 
+from pola.integrations.produkty_w_sieci import (
+    ApiException,
+    CircuitOpenException,
+)
+from pola.logic_workers import RateLimiter, requery_products
+from pola.product.factories import ProductFactory
+
 
 class TestRequery590Codes(TestCase):
     pass
@@ -9,8 +20,59 @@ class TestRequeryAlCodes(TestCase):
     pass
 
 
+@mock.patch("pola.logic_workers.create_from_api")
+@mock.patch("pola.logic_workers.produkty_w_sieci_client")
 class TestRequeryProducts(TestCase):
-    pass
+    def setUp(self):
+        self.queried_at = timezone.now() - timedelta(days=90)
+        self.found = ProductFactory(code="5900000000001", ilim_queried_at=self.queried_at)
+        self.not_found = ProductFactory(code="5900000000002", ilim_queried_at=self.queried_at)
+        self.failing = ProductFactory(code="5900000000003", ilim_queried_at=self.queried_at)
+        self.foreign = ProductFactory(code="4000000000001", ilim_queried_at=self.queried_at)
+        self.products = [self.found, self.not_found, self.failing, self.foreign]
+
+    def get_products(self, gtin_number):
+        if gtin_number == self.failing.code:
+            raise ApiException("Server error")
+        if gtin_number == self.not_found.code:
+            return None
+        return mock.sentinel.response
+
+    def test_should_requery_products(self, mock_client, mock_create_from_api):
+        mock_client.get_products.side_effect = self.get_products
+        # create_from_api saves the product together with ilim_queried_at.
+        mock_create_from_api.side_effect = lambda code, response, product: product.save()
+
+        stats = requery_products(self.products, workers=2, rate=1000, batch_size=3)
+
+        mock_create_from_api.assert_called_once_with(self.found.code, mock.sentinel.response, product=self.found)
+        self.assertEqual(3, mock_client.get_products.call_count)
+        self.assertEqual((4, 1, 1, 1), (stats.processed, stats.updated, stats.not_found, stats.errors))
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertGreater(product.ilim_queried_at, self.queried_at)
+
+    def test_should_stop_when_circuit_is_open(self, mock_client, mock_create_from_api):
+        mock_client.get_products.side_effect = CircuitOpenException()
+
+        stats = requery_products(self.products, workers=2, rate=1000, batch_size=3)
+
+        self.assertEqual(0, stats.processed)
+        self.found.refresh_from_db()
+        self.assertEqual(self.queried_at, self.found.ilim_queried_at)
+
+
+class TestRateLimiter(TestCase):
+    @mock.patch("pola.logic_workers.time")
+    def test_should_space_calls(self, mock_time):
+        mock_time.monotonic.return_value = 100
+        rate_limiter = RateLimiter(rate=4)
+
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+
+        self.assertEqual([mock.call(0.25), mock.call(0.5)], mock_time.sleep.call_args_list)
 
 
 class TestUpdateFromKbpoz(TestCase):
@@ -1,5 +1,115 @@
+from datetime import date, timedelta
+
+from django.conf import settings
 from test_plus import TestCase
 
+from pola.company.factories import CompanyFactory
+from pola.company.models import Company
+from pola.models import Query, Stats, StatsClient
+from pola.product.factories import ProductFactory
+from pola.stats_rollup import get_stats, update_day
+
 
 class TestStats(TestCase):
-    pass
+    def setUp(self):
+        self.product = ProductFactory()
+
+    def _query(self, timestamp=None, client='client', **kwargs):
+        query = Query.objects.create(product=self.product, client=client, **kwargs)
+        if timestamp is not None:
+            Query.objects.filter(pk=query.pk).update(timestamp=timestamp)
+        return query
+
+    def test_calculate(self):
+        start, end = Stats.get_bounds(2024, 5, 10)
+        self._query(start, client='a', was_verified=True, was_plScore=True, was_590=True)
+        self._query(start + timedelta(hours=12), client='a', was_590=True)
+        self._query(end - timedelta(seconds=1), client='b')
+        self._query(end - timedelta(seconds=1), client=None)
+        self._query(end, client='c')
+
+        stat = Stats()
+        stat.calculate(2024, 5, 10)
+
+        self.assertEqual(4, stat.no_of_queries)
+        self.assertEqual(3, stat.no_of_clients)
+        self.assertEqual(1, stat.no_of_verified)
+        self.assertEqual(1, stat.no_of_plScore)
+        self.assertEqual(2, stat.no_of_590)
+        self.assertEqual(1, stat.no_of_not_verified_590)
+        self.assertEqual(2, stat.no_of_not_verified_not_590)
+        self.assertEqual(0, stat.no_of_new_companies)
+
+    def test_update_finishes_past_days(self):
+        start, _ = Stats.get_bounds(2024, 5, 10)
+        self._query(start)
+
+        stat = update_day(date(2024, 5, 10))
+        self.assertEqual(1, stat.no_of_queries)
+        self.assertTrue(stat.is_finished())
+
+        self._query(start)
+        stat = update_day(date(2024, 5, 10))
+        self.assertEqual(1, stat.no_of_queries)
+
+    def test_update_counts_the_day_incrementally(self):
+        start, _ = Stats.get_bounds(2024, 5, 10)
+        self._query(start, client='a', was_verified=True)
+        self._query(start + timedelta(minutes=1), client='b')
+        Company.objects.filter(pk=CompanyFactory().pk).update(created=start)
+
+        stat = update_day(date(2024, 5, 10), now=start + timedelta(hours=1))
+        self.assertEqual(2, stat.no_of_queries)
+        self.assertEqual(2, stat.no_of_clients)
+        self.assertEqual(1, stat.no_of_new_companies)
+        self.assertFalse(stat.is_finished())
+
+        self._query(start + timedelta(minutes=65), client='a', was_590=True)
+        Company.objects.filter(pk=CompanyFactory().pk).update(created=start)
+
+        stat = update_day(date(2024, 5, 10), now=start + timedelta(hours=2))
+        self.assertEqual(3, stat.no_of_queries)
+        self.assertEqual(2, stat.no_of_clients)
+        self.assertEqual(1, stat.no_of_verified)
+        self.assertEqual(1, stat.no_of_not_verified_590)
+        self.assertEqual(2, stat.no_of_new_companies)
+        self.assertEqual(start + timedelta(hours=2, seconds=-60), stat.counted_until)
+        self.assertEqual(1, Stats.objects.count())
+
+    def test_update_leaves_the_latest_scans_for_the_next_update(self):
+        start, _ = Stats.get_bounds(2024, 5, 10)
+        now = start + timedelta(hours=1)
+        self._query(now - timedelta(seconds=10))
+
+        stat = update_day(date(2024, 5, 10), now=now)
+        self.assertEqual(0, stat.no_of_queries)
+
+        stat = update_day(date(2024, 5, 10), now=now + timedelta(minutes=1))
+        self.assertEqual(1, stat.no_of_queries)
+
+    def test_get_stats_updates_missing_and_stale_rows(self):
+        start, _ = Stats.get_bounds(2024, 5, 10)
+        now = start + timedelta(hours=12)
+        self._query(start)
+        update_day(date(2024, 5, 10), now=now)
+        self._query(now)
+
+        stats = get_stats(2, now=now + timedelta(minutes=5))
+        self.assertEqual([(2024, 5, 10), (2024, 5, 9)], [(stat.year, stat.month, stat.day) for stat in stats])
+        self.assertEqual([1, 0], [stat.no_of_queries for stat in stats])
+        self.assertEqual(2, Stats.objects.count())
+
+        stats = get_stats(2, now=now + timedelta(minutes=11))
+        self.assertEqual([2, 0], [stat.no_of_queries for stat in stats])
+
+    def test_update_finishes_the_day_after_the_delay(self):
+        start, end = Stats.get_bounds(2024, 5, 10)
+        self._query(start, client='a')
+        update_day(date(2024, 5, 10), now=start + timedelta(hours=1))
+        self.assertEqual(1, StatsClient.objects.count())
+
+        with self.settings(STATS_ROLLUP={**settings.STATS_ROLLUP, 'FINALIZE_DELAY': 0}):
+            stat = update_day(date(2024, 5, 10), now=end)
+
+        self.assertEqual(1, stat.no_of_queries)
+        self.assertEqual(0, StatsClient.objects.count())
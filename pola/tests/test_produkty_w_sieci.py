@@ -2,15 +2,18 @@ import os
 from unittest import mock
 
 import pytest
+from django.core.cache import cache
 from django.test import TestCase, override_settings
-from requests.exceptions import HTTPError
+from requests.exceptions import ConnectTimeout, HTTPError
 from vcr import VCR
 
 from pola.integrations.produkty_w_sieci import (
     ApiException,
+    CircuitOpenException,
     ProduktyWSieciClient,
     produkty_w_sieci_client,
 )
+from pola.integrations.resilience import CircuitBreaker
 
 TEST_EAN13 = "5901520000059"
 
@@ -143,3 +146,86 @@ class TestProduktyWSieciClientMocked:
         with mock.patch("requests.Session.request", return_value=client_error):
             with pytest.raises(ApiException, match="Not found"):
                 self.client.get_products(gtin_number="BAD-CODE", num_retries=1)
+
+
+@override_settings(PRODUKTY_W_SIECI_CIRCUIT_BREAKER_ENABLE=True)
+class TestProduktyWSieciClientResilience(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = ProduktyWSieciClient(api_token="FAKE-TOKEN")
+
+    def server_error(self):
+        response = mock.Mock()
+        response.status_code = 503
+        response.raise_for_status.side_effect = HTTPError("Server error")
+        return response
+
+    @mock.patch("pola.integrations.produkty_w_sieci.sleep")
+    def test_should_stop_calling_api_when_circuit_is_open(self, mock_sleep):
+        with mock.patch("requests.Session.request", return_value=self.server_error()) as mock_request:
+            for _ in range(5):
+                with pytest.raises(ApiException):
+                    self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+            with pytest.raises(CircuitOpenException):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+
+        assert mock_request.call_count == 5
+
+    def half_open(self):
+        breaker = self.client.circuit_breaker
+        breaker.open()
+        breaker._cache().delete(breaker._key(CircuitBreaker.OPEN))
+
+    def test_should_close_circuit_when_probe_gets_client_error(self):
+        client_error = mock.Mock()
+        client_error.status_code = 404
+        client_error.raise_for_status.side_effect = HTTPError("Not found")
+        self.half_open()
+
+        with mock.patch("requests.Session.request", return_value=client_error):
+            with pytest.raises(ApiException):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+
+        assert self.client.circuit_breaker.state() == CircuitBreaker.CLOSED
+
+    @mock.patch("pola.integrations.produkty_w_sieci.monotonic", return_value=100)
+    def test_should_open_circuit_when_probe_exceeds_deadline(self, mock_monotonic):
+        self.half_open()
+
+        with mock.patch("requests.Session.request") as mock_request:
+            with pytest.raises(ApiException, match="Deadline exceeded"):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0, deadline=100)
+
+        mock_request.assert_not_called()
+        assert self.client.circuit_breaker.state() == CircuitBreaker.OPEN
+
+    def test_should_open_circuit_when_probe_gets_invalid_response(self):
+        invalid_response = mock.Mock()
+        invalid_response.json.side_effect = ValueError("Expecting value")
+        self.half_open()
+
+        with mock.patch("requests.Session.request", return_value=invalid_response):
+            with pytest.raises(ValueError):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+
+        assert self.client.circuit_breaker.state() == CircuitBreaker.OPEN
+
+    @mock.patch("pola.integrations.produkty_w_sieci.sleep")
+    @mock.patch("pola.integrations.produkty_w_sieci.random", return_value=1)
+    @mock.patch("pola.integrations.produkty_w_sieci.monotonic", return_value=100)
+    def test_should_not_retry_past_deadline(self, mock_monotonic, mock_random, mock_sleep):
+        with mock.patch("requests.Session.request", return_value=self.server_error()) as mock_request:
+            with pytest.raises(ApiException):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=5, deadline=100.4)
+
+        assert mock_request.call_count == 1
+        assert mock_request.call_args.kwargs["timeout"] == pytest.approx(0.4)
+        mock_sleep.assert_not_called()
+
+    @mock.patch("pola.integrations.produkty_w_sieci.sleep")
+    def test_should_retry_on_transport_error_then_raise_api_exception(self, mock_sleep):
+        with mock.patch("requests.Session.request", side_effect=ConnectTimeout("timed out")) as mock_request:
+            with pytest.raises(ApiException):
+                self.client.get_products(gtin_number=TEST_EAN13, num_retries=2)
+
+        assert mock_request.call_count == 3
@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from pola.integrations.resilience import CircuitBreaker, RetryBudget
+
+
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(
+            'test', cache_alias='default', failure_threshold=2, failure_window=60, reset_timeout=30
+        )
+
+    def test_should_open_after_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state())
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_should_let_single_probe_through_when_half_open(self):
+        self.breaker.open()
+        cache.delete('circuit_breaker:test:open')
+
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state())
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_should_close_after_successful_probe(self):
+        self.breaker.open()
+        cache.delete('circuit_breaker:test:open')
+        self.breaker.allow_request()
+
+        self.breaker.record_success()
+
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state())
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_should_open_after_failed_probe(self):
+        self.breaker.open()
+        cache.delete('circuit_breaker:test:open')
+        self.breaker.allow_request()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state())
+
+
+class TestRetryBudget(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.budget = RetryBudget('test', cache_alias='default', ratio=0.5, min_retries=1, window=60)
+
+    def test_should_cap_retries(self):
+        for _ in range(4):
+            self.budget.record_request()
+
+        self.assertEqual([True, True, True, False], [self.budget.try_acquire() for _ in range(4)])
@@ -0,0 +1,38 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from pola import rq_worker
+
+
+def _job(func_name):
+    return mock.Mock(func_name='pola.rq_worker.run_periodically', args=(func_name, 'low', 300))
+
+
+class TestPeriodicJobs(SimpleTestCase):
+    @mock.patch("pola.rq_worker.Queue")
+    def test_should_enqueue_next_run_when_run_fails(self, mock_queue):
+        with mock.patch("pola.stats_rollup.update_stats", side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                rq_worker.run_periodically('pola.stats_rollup.update_stats', 'low', 300)
+
+        mock_queue.assert_called_once_with('low', connection=mock.ANY)
+        mock_queue.return_value.enqueue_in.assert_called_once_with(
+            timedelta(seconds=300), rq_worker.run_periodically, 'pola.stats_rollup.update_stats', 'low', 300
+        )
+
+    @mock.patch("pola.rq_worker.clean_registries")
+    @mock.patch("pola.rq_worker.Job.fetch_many")
+    @mock.patch("pola.rq_worker.Queue")
+    def test_should_schedule_job_once(self, mock_queue, mock_fetch_many, mock_clean_registries):
+        mock_fetch_many.return_value = [None, _job('pola.work_queue.refresh')]
+
+        rq_worker.schedule_periodically('pola.stats_rollup.update_stats', 'low', 300)
+        mock_queue.return_value.enqueue_in.assert_called_once()
+
+        mock_queue.return_value.enqueue_in.reset_mock()
+        mock_fetch_many.return_value = [_job('pola.stats_rollup.update_stats')]
+
+        self.assertIsNone(rq_worker.schedule_periodically('pola.stats_rollup.update_stats', 'low', 300))
+        mock_queue.return_value.enqueue_in.assert_not_called()
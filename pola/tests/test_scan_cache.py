@@ -0,0 +1,167 @@
+import json
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from test_plus import TestCase
+
+from pola import scan_cache
+from pola.company.factories import BrandFactory, CompanyFactory
+from pola.models import AppConfiguration
+from pola.product.factories import ProductFactory
+from pola.rpc_api.http import RawJSON, dumps
+
+
+@override_settings(SCAN_RESULT_CACHE_ENABLE=True)
+class TestScanResultCache(TestCase):
+    def setUp(self):
+        scan_cache.get_cache().clear()
+        self.company = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        self.brand = BrandFactory(company=self.company)
+        self.product = ProductFactory(code="5900049011829", company=self.company, brand=self.brand)
+
+    def lookup(self, code=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return scan_cache.get_result_from_code(
+                code or self.product.code, multiple_company_supported=True, report_as_object=True
+            )
+
+    def test_should_serve_second_lookup_without_queries(self):
+        result, stats, product = self.lookup()
+
+        with self.assertNumQueries(0):
+            cached_result, cached_stats, cached_product = self.lookup()
+
+        self.assertEqual(json.loads(dumps(result)), json.loads(dumps(cached_result)))
+        self.assertEqual(stats, cached_stats)
+        self.assertEqual(product.pk, cached_product.pk)
+        self.assertEqual(self.company.pk, cached_product.company.pk)
+
+    def test_should_serve_encoded_companies(self):
+        self.lookup()
+
+        result, _, _ = self.lookup()
+
+        self.assertIsInstance(result['companies'], RawJSON)
+        self.assertEqual(self.company.description, json.loads(result['companies'].encoded)[0]['description'])
+
+    def test_should_return_copy_of_cached_result(self):
+        self.lookup()
+        result, _, _ = self.lookup()
+        result['donate'] = {}
+
+        result, _, _ = self.lookup()
+        self.assertNotIn('donate', result)
+
+    def test_should_not_cache_590_product_without_company(self):
+        product = ProductFactory(code="5900000000001", company=None, brand=None)
+        with self.settings(PRODUKTY_W_SIECI_ENABLE=True), mock.patch(
+            "pola.logic._process_with_produkty_w_sieci", return_value=None
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                scan_cache.get_result_from_code(product.code)
+
+        self.assertIsNone(scan_cache.get_cache().get(scan_cache.make_key(product.code)))
+
+    def test_should_invalidate_on_product_change(self):
+        self.lookup()
+        self.product.name = "New name"
+        self.product.save()
+
+        self.assertIsNone(scan_cache.get_cache().get(scan_cache.make_key(self.product.code, True, True)))
+
+    def test_should_keep_entries_on_product_change_not_shown_on_card(self):
+        self.lookup()
+        self.product.ilim_queried_at = timezone.now()
+        self.product.save(update_fields=['ilim_queried_at'])
+
+        self.assertIsNotNone(scan_cache.get_cache().get(scan_cache.make_key(self.product.code, True, True)))
+
+    def test_should_keep_entries_on_company_change_not_shown_on_card(self):
+        self.lookup()
+        self.company.Editor_notes = "Notes"
+        with mock.patch("pola.scan_cache.codes_for_company") as codes_for_company:
+            self.company.save()
+
+        codes_for_company.assert_not_called()
+        self.assertIsNotNone(scan_cache.get_cache().get(scan_cache.make_key(self.product.code, True, True)))
+
+    def test_should_invalidate_on_company_change(self):
+        self.lookup()
+        self.company.description = "Updated description"
+        self.company.save()
+
+        result, _, _ = self.lookup()
+        self.assertEqual("Updated description", result['companies'][0]['description'])
+
+    def test_should_invalidate_on_brand_change(self):
+        self.lookup()
+        self.brand.common_name = "Renamed brand"
+        self.brand.save()
+
+        result, _, _ = self.lookup()
+        self.assertEqual(["Renamed brand"], [b['name'] for b in result['companies'][0]['brands']])
+
+    def test_should_invalidate_on_replacements_change(self):
+        replacement = ProductFactory(code="5900000000002")
+        self.lookup()
+        self.product.replacements.add(replacement)
+
+        result, _, _ = self.lookup()
+        self.assertEqual([replacement.code], [r['code'] for r in result['replacements']])
+
+    def test_should_invalidate_replaced_products_on_replacement_change(self):
+        replacement = ProductFactory(code="5900000000002", name="Old name")
+        self.product.replacements.add(replacement)
+        self.lookup()
+        replacement.name = "New name"
+        replacement.save()
+
+        result, _, _ = self.lookup()
+        self.assertEqual(["New name"], [r['name'] for r in result['replacements']])
+
+    def test_should_invalidate_on_replacement_delete(self):
+        replacement = ProductFactory(code="5900000000002")
+        self.product.replacements.add(replacement)
+        self.lookup()
+        replacement.delete()
+
+        result, _, _ = self.lookup()
+        self.assertNotIn('replacements', result)
+
+    def get_validator(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return scan_cache.get_card_validator(self.product.code, AppConfiguration.get_cached_singleton())
+
+    def test_should_serve_second_validator_without_queries(self):
+        validator = self.get_validator()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(validator.etag, self.get_validator().etag)
+
+    def test_should_invalidate_validator_on_company_change(self):
+        validator = self.get_validator()
+        self.company.description = "Updated description"
+        self.company.save()
+
+        self.assertNotEqual(validator.etag, self.get_validator().etag)
+
+    def test_should_invalidate_app_configuration(self):
+        AppConfiguration.get_cached_singleton()
+        app_config = AppConfiguration.get_singleton()
+        app_config.donate_text = "New text"
+        app_config.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual("New text", AppConfiguration.get_cached_singleton().donate_text)
+        with self.assertNumQueries(0):
+            self.assertEqual("New text", AppConfiguration.get_cached_singleton().donate_text)
+
+    def test_should_track_hit_ratio(self):
+        scan_cache.reset_stats()
+        self.lookup()
+        self.lookup()
+        self.lookup()
+
+        stats = scan_cache.get_stats()
+        self.assertEqual({'hits': 2, 'misses': 1, 'hit_ratio': 2 / 3}, stats)
@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.core.cache import cache
+from test_plus import TestCase
+
+from pola.single_flight import SingleFlightTimeout, single_flight
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_should_release_lock_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with single_flight(cache, "code", timeout=10, wait=0) as is_leader:
+                self.assertTrue(is_leader)
+            self.assertIsNotNone(cache.get("single_flight:code"))
+
+        self.assertIsNone(cache.get("single_flight:code"))
+
+    def test_should_release_lock_on_error(self):
+        with self.assertRaises(ValueError):
+            with single_flight(cache, "code", timeout=10, wait=0):
+                raise ValueError()
+
+        self.assertIsNone(cache.get("single_flight:code"))
+
+    @mock.patch("pola.single_flight.time.sleep")
+    def test_should_wait_for_lock_release(self, mock_sleep):
+        cache.add("single_flight:code", True, 10)
+        mock_sleep.side_effect = lambda _: cache.delete("single_flight:code")
+
+        with single_flight(cache, "code", timeout=10, wait=5) as is_leader:
+            self.assertFalse(is_leader)
+
+        mock_sleep.assert_called_once()
+
+    def test_should_raise_when_lock_is_not_released_in_time(self):
+        cache.add("single_flight:code", True, 10)
+
+        with self.assertRaises(SingleFlightTimeout):
+            with single_flight(cache, "code", timeout=10, wait=0):
+                self.fail("The block should not run")
@@ -2,10 +2,13 @@ import os
 from unittest import mock
 
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django_webtest import WebTestMixin
 from test_plus.test import TestCase
 
-from pola.models import AppConfiguration
+from pola import work_queue
+from pola.models import AppConfiguration, Stats
+from pola.product.factories import ProductFactory
 from pola.users.factories import StaffFactory
 
 
@@ -36,6 +39,16 @@ class TestFrontPageView(TemplateUsedMixin, PermissionMixin, TestCase):
         self.login()
         super().test_template_used()
 
+    def test_reads_the_work_queue(self):
+        product = ProductFactory(company=None, code='5900000000001')
+        work_queue.refresh()
+        self.login()
+
+        resp = self.client.get(self.url)
+
+        self.assertEqual(1, resp.context['no_of_590_products'])
+        self.assertEqual([product], resp.context['most_popular_590_products'])
+
 
 class TestStatsPageView(TemplateUsedMixin, PermissionMixin, TestCase):
     url = reverse_lazy('home-stats')
@@ -45,6 +58,16 @@ class TestStatsPageView(TemplateUsedMixin, PermissionMixin, TestCase):
         self.login()
         super().test_template_used()
 
+    def test_reads_the_rollups_and_calculates_missing_days(self):
+        today = timezone.localdate()
+        Stats.empty(today.year, today.month, today.day).save()
+        self.login()
+
+        resp = self.client.get(self.url)
+
+        self.assertEqual(30, len(resp.context['stats']))
+        self.assertEqual(30, Stats.objects.count())
+
 
 class TestEditorsStatsPageView(TemplateUsedMixin, PermissionMixin, TestCase):
     url = reverse_lazy('home-editors-stats')
@@ -0,0 +1,67 @@
+from datetime import timedelta
+from unittest import mock
+
+from test_plus import TestCase
+
+from pola import work_queue
+from pola.company.factories import CompanyFactory
+from pola.company.models import Company
+from pola.product.factories import ProductFactory
+from pola.report.factories import ReportFactory, ResolvedReportFactory
+from pola.rq_worker import run_periodically
+
+
+class WorkQueueTestCase(TestCase):
+    def test_refresh_counts(self):
+        CompanyFactory(
+            verified=True, plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100, sources=''
+        )
+        ProductFactory(company=None, code='5900000000001')
+        ProductFactory(company=None, code='4000000000001')
+        ReportFactory()
+        ResolvedReportFactory()
+
+        work_queue.refresh()
+        counts = work_queue.get_counts()
+
+        self.assertEqual(Company.objects.count(), counts.no_of_companies)
+        self.assertEqual(1, counts.no_of_verified_companies)
+        self.assertEqual(1, counts.no_of_590_products)
+        self.assertEqual(1, counts.no_of_not_590_products)
+        self.assertEqual(1, counts.no_of_open_reports)
+        self.assertEqual(1, counts.no_of_resolved_reports)
+        self.assertEqual(2, counts.no_of_reports)
+
+    def test_refresh_lists(self):
+        popular = ProductFactory(company=None, code='5900000000001', query_count=10)
+        less_popular = ProductFactory(company=None, code='5900000000002', query_count=5)
+        reported = ProductFactory()
+        ReportFactory.create_batch(2, product=reported)
+        ResolvedReportFactory(product=popular)
+        # Not open, the same as in the counts.
+        ResolvedReportFactory(product=popular, resolved_at=None)
+
+        work_queue.refresh()
+        lists = work_queue.get_lists()
+
+        self.assertEqual([popular, less_popular], lists['most_popular_590_products'])
+        self.assertEqual([reported], lists['products_with_most_open_reports'])
+        self.assertEqual(2, lists['products_with_most_open_reports'][0].no_of_open_reports)
+        self.assertEqual([reported.company], lists['companies_with_most_open_reports'])
+
+    def test_skips_deleted_objects(self):
+        product = ProductFactory(company=None, code='5900000000001')
+        work_queue.refresh()
+        product.delete()
+
+        self.assertEqual([], work_queue.get_lists()['most_popular_590_products'])
+
+    @mock.patch("pola.rq_worker.Job.fetch_many", return_value=[])
+    @mock.patch("pola.rq_worker.clean_registries")
+    @mock.patch("pola.rq_worker.Queue")
+    def test_schedule_periodic_refresh(self, mock_queue, mock_clean_registries, mock_fetch_many):
+        work_queue.schedule_periodic_refresh()
+
+        mock_queue.return_value.enqueue_in.assert_called_once_with(
+            timedelta(seconds=300), run_periodically, 'pola.work_queue.refresh', 'low', 300
+        )
@@ -0,0 +1,42 @@
+"""Substring search of the CMS filters and autocompletes.
+
+On PostgreSQL ``icontains`` compiles to ``UPPER(column) LIKE UPPER('%value%')``. The searched columns have
+trigram GIN indexes on ``UPPER(column)`` (see :func:`upper_trigram_index`), so these lookups, also ORed over
+several columns of a table, do not scan the whole table. The matches are ranked by the trigram word similarity
+of the searched value to the columns.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Upper
+
+RANK = 'search_rank'
+
+
+def upper_trigram_index(field, name):
+    """Index serving ``icontains`` and ``contains`` lookups of ``UPPER(field)``."""
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
+def contains_any(fields, value):
+    return reduce(or_, (Q(**{f'{field}__icontains': value}) for field in fields))
+
+
+def similarity(terms):
+    """Best trigram word similarity of the ``(field, value)`` pairs, 0 for the empty fields."""
+    similarities = [TrigramWordSimilarity(Value(value), field) for field, value in terms]
+    best = similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+    return Coalesce(best, Value(0.0), output_field=FloatField())
+
+
+def search(queryset, fields, value):
+    """Filters the rows containing the value in any of the fields, the most similar first."""
+    return (
+        queryset.filter(contains_any(fields, value))
+        .annotate(**{RANK: similarity([(field, value) for field in fields])})
+        .order_by(f'-{RANK}', 'pk')
+    )
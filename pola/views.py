@@ -1,19 +1,15 @@
 import os
-from datetime import datetime, timedelta
 from functools import reduce
-from textwrap import dedent
 
 from braces.views import FormValidMessageMixin
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.core.exceptions import ImproperlyConfigured
 from django.db import connection
 from django.db.models import Q
-from django.db.models.functions import Length
 from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy
-from django.utils import timezone
 from django.utils.encoding import force_str
-from django.utils.timezone import get_default_timezone
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import TemplateView, UpdateView
 from django.views.generic.detail import (
@@ -21,12 +17,12 @@ from django.views.generic.detail import (
     SingleObjectTemplateResponseMixin,
 )
 
-from pola.company.models import Company
+from pola import text_search, work_queue
 from pola.forms import AppConfigurationForm
 from pola.mixins import LoginPermissionRequiredMixin
-from pola.models import AppConfiguration, Stats
-from pola.product.models import Product
+from pola.models import AppConfiguration
 from pola.report.models import Report
+from pola.stats_rollup import get_stats
 
 
 class FrontPageView(LoginRequiredMixin, TemplateView):
@@ -35,68 +31,24 @@ class FrontPageView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, *args, **kwargs):
         c = super().get_context_data(**kwargs)
 
-        c['most_popular_companies'] = Company.objects.filter(verified=False).order_by('-query_count')[:10]
-        c['no_of_companies'] = Company.objects.count()
-        c['no_of_not_verified_companies'] = Company.objects.filter(verified=False).count()
-        c['no_of_verified_companies'] = Company.objects.filter(verified=True).count()
-
-        sq = 'select count(*) from report_report where product_id=product_product.id and resolved_at is NULL'
-        c['products_with_most_open_reports'] = Product.objects.raw(
-            'select '
-            '*, '
-            '(' + sq + ') as no_of_open_reports '
-            'from '
-            'product_product '
-            'order by no_of_open_reports desc limit 10'
-        )
-
-        c['most_popular_590_products'] = Product.objects.filter(company__isnull=True, code__startswith='590').order_by(
-            '-query_count'
-        )[:10]
-
-        c['no_of_590_products'] = Product.objects.filter(company__isnull=True, code__startswith='590').count()
-
-        c['most_popular_not_590_products'] = (
-            Product.objects.filter(company__isnull=True).exclude(code__startswith='590').order_by('-query_count')[:10]
-        )
-
-        c['no_of_not_590_products'] = (
-            Product.objects.filter(company__isnull=True).exclude(code__startswith='590').count()
-        )
-
-        c['companies_by_name_length'] = (
-            Company.objects.annotate(name_length=Length('common_name')).order_by('-name_length')
-        )[:10]
-
-        c['most_popular_products_without_name'] = Product.objects.filter(name__isnull=True).order_by('-query_count')[
-            :10
-        ]
-
-        sq = dedent(
-            """\
-            select
-                count(*)
-            from
-                report_report
-                join
-                    product_product on report_report.product_id = product_product.id
-            where company_company.id=product_product.company_id and resolved_at is NULL
-        """
-        )
-        c['companies_with_most_open_reports'] = Company.objects.raw(
-            'select '
-            '*, '
-            '(' + sq + ') as no_of_open_reports '
-            'from '
-            'company_company '
-            'order by no_of_open_reports desc limit 10'
-        )
+        # The counts and the lists are refreshed by the refresh_work_queue job, see: pola.work_queue
+        counts = work_queue.get_counts()
+        c['work_queue_refreshed_at'] = counts.refreshed_at
+        for field in (
+            'no_of_companies',
+            'no_of_not_verified_companies',
+            'no_of_verified_companies',
+            'no_of_590_products',
+            'no_of_not_590_products',
+            'no_of_open_reports',
+            'no_of_resolved_reports',
+            'no_of_reports',
+        ):
+            c[field] = getattr(counts, field)
+        c.update(work_queue.get_lists())
 
         # Reports
         c['newest_reports'] = Report.objects.only_open().order_by('-created')[:10]
-        c['no_of_open_reports'] = Report.objects.only_open().count()
-        c['no_of_resolved_reports'] = Report.objects.only_resolved().count()
-        c['no_of_reports'] = Report.objects.count()
 
         return c
 
@@ -115,11 +67,19 @@ class ExprAutocompleteMixin:
         q = [Q(**{x: self.q}) for x in self.get_search_expr()]
         return reduce(lambda x, y: x | y, q)
 
+    def get_search_rank(self):
+        fields = [x.removesuffix('__icontains') for x in self.get_search_expr() if x.endswith('__icontains')]
+        return text_search.similarity([(field, self.q) for field in fields])
+
     def get_queryset(self):
         qs = self.model.objects.all()
 
         if self.q:
-            qs = qs.filter(self.get_filters())
+            qs = (
+                qs.filter(self.get_filters())
+                .annotate(**{text_search.RANK: self.get_search_rank()})
+                .order_by(f'-{text_search.RANK}', 'pk')
+            )
 
         return qs
 
@@ -161,25 +121,13 @@ class StatsPageView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, *args, **kwargs):
         c = super().get_context_data(**kwargs)
 
-        stats = []
-
-        date = timezone.now()
-        for i in range(0, 30):
-            midnight = datetime(date.year, date.month, date.day, tzinfo=get_default_timezone()) + timedelta(days=1)
-            try:
-                stat = Stats.objects.get(year=date.year, month=date.month, day=date.day)
-            except ObjectDoesNotExist:
-                stat = Stats()
-            if stat.year is None or stat.calculated_at < midnight:
-                stat.calculate(date.year, date.month, date.day)
-                Stats.save(stat)
-            date = date - timedelta(days=1)
-            setattr(stat, 'index', i)
-
-            stats.append(stat)
+        # The rows are updated by the update_stats job, see: pola.stats_rollup
+        stats = get_stats(settings.STATS_ROLLUP['DAYS'])
+        for i, stat in enumerate(stats):
+            stat.index = i
 
         c['stats'] = list(reversed(stats))
-        c['stats5'] = [stats[i] for i in range(0, 5)]
+        c['stats5'] = stats[:5]
         return c
 
 
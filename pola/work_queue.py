@@ -0,0 +1,77 @@
+"""Editors' work queue on the CMS front page.
+
+The counts and the top 10 lists of the front page are kept in the materialized views ``pola_workqueuecounts``
+and ``pola_workqueueitem`` (see migrations ``pola.0013`` and ``pola.0015``). The RQ worker refreshes them every
+``INTERVAL`` seconds (see :func:`schedule_periodic_refresh`), they can also be refreshed by the
+``refresh_work_queue`` command or by the same job enqueued with :func:`schedule_refresh`. Both count the open
+reports the same way as ``Report.objects.only_open``.
+
+The page reads a single row of the counts and at most ``10`` rows of each list, and loads the listed companies and
+products by primary key, so it does not depend on the size of the tables. The companies and products are loaded
+when the page is rendered, the lists show their current names and ``query_count``; only their order and the
+numbers of the open reports are as of ``refreshed_at``.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from rq import Queue
+
+from pola.company.models import Company
+from pola.models import WorkQueueCounts, WorkQueueItem
+from pola.product.models import Product
+from pola.rq_worker import conn, schedule_periodically
+
+VIEWS = (WorkQueueCounts._meta.db_table, WorkQueueItem._meta.db_table)
+
+COMPANY_LISTS = ('most_popular_companies', 'companies_by_name_length', 'companies_with_most_open_reports')
+PRODUCT_LISTS = (
+    'products_with_most_open_reports',
+    'most_popular_590_products',
+    'most_popular_not_590_products',
+    'most_popular_products_without_name',
+)
+# Lists ordered by the number of the open reports, which is set as ``no_of_open_reports`` of the objects.
+OPEN_REPORT_LISTS = ('companies_with_most_open_reports', 'products_with_most_open_reports')
+
+
+def refresh():
+    with connection.cursor() as cursor:
+        for view in VIEWS:
+            # CONCURRENTLY does not block the page while the view is refreshed.
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view}')
+
+
+def schedule_refresh():
+    return Queue(settings.WORK_QUEUE['QUEUE'], connection=conn).enqueue(refresh)
+
+
+def schedule_periodic_refresh():
+    """Starts running :func:`refresh` on the RQ worker every ``INTERVAL`` seconds, see: pola.rq_worker"""
+    return schedule_periodically(f'{__name__}.refresh', settings.WORK_QUEUE['QUEUE'], settings.WORK_QUEUE['INTERVAL'])
+
+
+def get_counts():
+    return WorkQueueCounts.objects.first()
+
+
+def get_lists():
+    """Returns ``{list name: companies or products}``, without the objects deleted since the refresh."""
+    items = defaultdict(list)
+    for item in WorkQueueItem.objects.all():
+        items[item.kind].append(item)
+
+    lists = {}
+    for model, kinds in ((Company, COMPANY_LISTS), (Product, PRODUCT_LISTS)):
+        objects = model.objects.in_bulk([item.object_id for kind in kinds for item in items[kind]])
+        for kind in kinds:
+            lists[kind] = []
+            for item in items[kind]:
+                obj = objects.get(item.object_id)
+                if obj is None:
+                    continue
+                if kind in OPEN_REPORT_LISTS:
+                    obj.no_of_open_reports = item.value
+                lists[kind].append(obj)
+    return lists